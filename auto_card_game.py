@@ -15,6 +15,7 @@ from log_helper import log
 from click import click_at
 from common import get_center, single_find_with_path, get_scaling_factor
 from platform_config import get_image_path
+from screen_wait import wait_until
 from auto_snapshot_solver import AutoSnapshotSolver
 
 
@@ -119,23 +120,10 @@ class AutoCardGame:
         """
         log("Waiting for start_match.png to disappear (game starting)...")
         start_time = time.time()
-        check_interval = 0.5
-        check_count = 0
-        
-        while (time.time() - start_time) < timeout:
-            elapsed = time.time() - start_time
-            check_count += 1
-            
-            if not self.check_start_match_visible():
-                log(f"✅ Game started after {elapsed:.1f}s ({check_count} checks)")
-                return True
-            
-            # Progress indicator
-            if check_count % 4 == 0:  # Every 2 seconds
-                log(f"  Still waiting for game to start... ({elapsed:.1f}s elapsed)")
-            
-            time.sleep(check_interval)
-        
+        if wait_until(lambda: not self.check_start_match_visible(), timeout=timeout):
+            log(f"✅ Game started after {time.time() - start_time:.1f}s")
+            return True
+
         log(f"⚠️  Timeout: Game not started after {timeout}s")
         return False
     
@@ -150,23 +138,10 @@ class AutoCardGame:
         """
         log("Waiting for cards to be shown (flipback.png visible)...")
         start_time = time.time()
-        check_interval = 0.5
-        check_count = 0
-        
-        while (time.time() - start_time) < timeout:
-            elapsed = time.time() - start_time
-            check_count += 1
-            
-            if self.check_flipback_visible():
-                log(f"✅ Cards shown after {elapsed:.1f}s ({check_count} checks)")
-                return True
-            
-            # Progress indicator
-            if check_count % 4 == 0:  # Every 2 seconds
-                log(f"  Still waiting for cards... ({elapsed:.1f}s elapsed)")
-            
-            time.sleep(check_interval)
-        
+        if wait_until(self.check_flipback_visible, timeout=timeout):
+            log(f"✅ Cards shown after {time.time() - start_time:.1f}s")
+            return True
+
         log(f"⚠️  Timeout: Cards not shown after {timeout}s")
         return False
     
@@ -181,24 +156,10 @@ class AutoCardGame:
         """
         log("Waiting for cards to be revealed (flipback.png gone)...")
         start_time = time.time()
-        check_interval = 0.5
-        check_count = 0
-        
-        while (time.time() - start_time) < timeout:
-            elapsed = time.time() - start_time
-            check_count += 1
-            
-            # Check if flipback is gone
-            if not self.check_flipback_visible():
-                log(f"✅ Cards revealed after {elapsed:.1f}s ({check_count} checks)")
-                return True
-            
-            # Progress indicator
-            if check_count % 4 == 0:  # Every 2 seconds
-                log(f"  Still waiting for reveal... ({elapsed:.1f}s elapsed)")
-            
-            time.sleep(check_interval)
-        
+        if wait_until(lambda: not self.check_flipback_visible(), timeout=timeout):
+            log(f"✅ Cards revealed after {time.time() - start_time:.1f}s")
+            return True
+
         log(f"⚠️  Timeout: Cards not revealed after {timeout}s")
         return False
     
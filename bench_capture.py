@@ -0,0 +1,76 @@
+"""
+Benchmark: screen capture backends
+
+Reports captures per second and bytes allocated per capture (as seen by
+tracemalloc, which tracks NumPy buffers) for every capture backend in
+common.py that can run on this machine.
+
+Usage:
+    python bench_capture.py
+    python bench_capture.py --count 50 --region 0 0 800 600 --images debug_screenshot.png
+"""
+import argparse
+import time
+import tracemalloc
+
+from common import FileCapture, MssCapture, PyAutoGuiCapture, RegionCapture
+from log_helper import log
+
+
+def make_backends(region, images):
+    """Build every backend that can be created here, skipping the others with a note."""
+    factories = [
+        ("pyautogui", PyAutoGuiCapture),
+        ("mss", MssCapture),
+        ("region", lambda: RegionCapture(region)),
+        ("file", lambda: FileCapture(images)),
+    ]
+    backends = []
+    for name, factory in factories:
+        try:
+            backend = factory()
+            for _ in backend._buffers:  # Warm up the gray buffer pool and native handles
+                backend.grab()
+            backends.append((name, backend))
+        except Exception as e:
+            log(f"Skipping {name}: {e}")
+    return backends
+
+
+def measure(backend, count):
+    """Return (captures per second, bytes allocated per capture, frame size)."""
+    tracemalloc.start()
+    allocated = 0
+    frame = None
+    start = time.perf_counter()
+    for _ in range(count):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        frame = backend.grab()
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return count / elapsed, allocated / count, frame.gray.shape
+
+
+def run(count, region, images):
+    results = []
+    for name, backend in make_backends(region, images):
+        rate, per_capture, shape = measure(backend, count)
+        results.append((name, rate, per_capture, shape))
+
+    log("=" * 70)
+    log(f"{'backend':>10} {'captures/s':>12} {'KiB/capture':>14} {'frame':>12}")
+    for name, rate, per_capture, shape in results:
+        log(f"{name:>10} {rate:12.1f} {per_capture / 1024:14.1f} {shape[1]:>5}x{shape[0]:<6}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare screen capture backends")
+    parser.add_argument("--count", type=int, default=20, help="Captures per backend")
+    parser.add_argument("--region", type=int, nargs=4, default=[0, 0, 800, 600],
+                        metavar=("X", "Y", "W", "H"), help="Rectangle for the region backend (physical pixels)")
+    parser.add_argument("--images", nargs="+", default=["debug_screenshot.png"],
+                        help="Screenshots served by the file backend")
+    args = parser.parse_args()
+    run(args.count, tuple(args.region), args.images)
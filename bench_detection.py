@@ -0,0 +1,417 @@
+"""
+Benchmark: detection paths over the screenshot corpus
+
+Times every finder path of common.py (single_find_with_path,
+get_center_with_path, find_all_with_path and the batched detect(), each in
+both match modes) over the repository's screenshots, and the card matchers
+(TemplateCardMatcher, MacCardMatcher, AutoCardMatcher) over the card grids.
+For every path it reports the latency distribution, the bytes allocated per
+call (as seen by tracemalloc, which tracks NumPy buffers) and the accuracy
+against the annotations in bench_detection.json.
+
+Every screenshot is annotated with the buttons it shows; an empty list
+means it was checked to show none, so any match there is a false positive.
+A screenshot is only searched with the template set it was captured for
+("mac" for pics/mac, "pc" for pics), the other set's sizes do not match.
+
+The results are compared with the stored baseline of the platform
+(bench_detection_baseline_<system>.json, recorded on that system): accuracy
+may not drop, and the median latency and the allocations may not grow
+beyond the tolerances. Regressions are logged and the script exits with
+status 1. Latency is only compared when the baseline was recorded on the
+same kind of machine, see machine(); accuracy and allocations always are.
+
+Usage:
+    python bench_detection.py
+    python bench_detection.py --repeat 5 --paths find_all card.
+    python bench_detection.py --update-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+
+import common
+from bench_matching import percentile
+from common import get_scaling_factor, resolve_template_path, resource_map, templates
+from log_helper import log, muted
+from platform_config import IS_MAC
+
+ANNOTATIONS_FILE = "bench_detection.json"
+BASELINE_FILE = f"bench_detection_baseline_{platform.system().lower()}.json"
+TEMPLATE_SET = "mac" if IS_MAC else "pc"  # Templates resolve_template_path() loads here
+MODES = ["exhaustive", "pyramid"]
+LATENCY_TOLERANCE = 0.5  # Allowed relative growth of the median latency
+LATENCY_SLACK_MS = 0.2  # Growth below this is noise, whatever the ratio
+ALLOC_TOLERANCE = 0.25  # Allowed relative growth of the bytes allocated per call
+ALLOC_SLACK = 4096
+
+
+def machine():
+    """What latencies depend on; baselines from another machine are only compared for accuracy."""
+    return {"system": platform.system(), "machine": platform.machine(), "processor": platform.processor(),
+            "cpus": os.cpu_count(), "python": platform.python_version(), "opencv": cv2.__version__}
+
+
+# --- Accuracy ---------------------------------------------------------------
+
+def score_locations(found, expected, tolerance):
+    """
+    (tp, fp, fn) of one template on one image.
+
+    Args:
+        found: Centers found, in image pixels (None for a finder that does not locate)
+        expected: Annotated centers of the template in the image
+        tolerance: Largest distance (px, per axis) of a correct center
+    """
+    tp = fp = 0
+    remaining = list(expected)
+    for location in found:
+        near = [e for e in remaining if location is None
+                or (abs(location[0] - e[0]) <= tolerance and abs(location[1] - e[1]) <= tolerance)]
+        if near:
+            remaining.remove(near[0])
+            tp += 1
+        else:
+            fp += 1
+    return tp, fp, len(remaining)
+
+
+def card_cells(annotation):
+    """Annotated cards as {(row, col): (name, (x, y))}."""
+    return {(r, c): (name, (annotation["columns"][c], annotation["rows"][r]))
+            for r, row in enumerate(annotation["grid"]) for c, name in enumerate(row)}
+
+
+def score_cards(found, annotation, tolerance):
+    """(tp, fp, fn) of (name, x, y) cards found in an annotated grid."""
+    cells = card_cells(annotation)
+    claimed = set()
+    tp = fp = 0
+    for name, x, y in found:
+        cell = next((key for key, (_, (cx, cy)) in cells.items()
+                     if key not in claimed and abs(x - cx) <= tolerance and abs(y - cy) <= tolerance), None)
+        if cell is not None and cells[cell][0] == name:
+            claimed.add(cell)
+            tp += 1
+        else:
+            fp += 1
+    return tp, fp, len(cells) - len(claimed)
+
+
+def score_pairs(found, annotation):
+    """(tp, fp, fn) of grid-position pairs against the pairs of a whole-grid annotation."""
+    by_name = {}
+    for cell, (name, _) in card_cells(annotation).items():
+        by_name.setdefault(name, []).append(cell)
+    expected = {frozenset(cells) for cells in by_name.values() if len(cells) == 2}
+    found = {frozenset(pair) for pair in found}
+    return len(found & expected), len(found - expected), len(expected - found)
+
+
+# --- Paths ------------------------------------------------------------------
+
+def template_paths():
+    return sorted({path for scope in resource_map.values() for path in scope.values() if os.path.exists(path)})
+
+
+def expected_buttons(annotation):
+    """Template path -> annotated centers."""
+    expected = {}
+    for button, centers in annotation["buttons"].items():
+        path = resolve_template_path(button)
+        if path is not None:
+            expected[os.path.normpath(path)] = [tuple(c) for c in centers]
+    return expected
+
+
+def _physical(point):
+    sft = get_scaling_factor()
+    return point.x * sft, point.y * sft
+
+
+def _detect(paths, gray, th, mode):
+    previous = common.MATCH_MODE
+    common.MATCH_MODE = mode
+    try:
+        detections = common.detect(paths, gs=gray, th=th)
+    finally:
+        common.MATCH_MODE = previous
+    return {path: [_physical(d.location)] if d.found else [] for path, d in detections.items()}
+
+
+# (name, per template?, call) -> found centers; per-template calls take (path, gray, th, mode),
+# batched ones (paths, gray, th, mode) and return {path: found centers}
+FINDERS = [
+    ("single_find_with_path", True,
+     lambda path, gray, th, mode: [None] if common.single_find_with_path(path, gray, th, mode) else []),
+    ("get_center_with_path", True,
+     lambda path, gray, th, mode: [_physical(p) for p in [common.get_center_with_path(path, gray, th, mode)] if p]),
+    ("find_all_with_path", True,
+     lambda path, gray, th, mode: [(cx, cy) for cx, cy, _ in common.find_all_with_path(path, gray, th, mode)]),
+    ("detect", False, _detect),
+]
+
+
+class PathResult:
+    """Latencies, allocations and accuracy of one detection path."""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []  # ms per call
+        self.allocations = []  # bytes per call
+        self.tp = self.fp = self.fn = 0
+
+    def add_accuracy(self, tp, fp, fn):
+        self.tp += tp
+        self.fp += fp
+        self.fn += fn
+
+    def to_dict(self):
+        values = self.latencies or [0.0]
+        return {
+            "calls": len(self.latencies),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "mean": sum(values) / len(values),
+            "alloc": sum(self.allocations) / len(self.allocations) if self.allocations else 0.0,
+            "tp": self.tp,
+            "fp": self.fp,
+            "fn": self.fn,
+        }
+
+
+def measure(call, repeat, before=None):
+    """
+    Run call repeat times for latencies, then once under tracemalloc.
+
+    Returns:
+        (latencies in ms, bytes allocated, result of the last call)
+    """
+    latencies = []
+    result = None
+    # Logging stays off the console but is still queued, as in a real run
+    with muted():
+        for _ in range(repeat):
+            if before is not None:
+                before()
+            start = time.perf_counter()
+            result = call()
+            latencies.append((time.perf_counter() - start) * 1000)
+        if before is not None:
+            before()
+        tracemalloc.start()
+        try:
+            before_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            call()
+            allocated = tracemalloc.get_traced_memory()[1] - before_bytes
+        finally:
+            tracemalloc.stop()
+    return latencies, allocated, result
+
+
+def run_finders(annotations, threshold, repeat, selected):
+    results = {}
+    paths = template_paths()
+    tolerance = annotations["tolerance"]
+    for image_path, annotation in annotations["finders"].items():
+        if annotation.get("templates", "pc") != TEMPLATE_SET:
+            log(f"Skipping {image_path}: captured for the {annotation.get('templates', 'pc')} templates")
+            continue
+        gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            log(f"Skipping {image_path}: cannot be read")
+            continue
+        expected = expected_buttons(annotation)
+        log(f"Finders on {image_path} ({gray.shape[1]}x{gray.shape[0]}, {len(paths)} templates)")
+        for finder, per_template, call in FINDERS:
+            for mode in MODES:
+                name = f"find.{finder}[{mode}]"
+                if not selected(name):
+                    continue
+                result = results.setdefault(name, PathResult(name))
+                # The pyramid levels of a frame are shared by its templates: rebuild them once per pass
+                forget = lambda: common._forget_frame(gray)
+                if per_template:
+                    for path in paths:
+                        latencies, allocated, found = measure(lambda: call(path, gray, threshold, mode), repeat)
+                        result.latencies += latencies
+                        result.allocations.append(allocated)
+                        result.add_accuracy(*score_locations(found, expected.get(os.path.normpath(path), []),
+                                                             tolerance))
+                    forget()
+                else:
+                    latencies, allocated, found = measure(lambda: call(paths, gray, threshold, mode), repeat, forget)
+                    result.latencies += latencies
+                    result.allocations.append(allocated)
+                    for path in paths:
+                        result.add_accuracy(*score_locations(found.get(path, []),
+                                                             expected.get(os.path.normpath(path), []), tolerance))
+    return results
+
+
+def run_card_matchers(annotations, repeat, selected):
+    from auto_card_matcher import AutoCardMatcher
+    from mac_card_matcher import MacCardMatcher
+    from template_card_matcher import TemplateCardMatcher
+
+    def template_matcher(image_path):
+        matcher = TemplateCardMatcher(image_path)
+        with muted():
+            matcher.load_templates()
+
+        def call():
+            matcher.find_template_matches()
+            return [(os.path.splitext(matcher.templates[t]["filename"])[0], cx, cy)
+                    for t, cx, cy, _, _ in matcher.card_positions]
+        return call
+
+    def mac_matcher(image_path):
+        matcher = MacCardMatcher()
+        matcher.image_path = image_path
+        matcher.scaling_factor = 1.0  # Report image pixels
+        with muted():
+            matcher.load_templates()
+
+        def call():
+            matcher.find_all_cards()
+            return [(os.path.splitext(name)[0], cx, cy) for _, cx, cy, name in matcher.card_positions]
+        return call
+
+    def auto_matcher(image_path):
+        def call():
+            matcher = AutoCardMatcher(image_path)
+            matcher.extract_cards()
+            pairs = matcher.get_best_pairs(matcher.find_matching_pairs())
+            return [(matcher.cards[i]["grid_position"], matcher.cards[j]["grid_position"]) for i, j, _ in pairs]
+        return call
+
+    # (name, factory, needs an image that is exactly the grid)
+    matchers = [
+        ("card.TemplateCardMatcher", template_matcher, False),
+        ("card.MacCardMatcher", mac_matcher, False),
+        ("card.AutoCardMatcher", auto_matcher, True),
+    ]
+    results = {}
+    tolerance = annotations["card_tolerance"]
+    for image_path, annotation in annotations["cards"].items():
+        if not os.path.exists(image_path):
+            log(f"Skipping {image_path}: not found")
+            continue
+        log(f"Card matchers on {image_path}")
+        for name, factory, whole_grid in matchers:
+            if not selected(name) or (whole_grid and not annotation.get("whole_grid")):
+                continue
+            result = results.setdefault(name, PathResult(name))
+            call = factory(image_path)
+            with muted():
+                call()  # Warm up the template registry
+            latencies, allocated, found = measure(call, repeat)
+            result.latencies += latencies
+            result.allocations.append(allocated)
+            if whole_grid:
+                result.add_accuracy(*score_pairs(found, annotation))
+            else:
+                result.add_accuracy(*score_cards(found, annotation, tolerance))
+    return results
+
+
+# --- Baseline ---------------------------------------------------------------
+
+def compare(current, baseline, latency_tolerance, alloc_tolerance, strict):
+    """
+    Regressions of current against baseline, as messages.
+
+    Args:
+        current: Path name -> result dict
+        baseline: Contents of a baseline file
+        strict: Compare latency even when the baseline comes from another machine
+    """
+    regressions = []
+    same_machine = baseline.get("machine") == machine()
+    if not same_machine and not strict:
+        log("Baseline recorded on another machine: latency not compared (--strict to force)")
+    for name, now in current.items():
+        before = baseline["paths"].get(name)
+        if before is None:
+            log(f"  {name}: not in the baseline")
+            continue
+        if now["tp"] < before["tp"] or now["fp"] > before["fp"]:
+            regressions.append(f"{name}: accuracy tp {before['tp']} -> {now['tp']}, fp {before['fp']} -> {now['fp']}")
+        if same_machine or strict:
+            if now["p50"] > before["p50"] * (1 + latency_tolerance) and now["p50"] - before["p50"] > LATENCY_SLACK_MS:
+                regressions.append(f"{name}: p50 {before['p50']:.2f} ms -> {now['p50']:.2f} ms")
+        if now["alloc"] > before["alloc"] * (1 + alloc_tolerance) + ALLOC_SLACK:
+            regressions.append(f"{name}: allocations {before['alloc'] / 1024:.0f} KB -> {now['alloc'] / 1024:.0f} KB")
+    return regressions
+
+
+def write_baseline(path, current):
+    with open(path, "w") as f:
+        json.dump({"machine": machine(), "paths": current}, f, indent=2)
+    log(f"Baseline of {len(current)} paths written to {path}")
+
+
+def report(current):
+    log("=" * 100)
+    log(f"{'path':>42} {'calls':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'KB/call':>8} "
+        f"{'tp':>4} {'fp':>4} {'fn':>4}")
+    for name, r in current.items():
+        log(f"{name:>42} {r['calls']:6d} {r['p50']:8.2f} {r['p95']:8.2f} {r['p99']:8.2f} {r['alloc'] / 1024:8.1f} "
+            f"{r['tp']:4d} {r['fp']:4d} {r['fn']:4d}")
+
+
+def run(args):
+    with open(args.annotations, "r") as f:
+        annotations = json.load(f)
+    # Measure the matching itself: no reuse of results, no learned regions, no calibrated thresholds
+    common.CHANGE_GATE = False
+    common.ROI_LEARNING = False
+    common.USE_CALIBRATED_THRESHOLDS = False
+    common.clear_search_regions()
+    templates.preload()
+
+    def selected(name):
+        return not args.paths or any(part in name for part in args.paths)
+
+    results = run_finders(annotations, args.threshold, args.repeat, selected)
+    results.update(run_card_matchers(annotations, args.repeat, selected))
+    current = {name: result.to_dict() for name, result in results.items()}
+    report(current)
+
+    if args.update_baseline:
+        write_baseline(args.baseline, current)
+        return 0
+    if not os.path.exists(args.baseline):
+        log(f"No baseline at {args.baseline}, record one with --update-baseline")
+        return 0
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.latency_tolerance, args.alloc_tolerance, args.strict)
+    for message in regressions:
+        log(f"REGRESSION {message}")
+    log(f"{len(regressions)} regressions against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the detection paths against the screenshot corpus")
+    parser.add_argument("--annotations", default=ANNOTATIONS_FILE, help="Ground truth of the corpus")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline results to compare with")
+    parser.add_argument("--update-baseline", action="store_true", help="Record the results as the new baseline")
+    parser.add_argument("--paths", nargs="*", help="Only run paths whose name contains one of these")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Confidence threshold of the finders")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per call")
+    parser.add_argument("--latency-tolerance", type=float, default=LATENCY_TOLERANCE,
+                        help="Allowed relative latency growth")
+    parser.add_argument("--alloc-tolerance", type=float, default=ALLOC_TOLERANCE,
+                        help="Allowed relative growth of allocations")
+    parser.add_argument("--strict", action="store_true", help="Compare latency against any machine's baseline")
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,126 @@
+"""
+Benchmark: drag input paths
+
+Times the drags the bot makes (card pulls, cat grab, star map scrolling)
+through the old PyAutoGUI path, which tweens the pointer with duration=
+moves, and the native path in click.py. Both run against recording
+backends that sleep exactly as long as the real ones would, so no display
+is needed and the numbers show the time the input itself costs.
+
+Usage:
+    python bench_input.py
+    python bench_input.py --repeat 3 --steps 8 --step-delay 0.015
+"""
+import argparse
+import time
+
+import click
+from click import RecordingInput, drag, set_input_backend
+from log_helper import log
+
+# PyAutoGUI's tweening constants
+PYAUTOGUI_PAUSE = 0.1  # Sleep after every public pyautogui call
+MINIMUM_DURATION = 0.1  # Shorter durations jump straight to the target
+MINIMUM_SLEEP = 0.05  # Shortest sleep between two tween steps
+
+# (name, start, end, old path, native drag() arguments) with the old path as a list of
+# ("move", duration) / ("drag", duration) / ("press" | "release" | "pause", seconds) calls
+SCENARIOS = [
+    ("again card pull", (1200, 800), (1200, 500),
+     [("move", 0.5), ("pause", 0.5), ("drag", 1.0)], click.NATIVE_DRAG),
+    ("cat card grab", (1300, 900), (1300, 600),
+     [("move", 0.5), ("drag", 1.0)], click.NATIVE_DRAG),
+    ("star map scroll", (900, 600), (185, 600),
+     [("move", 0.0), ("press", 0), ("drag", 0.0), ("release", 0)],
+     {"steps": 1, "step_delay": 0.1, "hold": 0.1, "move_duration": 0.1}),  # star_pick_up.MAP_DRAG
+]
+
+
+class TweenRecordingInput(RecordingInput):
+    """
+    Records the pointer events PyAutoGUI posts for duration-based moves, taking as long as it does.
+    """
+
+    def tween(self, x, y, to_x, to_y, duration):
+        steps = max(abs(to_x - x), abs(to_y - y))
+        if duration <= MINIMUM_DURATION or steps == 0:
+            self._record("move", to_x, to_y)
+            return
+        sleep = duration / steps
+        if sleep < MINIMUM_SLEEP:
+            steps = int(duration / MINIMUM_SLEEP)
+            sleep = duration / steps
+        for i in range(1, steps + 1):
+            self._record("move", x + (to_x - x) * i / steps, y + (to_y - y) * i / steps)
+            time.sleep(sleep)
+
+    def run(self, start, end, calls):
+        x, y = start
+        for call, seconds in calls:
+            if call == "move":
+                self.tween(x, y, start[0], start[1], seconds)
+            elif call == "drag":
+                self._record("press", x, y)
+                self.tween(x, y, end[0], end[1], seconds)
+                self._record("release", *end)
+                x, y = end
+            elif call == "pause":
+                time.sleep(seconds)
+                continue
+            else:
+                self._record(call, x, y)
+            time.sleep(PYAUTOGUI_PAUSE)
+
+
+def measure(action, repeat):
+    """Return (mean seconds, mean events) of action(), which performs one drag and returns its event count."""
+    events = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        events += action()
+    return (time.perf_counter() - start) / repeat, events / repeat
+
+
+def run(repeat, steps, step_delay):
+    results = []
+    for name, start, end, calls, native in SCENARIOS:
+        def old():
+            backend = TweenRecordingInput()
+            backend.run(start, end, calls)
+            return len(backend.events)
+
+        kwargs = dict(native)
+        if steps is not None:
+            kwargs["steps"] = steps
+        if step_delay is not None:
+            kwargs["step_delay"] = step_delay
+
+        def new():
+            backend = RecordingInput(realtime=True)
+            previous = set_input_backend(backend)
+            try:
+                pause = sum(s for call, s in calls if call == "pause")
+                drag(start[0], start[1], end[0], end[1], pause=pause, **kwargs)
+            finally:
+                set_input_backend(previous)
+            # A native drag posts the move to the start, the press, its steps and the release
+            return kwargs.get("steps", click.DRAG_STEPS) + 3
+
+        old_seconds, old_events = measure(old, repeat)
+        new_seconds, new_events = measure(new, repeat)
+        results.append((name, old_seconds, old_events, new_seconds, new_events))
+
+    log("=" * 70)
+    log(f"{'drag':>16} {'old s':>8} {'events':>7} {'native s':>9} {'events':>7} {'speedup':>8}")
+    for name, old_seconds, old_events, new_seconds, new_events in results:
+        log(f"{name:>16} {old_seconds:8.2f} {old_events:7.0f} {new_seconds:9.2f} {new_events:7.0f} "
+            f"{old_seconds / new_seconds:7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the PyAutoGUI and native drag paths")
+    parser.add_argument("--repeat", type=int, default=2, help="Drags per scenario and path")
+    parser.add_argument("--steps", type=int, help="Native drag steps (default click.NATIVE_DRAG)")
+    parser.add_argument("--step-delay", type=float, help="Seconds between native drag steps")
+    args = parser.parse_args()
+    run(args.repeat, args.steps, args.step_delay)
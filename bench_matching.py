@@ -0,0 +1,96 @@
+"""
+Benchmark: exhaustive vs pyramid template matching
+
+Matches every template referenced by common.resource_map against saved
+screenshots with both engines and reports latency and agreement.
+
+Usage:
+    python bench_matching.py
+    python bench_matching.py --images test_snapshot.png debug_screenshot.png --repeat 3
+"""
+import argparse
+import os
+import statistics
+import time
+
+import cv2
+
+import common
+from common import resource_map, templates, _match_in
+from log_helper import log
+
+DEFAULT_IMAGES = ["test_snapshot.png", "debug_screenshot.png", "pics/img.png"]
+
+
+def time_match(gray, template, mode, repeat):
+    """Return (best latency in ms, score, top-left) of matching one template."""
+    best = None
+    score, loc = -1.0, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        score, loc = _match_in(gray, template, mode=mode)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, score, loc
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(images, threshold, repeat):
+    paths = sorted({path for scope in resource_map.values() for path in scope.values() if os.path.exists(path)})
+    latencies = {"exhaustive": [], "pyramid": []}
+    compared = agreed = 0
+    loc_errors = []
+    disagreements = []
+
+    for image_path in images:
+        gray = cv2.imread(image_path, 0)
+        if gray is None:
+            log(f"Skipping {image_path}: cannot be read")
+            continue
+        log(f"Image {image_path} ({gray.shape[1]}x{gray.shape[0]})")
+        for path in paths:
+            template = templates.get_template(path)
+            if template is None or template.height > gray.shape[0] or template.width > gray.shape[1]:
+                continue
+            ex_ms, ex_score, ex_loc = time_match(gray, template, "exhaustive", repeat)
+            py_ms, py_score, py_loc = time_match(gray, template, "pyramid", repeat)
+            latencies["exhaustive"].append(ex_ms)
+            latencies["pyramid"].append(py_ms)
+
+            compared += 1
+            ex_found, py_found = ex_score >= threshold, py_score >= threshold
+            if ex_found == py_found:
+                agreed += 1
+                if ex_found:
+                    loc_errors.append(max(abs(ex_loc[0] - py_loc[0]), abs(ex_loc[1] - py_loc[1])))
+            else:
+                disagreements.append(f"{image_path}: {path} exhaustive={ex_score:.3f} pyramid={py_score:.3f}")
+
+    if not compared:
+        log("Nothing to compare")
+        return
+
+    log("=" * 70)
+    for mode, values in latencies.items():
+        log(f"{mode:>10}: mean {statistics.mean(values):7.2f} ms, p50 {percentile(values, 50):7.2f} ms, "
+            f"p95 {percentile(values, 95):7.2f} ms, total {sum(values):8.1f} ms")
+    log(f"Speedup (total): {sum(latencies['exhaustive']) / max(sum(latencies['pyramid']), 1e-9):.2f}x")
+    log(f"Found/not-found agreement at th={threshold}: {agreed}/{compared} ({100.0 * agreed / compared:.1f}%)")
+    if loc_errors:
+        log(f"Location error on common hits: max {max(loc_errors)} px, mean {statistics.mean(loc_errors):.2f} px")
+    for line in disagreements:
+        log(f"  Disagreement - {line}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare exhaustive and pyramid template matching")
+    parser.add_argument("--images", nargs="+", default=DEFAULT_IMAGES, help="Screenshots to search")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Confidence threshold")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per template, the fastest is kept")
+    args = parser.parse_args()
+    common.CHANGE_GATE = False  # Repeated searches of the same image must really run
+    run(args.images, args.threshold, args.repeat)
@@ -3,6 +3,8 @@ import argparse
 
 from common import *
 from config_coords import ConfigCoords
+import metrics
+from screen_wait import click_until_gone
 
 
 class BossFight:
@@ -99,42 +101,30 @@ class BossFight:
         self.fight(use_diam)
         self.collect_gift()
         self.exit_fight(fight_type)
+        metrics.BOSS_FIGHTS.inc()
 
     def exit_fight(self, fight_type):
         if fight_type == 0:
-            while single_find("BossEnd"):
-                click_at(self.rb.x / self.sft, self.rb.y / self.sft)
-                time.sleep(2)
-
-            while single_find("WGoHome"):
-                center = get_center("WGoHome", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(3)
+            click_until_gone("BossEnd", (self.rb.x / self.sft, self.rb.y / self.sft), timeout=None)
+            click_until_gone("WGoHome", timeout=None, retry_interval=3, sft=self.sft)
             print("Click go home")
         else:
-            while single_find("BossEnd"):
-                click_at(self.rb.x / self.sft, self.rb.y / self.sft)
-                time.sleep(2)
+            click_until_gone("BossEnd", (self.rb.x / self.sft, self.rb.y / self.sft), timeout=None)
             print("Finish fight!")
-            while single_find("GoHome"):
-                center = get_center("GoHome", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(3)
+            click_until_gone("GoHome", timeout=None, retry_interval=3, sft=self.sft)
             print("Click go home")
-            while single_find("Challenge"):
-                try:
-                    center = get_center("Exit", "Single")
-                    click_at(center.x / self.sft, center.y / self.sft)
-                    time.sleep(3)
-                except:
-                    print("Some ads flying!")
+            click_until_gone("Challenge", self.click_exit, timeout=None, retry_interval=3)
             print("Close the boss site")
-            while single_find("BossBack"):
-                center = get_center("BossBack", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(3)
+            click_until_gone("BossBack", timeout=None, retry_interval=3, sft=self.sft)
             print("Exited to the main entry")
 
+    def click_exit(self):
+        center = get_center("Exit", "Single")
+        if center is None:
+            print("Some ads flying!")
+            return
+        click_at(center.x / self.sft, center.y / self.sft)
+
     def fight(self, use_diam=False):
         while not simple_single_find("BossEnd", "Single", 0.8):
             if use_diam and simple_single_find("BossDiam", "Single", 0.8):
@@ -1,13 +1,65 @@
+import json
 import platform
-import pyautogui
+import threading
+import time
+
+try:
+    import pyautogui
+    pyautogui.FAILSAFE = False
+except Exception:  # No display (e.g. headless replay), only RecordingInput can be used
+    pyautogui = None
+
+# Callbacks notified after every input event posted through this module
+_input_listeners = []
+
+# Several bot threads share one mouse (see orchestrator.py): input is serialized
+input_lock = threading.RLock()
+
+# Drags: the pointer goes to the start point and waits move_duration, the button goes
+# down and is held `hold` seconds, the pointer moves in `steps` even steps step_delay
+# seconds apart, then the button is released.
+# Quartz / SendInput events reach the game as posted: a few intermediate positions
+# register the swipe, about 0.4 s in total.
+NATIVE_DRAG = {"steps": 12, "step_delay": 0.02, "hold": 0.05, "move_duration": 0.1}
+# PyAutoGUI fallback (Linux): as long as the PyAutoGUI drags the callers were tuned with
+# (moveTo over 0.5 s, then dragTo over 1 s).
+FALLBACK_DRAG = {"steps": 20, "step_delay": 0.05, "hold": 0.0, "move_duration": 0.5}
+_DRAG = NATIVE_DRAG if platform.system() in ("Darwin", "Windows") else FALLBACK_DRAG
+DRAG_STEPS = _DRAG["steps"]
+DRAG_STEP_DELAY = _DRAG["step_delay"]
+DRAG_HOLD = _DRAG["hold"]  # Seconds the button is held at the start point before moving
+DRAG_MOVE_DURATION = _DRAG["move_duration"]
+SCROLL_CHUNK = 10  # Lines per scroll event on macOS, as PyAutoGUI posts them
+
+
+def add_input_listener(listener):
+    """
+    Register a callback invoked as listener(action, args) after every input event.
+    :param listener: Callable taking the action name (str) and its argument tuple
+    """
+    if listener not in _input_listeners:
+        _input_listeners.append(listener)
+
+
+def remove_input_listener(listener):
+    """
+    Unregister a callback added with add_input_listener.
+    :param listener: Previously registered callable
+    """
+    if listener in _input_listeners:
+        _input_listeners.remove(listener)
+
+
+def _notify(action, *args):
+    for listener in _input_listeners:
+        listener(action, args)
 
-pyautogui.FAILSAFE = False
 
 # Platform-specific imports and click implementation
 if platform.system() == "Darwin":  # macOS
     import Quartz
     
-    def click_at(x, y):
+    def _click_at(x, y):
         """
         Simulate a mouse click at the specified (x, y) coordinates using Quartz (macOS).
         :param x: Horizontal coordinate (int)
@@ -25,7 +77,7 @@ if platform.system() == "Darwin":  # macOS
         )
         Quartz.CGEventPost(Quartz.kCGHIDEventTap, event_up)
     
-    def move_to(x, y):
+    def _move_to(x, y):
         """
         Move the mouse pointer to the specified (x, y) coordinates using Quartz (macOS).
         :param x: Horizontal coordinate (int)
@@ -35,9 +87,33 @@ if platform.system() == "Darwin":  # macOS
             None, Quartz.kCGEventMouseMoved, (x, y), Quartz.kCGMouseButtonLeft
         )
         Quartz.CGEventPost(Quartz.kCGHIDEventTap, event_move)
-        
+
+    def _mouse_event(kind, x, y):
+        event = Quartz.CGEventCreateMouseEvent(None, kind, (x, y), Quartz.kCGMouseButtonLeft)
+        Quartz.CGEventPost(Quartz.kCGHIDEventTap, event)
+
+    def _press(x, y):
+        _mouse_event(Quartz.kCGEventLeftMouseDown, x, y)
+
+    def _release(x, y):
+        _mouse_event(Quartz.kCGEventLeftMouseUp, x, y)
+
+    def _drag_to(x, y):
+        # Moves with the button down must be drag events, plain moves are ignored by the game
+        _mouse_event(Quartz.kCGEventLeftMouseDragged, x, y)
+
+    def _scroll(clicks):
+        # Split like PyAutoGUI did: macOS accelerates one large event to a different distance
+        clicks = int(clicks)
+        sign = 1 if clicks >= 0 else -1
+        chunks = [SCROLL_CHUNK] * (abs(clicks) // SCROLL_CHUNK) + [abs(clicks) % SCROLL_CHUNK]
+        for lines in chunks:
+            if lines:
+                event = Quartz.CGEventCreateScrollWheelEvent(None, Quartz.kCGScrollEventUnitLine, 1, sign * lines)
+                Quartz.CGEventPost(Quartz.kCGHIDEventTap, event)
+
 else:  # Windows and other platforms
-    def click_at(x, y):
+    def _click_at(x, y):
         """
         Simulate a mouse click at the specified (x, y) coordinates using PyAutoGUI.
         :param x: Horizontal coordinate (int)
@@ -45,10 +121,237 @@ else:  # Windows and other platforms
         """
         pyautogui.click(x, y)
 
-    def move_to(x, y):
+    def _move_to(x, y):
         """
         Move the mouse pointer to the specified (x, y) coordinates using PyAutoGUI.
         :param x: Horizontal coordinate (int)
         :param y: Vertical coordinate (int)
         """
         pyautogui.moveTo(x, y)
+
+    if platform.system() == "Windows":
+        import ctypes
+        from ctypes import wintypes
+
+        class _MOUSEINPUT(ctypes.Structure):
+            _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG), ("mouseData", ctypes.c_long),
+                        ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD),
+                        ("dwExtraInfo", ctypes.POINTER(wintypes.ULONG))]
+
+        class _INPUT(ctypes.Structure):
+            # MOUSEINPUT is the largest member of the INPUT union, so it alone gives the right size
+            _fields_ = [("type", wintypes.DWORD), ("mi", _MOUSEINPUT)]
+
+        _MOVE, _LEFTDOWN, _LEFTUP, _WHEEL, _ABSOLUTE = 0x0001, 0x0002, 0x0004, 0x0800, 0x8000
+
+        def _send_mouse(flags, x=0, y=0, data=0):
+            """
+            Post one mouse event with SendInput, at (x, y) screen coordinates when flags has _ABSOLUTE.
+            """
+            user32 = ctypes.windll.user32
+            if flags & _ABSOLUTE:
+                # Absolute positions are normalized to 0..65535 over the primary screen
+                x = int(x * 65535 / max(1, user32.GetSystemMetrics(0) - 1))
+                y = int(y * 65535 / max(1, user32.GetSystemMetrics(1) - 1))
+            event = _INPUT(0, _MOUSEINPUT(x, y, data, flags, 0, None))
+            user32.SendInput(1, ctypes.byref(event), ctypes.sizeof(_INPUT))
+
+        def _press(x, y):
+            _send_mouse(_MOVE | _ABSOLUTE | _LEFTDOWN, x, y)
+
+        def _release(x, y):
+            _send_mouse(_MOVE | _ABSOLUTE | _LEFTUP, x, y)
+
+        def _drag_to(x, y):
+            _send_mouse(_MOVE | _ABSOLUTE, x, y)
+
+        def _scroll(clicks):
+            _send_mouse(_WHEEL, data=int(clicks))
+
+    else:  # No native path (Linux): PyAutoGUI without its tweening
+        def _press(x, y):
+            pyautogui.mouseDown(x, y, _pause=False)
+
+        def _release(x, y):
+            pyautogui.mouseUp(x, y, _pause=False)
+
+        def _drag_to(x, y):
+            pyautogui.moveTo(x, y, _pause=False)
+
+        def _scroll(clicks):
+            pyautogui.vscroll(clicks, _pause=False)
+
+
+class NativeInput:
+    """
+    Posts input events to the OS: Quartz on macOS, PyAutoGUI clicks with SendInput
+    drags and scrolls on Windows, PyAutoGUI elsewhere.
+    """
+
+    def click(self, x, y):
+        _click_at(x, y)
+
+    def move(self, x, y):
+        _move_to(x, y)
+
+    def drag(self, x, y, to_x, to_y, steps, step_delay, hold, pause):
+        _move_to(x, y)
+        if pause > 0:
+            time.sleep(pause)
+        _press(x, y)
+        time.sleep(hold)
+        for i in range(1, steps + 1):
+            _drag_to(x + (to_x - x) * i / steps, y + (to_y - y) * i / steps)
+            time.sleep(step_delay)
+        _release(to_x, to_y)
+
+    def long_press(self, x, y, seconds):
+        pyautogui.moveTo(x, y)
+        pyautogui.mouseDown()
+        time.sleep(seconds)
+        pyautogui.mouseUp()
+
+    def scroll(self, clicks):
+        _scroll(clicks)
+
+    def key(self, key):
+        pyautogui.press(key)
+
+
+class RecordingInput:
+    """
+    Records input events instead of sending them (replay, dry runs, headless tests).
+
+    With realtime=True drags and long presses take as long as NativeInput's would,
+    which bench_input.py uses to time input paths without a display.
+    """
+
+    def __init__(self, realtime=False):
+        self.events = []  # (timestamp, action, args)
+        self.realtime = realtime
+
+    def _record(self, action, *args):
+        self.events.append((time.time(), action, args))
+
+    def click(self, x, y):
+        self._record("click", x, y)
+
+    def move(self, x, y):
+        self._record("move", x, y)
+
+    def drag(self, x, y, to_x, to_y, steps, step_delay, hold, pause):
+        if self.realtime:
+            time.sleep(pause + hold + steps * step_delay)
+        self._record("drag", x, y, to_x, to_y)
+
+    def long_press(self, x, y, seconds):
+        if self.realtime:
+            time.sleep(seconds)
+        self._record("long_press", x, y, seconds)
+
+    def scroll(self, clicks):
+        self._record("scroll", clicks)
+
+    def key(self, key):
+        self._record("key", key)
+
+    def save(self, path):
+        """
+        Write the recorded events as JSON lines.
+        :param path: Output file path
+        """
+        with open(path, "w") as f:
+            for timestamp, action, args in self.events:
+                f.write(json.dumps({"t": timestamp, "action": action, "args": list(args)}) + "\n")
+
+
+input_backend = NativeInput() if pyautogui is not None else RecordingInput()
+
+
+def set_input_backend(backend):
+    """
+    Select where input events go, e.g. a RecordingInput for replay.
+    :param backend: NativeInput, RecordingInput or any object with the same methods
+    :return: The previous backend
+    """
+    global input_backend
+    previous = input_backend
+    input_backend = backend
+    return previous
+
+
+def click_at(x, y):
+    """
+    Click at the specified (x, y) logical coordinates.
+    :param x: Horizontal coordinate (int)
+    :param y: Vertical coordinate (int)
+    """
+    with input_lock:
+        input_backend.click(x, y)
+        _notify("click", x, y)
+
+
+def move_to(x, y):
+    """
+    Move the mouse pointer to the specified (x, y) logical coordinates.
+    :param x: Horizontal coordinate (int)
+    :param y: Vertical coordinate (int)
+    """
+    with input_lock:
+        input_backend.move(x, y)
+        _notify("move", x, y)
+
+
+def drag(x, y, to_x, to_y, steps=None, step_delay=None, hold=None, pause=0, move_duration=None):
+    """
+    Press at (x, y) and drag to (to_x, to_y) with the left button, with native events.
+    :param x: Start horizontal coordinate
+    :param y: Start vertical coordinate
+    :param to_x: End horizontal coordinate
+    :param to_y: End vertical coordinate
+    :param steps: Intermediate pointer positions (default DRAG_STEPS)
+    :param step_delay: Seconds between two positions (default DRAG_STEP_DELAY)
+    :param hold: Seconds to hold the button at the start point (default DRAG_HOLD)
+    :param pause: Extra seconds to wait between reaching the start point and pressing
+    :param move_duration: Seconds the pointer waits at the start point (default DRAG_MOVE_DURATION)
+    """
+    steps = DRAG_STEPS if steps is None else max(1, int(steps))
+    step_delay = DRAG_STEP_DELAY if step_delay is None else step_delay
+    hold = DRAG_HOLD if hold is None else hold
+    move_duration = DRAG_MOVE_DURATION if move_duration is None else move_duration
+    with input_lock:
+        input_backend.drag(x, y, to_x, to_y, steps, step_delay, hold, move_duration + pause)
+        _notify("drag", x, y, to_x, to_y)
+
+
+def long_press(x, y, seconds=2):
+    """
+    Hold the left button at (x, y) for the given number of seconds.
+    :param x: Horizontal coordinate
+    :param y: Vertical coordinate
+    :param seconds: How long to keep the button pressed
+    """
+    with input_lock:
+        input_backend.long_press(x, y, seconds)
+        _notify("long_press", x, y, seconds)
+
+
+def vscroll(clicks):
+    """
+    Scroll vertically at the current pointer position.
+    :param clicks: Scroll amount, positive is up
+    """
+    with input_lock:
+        input_backend.scroll(clicks)
+        _notify("scroll", clicks)
+
+
+def press_key(key):
+    """
+    Press and release a keyboard key.
+    :param key: PyAutoGUI key name, e.g. "esc" or "space"
+    """
+    with input_lock:
+        input_backend.key(key)
+        _notify("key", key)
+
@@ -1,27 +1,44 @@
-import ctypes
+import json
+import os
 import platform
+import sys
+import threading
 import time
-from datetime import datetime
 
 import cv2
 import numpy as np
-import pyautogui
+try:
+    import pyautogui
+except Exception:  # No display (e.g. headless replay), use a FileCapture backend
+    pyautogui = None
 from platform_config import get_image_path
-from collections import namedtuple
+from display_geometry import display
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 DEBUG = False
 
-Point = namedtuple('Point', ['x', 'y'])
+# Template matching mode: "exhaustive" (full resolution) or "pyramid" (coarse-to-fine)
+MATCH_MODE = "exhaustive"
+PYRAMID_MAX_LEVEL = 2  # Deepest pyramid level, each level halves the resolution
+PYRAMID_MIN_SIZE = 12  # Smallest template side (px) still matched at a coarse level
+PYRAMID_CANDIDATES = 3  # Coarse peaks refined at full resolution per best-match search
+PYRAMID_SLACK = 0.15  # How far below the threshold coarse peaks may score for find_all
+PEAK_DILATE_MIN = 2048  # Above this many candidate pixels, find_peaks prunes to local maxima first
+CHANGE_GATE = False  # Reuse a template's last result while its search area is unchanged (opt-in)
+GATE_SCALE = 2  # Downscale factor of the thumbnail compared by the change gate
+GATE_PIXEL_DIFF = 12  # Largest thumbnail gray-level difference still counted as unchanged
+GATE_MAX_SKIPS = 10  # Reused results in a row before the match runs again anyway
+GATE_MAX_AGE = 2.0  # Seconds a result is reused before the match runs again anyway
 
-# Platform-specific imports
-if platform.system() == "Windows":
-    import ctypes
-else:
-    import Quartz
+Point = namedtuple('Point', ['x', 'y'])
 
-from click import click_at
+# Result of one template in a batched detect() call; location is the logical center
+Detection = namedtuple('Detection', ['found', 'score', 'location'])
+NOT_CHECKED = Detection(False, None, None)
 
-coor_dict = {}
+from click import click_at, add_input_listener
+from log_helper import flush as log_flush, log, log_prefix, set_log_prefix
 
 # Load the button templates (for multiple buttons)
 main_map = {
@@ -211,56 +228,775 @@ resource_map = {
     "Single": single_find_map,
 }
 
-but_list = {}
+but_list = {}  # (view, button) -> get_all() result, see _view_key()
+
+
+
+class Template:
+    """
+    A decoded grayscale template held in memory by the TemplateRegistry.
+    """
+
+    def __init__(self, path, image, mtime):
+        self.path = path
+        self.image = image
+        self.height, self.width = image.shape[:2]
+        self.mtime = mtime
+        self._levels = [image]
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    def level(self, n):
+        """
+        Return the template downscaled n times by cv2.pyrDown (level 0 is the original).
+        """
+        while len(self._levels) <= n:
+            self._levels.append(cv2.pyrDown(self._levels[-1]))
+        return self._levels[n]
+
+    @property
+    def pyramid_level(self):
+        """
+        Deepest level (<= PYRAMID_MAX_LEVEL) at which the template keeps PYRAMID_MIN_SIZE pixels.
+        """
+        level = 0
+        while level < PYRAMID_MAX_LEVEL and min(self.height, self.width) >> (level + 1) >= PYRAMID_MIN_SIZE:
+            level += 1
+        return level
+
+
+class TemplateRegistry:
+    """
+    In-memory registry of grayscale templates keyed by file path.
+
+    Templates are decoded once (lazily on first use, or eagerly via preload())
+    and shared by every finder, so matching never touches the disk in the hot
+    loop. A template file that changes on disk can be swapped in with reload()
+    or reload_changed(); get() also re-checks a file's mtime at most every
+    check_interval seconds so new art is picked up without a restart.
+    """
+
+    def __init__(self, check_interval=10.0):
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._templates = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+
+    def _load(self, path):
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        image = cv2.imread(path, 0)
+        if image is None:
+            return None
+        template = Template(path, image, mtime)
+        template.level(template.pyramid_level)
+        with self._lock:
+            self._templates[path] = template
+            self._checked_at[path] = time.time()
+        return template
+
+    def _is_stale(self, template):
+        now = time.time()
+        if now - self._checked_at.get(template.path, 0) < self.check_interval:
+            return False
+        self._checked_at[template.path] = now
+        try:
+            return os.path.getmtime(template.path) != template.mtime
+        except OSError:
+            return False
+
+    def get_template(self, path):
+        """
+        Return the Template for a path, decoding it on first use.
+
+        Returns:
+            Template, or None if the file is missing or unreadable
+        """
+        template = self._templates.get(path)
+        if template is not None and not (self.check_interval > 0 and self._is_stale(template)):
+            self.hits += 1
+            return template
+        self.misses += 1
+        return self._load(path)
+
+    def get(self, path):
+        """
+        Return the grayscale image for a template path, or None if unavailable.
+        """
+        template = self.get_template(path)
+        return None if template is None else template.image
+
+    def preload(self, maps=None):
+        """
+        Decode every template of the given maps (default: all of resource_map).
+
+        Returns:
+            Number of templates now held in memory
+        """
+        maps = resource_map.values() if maps is None else maps
+        for scope in maps:
+            for path in scope.values():
+                if path not in self._templates:
+                    self._load(path)
+        return len(self._templates)
+
+    def reload(self, name_or_path):
+        """
+        Re-read a single template from disk, by button name or file path.
+
+        Returns:
+            True if the template was (re)loaded, False otherwise
+        """
+        path = resolve_template_path(name_or_path)
+        if path is None:
+            return False
+        return self._load(path) is not None
+
+    def reload_changed(self):
+        """
+        Re-read every loaded template whose file changed on disk.
+
+        Returns:
+            List of reloaded paths
+        """
+        reloaded = []
+        for path, template in list(self._templates.items()):
+            try:
+                changed = os.path.getmtime(path) != template.mtime
+            except OSError:
+                continue
+            if changed and self._load(path) is not None:
+                reloaded.append(path)
+        return reloaded
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+            self._checked_at.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "templates": len(self._templates),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def resolve_template_path(name_or_path):
+    """
+    Resolve a button name (looked up in every resource map) or a path to a template path.
+    """
+    for scope in resource_map.values():
+        if name_or_path in scope:
+            return scope[name_or_path]
+    if os.path.exists(name_or_path):
+        return name_or_path
+    return None
+
+
+templates = TemplateRegistry()
+
+# Per-template thresholds calibrated by thresholds.py; when enabled (-ct / --calibrated-thresholds)
+# they replace the threshold a caller passes
+THRESHOLDS_FILE = os.path.join("configs", "thresholds_mac.json" if platform.system() == "Darwin"
+                               else "thresholds_win.json")
+USE_CALIBRATED_THRESHOLDS = False
+calibrated_thresholds = {}  # normalized template path -> threshold
+
+
+def load_thresholds(path=None):
+    """
+    Load calibrated thresholds (a missing file means none).
+
+    Args:
+        path: JSON file written by thresholds.py (default: THRESHOLDS_FILE); keys are
+              template paths or button names
+
+    Returns:
+        Number of templates with a calibrated threshold
+    """
+    path = path or THRESHOLDS_FILE
+    calibrated_thresholds.clear()
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r") as f:
+        data = json.load(f)
+    for key, value in data.get("thresholds", {}).items():
+        calibrated_thresholds[os.path.normpath(resolve_template_path(key) or key)] = float(value)
+    return len(calibrated_thresholds)
+
+
+def threshold_for(but_path, th):
+    """
+    The calibrated threshold of a template, or th when it has none or USE_CALIBRATED_THRESHOLDS is off.
+    """
+    if not USE_CALIBRATED_THRESHOLDS or not calibrated_thresholds:
+        return th
+    return calibrated_thresholds.get(os.path.normpath(but_path), th)
+
+
+load_thresholds()
+
+
+class SearchRegion:
+    """
+    Where on screen a template is searched first, in physical pixels of the captured image.
+
+    A region is either explicit (a fixed rectangle) or learned from the top-left
+    corners of the last `history` hits, padded by the template size and `margin`.
+    Matching falls back to a full-screen search whenever the region misses.
+    """
+
+    def __init__(self, rect=None, history=5, margin=40, min_hits=2):
+        self.fixed = rect  # (x, y, w, h) or None
+        self.margin = margin
+        self.min_hits = min_hits
+        self.hits = deque(maxlen=history)
+
+    def record_hit(self, x, y):
+        self.hits.append((x, y))
+
+    def shift(self, dx, dy):
+        """Move the region, e.g. when the capture origin moves by (-dx, -dy)."""
+        if self.fixed is not None:
+            x, y, w, h = self.fixed
+            self.fixed = (x + dx, y + dy, w, h)
+        self.hits = deque(((x + dx, y + dy) for x, y in self.hits), maxlen=self.hits.maxlen)
+
+    def bounds(self, template):
+        """
+        Return the (x1, y1, x2, y2) crop to search, or None if nothing is known yet.
+        """
+        if self.fixed is not None:
+            x, y, w, h = self.fixed
+            return int(x), int(y), int(x + w), int(y + h)
+        if len(self.hits) < self.min_hits:
+            return None
+        xs = [p[0] for p in self.hits]
+        ys = [p[1] for p in self.hits]
+        return (int(min(xs) - self.margin), int(min(ys) - self.margin),
+                int(max(xs) + template.width + self.margin), int(max(ys) + template.height + self.margin))
+
+
+# (view, template path) -> SearchRegion; the view is the thread's game window, see _view_key()
+search_regions = {}
+roi_stats = {"roi_hits": 0, "fallbacks": 0, "full": 0}
+ROI_LEARNING = True
+
+
+def set_search_region(but, rect):
+    """
+    Restrict the first search for a button to a fixed rectangle.
+
+    Args:
+        but: Button name or template path
+        rect: (x, y, w, h) in physical screen pixels, or None to clear it
+    """
+    path = resolve_template_path(but)
+    if path is None:
+        return
+    if rect is None:
+        search_regions.pop((_view_key(), path), None)
+    else:
+        ox, oy = screen_origin()
+        search_regions[(_view_key(), path)] = SearchRegion((rect[0] - ox, rect[1] - oy, rect[2], rect[3]))
+
+
+def set_search_region_around(but, center, half_width, half_height):
+    """
+    Restrict the first search for a button to a box around a logical coordinate.
+
+    Args:
+        but: Button name or template path
+        center: (x, y) logical coordinates, as used for clicking
+        half_width: Half box width in logical pixels
+        half_height: Half box height in logical pixels
+    """
+    if center is None:
+        return
+    sft = get_scaling_factor()
+    x, y = center[0] * sft, center[1] * sft
+    set_search_region(but, (x - half_width * sft, y - half_height * sft, 2 * half_width * sft, 2 * half_height * sft))
+
+
+def set_search_region_from_config(but, config, coord_name, half_width=150, half_height=100):
+    """
+    Derive a button's search box from a ConfigCoords entry (relative to run_button).
+
+    Args:
+        but: Button name or template path
+        config: ConfigCoords instance with a known run button
+        coord_name: Name of the coordinate in configs/cood_*.cfg
+        half_width: Half box width in logical pixels
+        half_height: Half box height in logical pixels
+    """
+    set_search_region_around(but, config.get_coord(coord_name), half_width, half_height)
+
+
+def clear_search_regions():
+    search_regions.clear()
+
+
+def forget_view():
+    """
+    Drop the button positions and search regions learned in the calling thread's view,
+    e.g. after its game window moved. Other windows (see orchestrator.py) keep theirs.
+    """
+    view = _view_key()
+    positions.forget(view)
+    for cache in (but_list, search_regions):
+        for key in [key for key in list(cache) if key[0] == view]:
+            cache.pop(key, None)
+
+
+def find_peaks(result, th, radius_x, radius_y=None, max_results=None):
+    """
+    Extract every peak of a matchTemplate result in one vectorized pass.
+
+    Candidates are the pixels above the threshold; when there are many of them
+    only local maxima within the suppression box are kept (a single dilation).
+    Greedy non-maximum suppression then keeps the best peak of every box.
+
+    Args:
+        result: Score matrix from cv2.matchTemplate
+        th: Minimum score of a peak
+        radius_x: Horizontal suppression radius in pixels
+        radius_y: Vertical suppression radius in pixels (default: radius_x)
+        max_results: Stop after this many peaks (None = no cap)
+
+    Returns:
+        List of (x, y, score) top-left positions, best first
+    """
+    radius_y = radius_x if radius_y is None else radius_y
+    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+    if max_val < th:
+        return []
+    above = result >= th
+    if np.count_nonzero(above) > PEAK_DILATE_MIN:
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * int(radius_x) + 1, 2 * int(radius_y) + 1))
+        above &= result >= cv2.dilate(result, kernel)
+    ys, xs = np.nonzero(above)
+    scores = result[ys, xs]
+    order = np.argsort(-scores, kind="stable")
+    xs, ys, scores = xs[order], ys[order], scores[order]
+
+    peaks = []
+    suppressed = np.zeros(len(scores), dtype=bool)
+    for i in range(len(scores)):
+        if suppressed[i]:
+            continue
+        peaks.append((int(xs[i]), int(ys[i]), float(scores[i])))
+        if max_results is not None and len(peaks) >= max_results:
+            break
+        suppressed |= (np.abs(xs - xs[i]) < radius_x) & (np.abs(ys - ys[i]) < radius_y)
+    return peaks
+
+
+# Data derived from the last frame searched: pyramid levels and the change-gate thumbnail.
+# Keyed by array identity; capture buffers are reused, so CaptureBackend.grab() forgets them.
+# One memo per view (_view_key()), so game windows driven at once do not evict each other's.
+# detect() matches on several threads at once, so the memos are only read and extended under _frame_lock.
+_frame_memos = {}  # view -> {"source", "levels", "thumb"}
+_frame_lock = threading.Lock()
+
+
+def _memo(gray_screen):
+    view = _view_key()
+    with _frame_lock:
+        memo = _frame_memos.get(view)
+        if memo is None or memo["source"] is not gray_screen:
+            memo = _frame_memos[view] = {"source": gray_screen, "levels": [gray_screen], "thumb": None}
+        return memo
+
+
+def _forget_frame(gray_screen):
+    with _frame_lock:
+        for view, memo in list(_frame_memos.items()):
+            if memo["source"] is gray_screen:
+                del _frame_memos[view]
+
+
+def _frame_level(gray_screen, n, cache=True):
+    """
+    Return the screen downscaled n times by cv2.pyrDown, reusing levels of the last full frame.
+    """
+    if not cache:
+        level = gray_screen
+        for _ in range(n):
+            level = cv2.pyrDown(level)
+        return level
+    memo = _memo(gray_screen)
+    with _frame_lock:
+        levels = memo["levels"]
+        while len(levels) <= n:
+            levels.append(cv2.pyrDown(levels[-1]))
+        return levels[n]
+
+
+def _coarse_peaks(area, template, level, min_score, max_peaks, cache=True):
+    """
+    Match a template at a coarse pyramid level and return the top peaks.
+
+    Returns:
+        List of (x, y) top-left candidates scaled back to full resolution, best first
+    """
+    small = _frame_level(area, level, cache)
+    small_template = template.level(level)
+    if small.shape[0] < small_template.shape[0] or small.shape[1] < small_template.shape[1]:
+        return []
+    result = cv2.matchTemplate(small, small_template, cv2.TM_CCOEFF_NORMED)
+    th, tw = small_template.shape[:2]
+    peaks = find_peaks(result, min_score, max(1, tw // 2), max(1, th // 2), max_peaks)
+    return [(x << level, y << level) for x, y, score in peaks]
+
+
+def _refine(area, template, x, y, pad):
+    """
+    Match a template at full resolution in a small window around a candidate top-left corner.
+
+    Returns:
+        (score, (x, y)) in area coordinates, or (-1.0, None)
+    """
+    x1, y1 = max(0, x - pad), max(0, y - pad)
+    window = area[y1:y + template.height + pad, x1:x + template.width + pad]
+    if window.shape[0] < template.height or window.shape[1] < template.width:
+        return -1.0, None
+    result = cv2.matchTemplate(window, template.image, cv2.TM_CCOEFF_NORMED)
+    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+    return max_val, (max_loc[0] + x1, max_loc[1] + y1)
+
+
+def _pyramid_matches(area, template, min_score, max_peaks, cache=True):
+    """
+    Coarse-to-fine search: coarse peaks refined at full resolution.
+
+    Returns:
+        List of (score, (x, y)) in area coordinates, best first
+    """
+    level = template.pyramid_level
+    pad = (1 << level) + 2
+    matches = []
+    for x, y in _coarse_peaks(area, template, level, min_score, max_peaks, cache):
+        score, loc = _refine(area, template, x, y, pad)
+        if loc is not None:
+            matches.append((score, loc))
+    matches.sort(key=lambda m: m[0], reverse=True)
+    return matches
+
+
+gate_stats = {"executed": 0, "skipped": 0}
+_gate_results = {}  # (view, key) -> [template, thumbnail of the searched area, result, time matched, times reused]
+_gate_lock = threading.Lock()  # detect() gates from several pool threads
+
+
+def _gate_thumbnail(gray_screen, bounds=None):
+    """
+    Return the change-gate thumbnail of the screen, or of the cells covering bounds.
+    """
+    memo = _memo(gray_screen)
+    with _frame_lock:
+        thumb = memo["thumb"]
+        if thumb is None:
+            height, width = gray_screen.shape[:2]
+            thumb = cv2.resize(gray_screen, (max(1, width // GATE_SCALE), max(1, height // GATE_SCALE)),
+                               interpolation=cv2.INTER_AREA)
+            memo["thumb"] = thumb
+    if bounds is None:
+        return thumb
+    x1, y1 = max(0, bounds[0]) // GATE_SCALE, max(0, bounds[1]) // GATE_SCALE
+    x2, y2 = -(-bounds[2] // GATE_SCALE), -(-bounds[3] // GATE_SCALE)
+    return thumb[y1:max(y1, y2), x1:max(x1, x2)]
+
+
+def _gated(key, template, gray_screen, bounds, compute):
+    """
+    Return compute(), or the result stored under key if the searched area did not change since.
+    A stored result is reused at most GATE_MAX_SKIPS times in a row and for GATE_MAX_AGE seconds,
+    so a change too small for the thumbnail is still seen by the next real match.
+    """
+    if not CHANGE_GATE:
+        return compute()
+    key = (_view_key(), key)
+    thumb = _gate_thumbnail(gray_screen, bounds)
+    with _gate_lock:
+        cached = _gate_results.get(key)
+        if (cached is not None and cached[0] is template and cached[1].shape == thumb.shape
+                and cached[4] < GATE_MAX_SKIPS and time.monotonic() - cached[3] <= GATE_MAX_AGE
+                and (thumb.size == 0 or int(cv2.absdiff(cached[1], thumb).max()) <= GATE_PIXEL_DIFF)):
+            cached[4] += 1
+            gate_stats["skipped"] += 1
+            return cached[2]
+    result = compute()
+    with _gate_lock:
+        gate_stats["executed"] += 1
+        _gate_results[key] = [template, thumb.copy(), result, time.monotonic(), 0]
+    return result
+
+
+def clear_gate():
+    """Forget all gated results, the next searches run the full match."""
+    with _gate_lock:
+        _gate_results.clear()
+
+
+def _match_in(gray_screen, template, bounds=None, mode=None):
+    """
+    Match a template inside an optional crop of the screen.
+    While the crop looks unchanged since the last search, the last result is reused (CHANGE_GATE).
+
+    Args:
+        mode: "exhaustive" or "pyramid" (None = MATCH_MODE)
+
+    Returns:
+        (score, (x, y)) with the top-left corner in full-screen pixels, or (-1.0, None)
+        when the searched area is smaller than the template
+    """
+    mode = mode or MATCH_MODE
+    bounds = tuple(bounds) if bounds is not None else None
+    return _gated((template.path, "best", bounds, mode), template, gray_screen, bounds,
+                  lambda: _match_area(gray_screen, template, bounds, mode))
+
+
+def _match_area(gray_screen, template, bounds, mode):
+    x1 = y1 = 0
+    area = gray_screen
+    if bounds is not None:
+        x1, y1 = max(0, bounds[0]), max(0, bounds[1])
+        area = gray_screen[y1:max(y1, bounds[3]), x1:max(x1, bounds[2])]
+    if area.shape[0] < template.height or area.shape[1] < template.width:
+        return -1.0, None
+    if mode == "pyramid" and template.pyramid_level > 0:
+        matches = _pyramid_matches(area, template, -1.0, PYRAMID_CANDIDATES, cache=bounds is None)
+        if not matches:
+            return -1.0, None
+        max_val, max_loc = matches[0]
+    else:
+        result = cv2.matchTemplate(area, template.image, cv2.TM_CCOEFF_NORMED)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+    return max_val, (max_loc[0] + x1, max_loc[1] + y1)
+
+
+def set_match_mode(mode):
+    """
+    Select the default matching engine: "exhaustive" or "pyramid".
+    """
+    global MATCH_MODE
+    if mode not in ("exhaustive", "pyramid"):
+        raise ValueError(f"Unknown match mode '{mode}'")
+    MATCH_MODE = mode
+
+
+# Callbacks notified after every template search (replay statistics, session recording)
+detection_listeners = []
+
+
+def add_detection_listener(listener):
+    """
+    Register a callback invoked as listener(path, found, score, location, seconds) after every
+    template search.
+    :param listener: Callable taking the template path, whether it passed the threshold, the best
+        score (-1.0 if nothing could be matched), the best match's center in physical pixels
+        (or None) and the search time in seconds
+    """
+    if listener not in detection_listeners:
+        detection_listeners.append(listener)
+
+
+def remove_detection_listener(listener):
+    """
+    Unregister a callback added with add_detection_listener.
+    :param listener: Previously registered callable
+    """
+    if listener in detection_listeners:
+        detection_listeners.remove(listener)
+
+
+def _notify_detection(path, score, location, th, started):
+    if detection_listeners:
+        seconds = time.perf_counter() - started
+        for listener in detection_listeners:
+            listener(path, score >= th, score, location, seconds)
+
+
+def best_match(but_path, gs, th, mode=None):
+    """
+    Find the best match of a template, trying its search region before the full screen.
+
+    Args:
+        but_path: Path to template image
+        gs: Grayscale screenshot (or None to take new one)
+        th: Confidence threshold deciding whether the region search is good enough
+        mode: "exhaustive" or "pyramid" (None = MATCH_MODE)
+
+    Returns:
+        (score, (x, y), template) with (x, y) the top-left corner in physical pixels of
+        the searched image, or (-1.0, None, None) if the template cannot be loaded
+    """
+    gray_screen = screen_shot() if gs is None else gs
+    started = time.perf_counter()
+    score, loc, template = _best_match(but_path, gray_screen, th, mode)
+    center = None if loc is None else (loc[0] + template.width // 2, loc[1] + template.height // 2)
+    _notify_detection(but_path, score, center, th, started)
+    return score, loc, template
+
+
+def _best_match(but_path, gray_screen, th, mode):
+    template = templates.get_template(but_path)
+    if template is None:
+        return -1.0, None, None
+
+    view = _view_key()
+    region = search_regions.get((view, but_path))
+    bounds = region.bounds(template) if region is not None else None
+    if bounds is not None:
+        score, loc = _match_in(gray_screen, template, bounds, mode)
+        if score >= th:
+            roi_stats["roi_hits"] += 1
+            return score, loc, template
+        roi_stats["fallbacks"] += 1
+    else:
+        roi_stats["full"] += 1
+
+    score, loc = _match_in(gray_screen, template, mode=mode)
+    if score >= th and ROI_LEARNING and loc is not None:
+        if region is None:
+            region = search_regions.setdefault((view, but_path), SearchRegion())
+        if region.fixed is None:
+            region.record_hit(loc[0], loc[1])
+    return score, loc, template
+
+
+class PositionCache:
+    """
+    Last known position of each button, for get_center().
+
+    A cached position is reused only after a match in a small area around it
+    confirms the button is still there; otherwise (or once ttl seconds passed
+    since the last confirmation) the normal search runs. Scroll and drag input
+    moves the page, so it clears the cache.
+    """
+
+    def __init__(self, ttl=60.0, margin=8):
+        """
+        Args:
+            ttl: Seconds a position stays usable without being confirmed
+            margin: Pixels searched around the cached spot (physical)
+        """
+        self.ttl = ttl
+        self.margin = margin
+        self.hits = 0  # Cached spot verified
+        self.verify_failures = 0  # Cached spot no longer matched, full search
+        self.misses = 0  # Nothing cached (or expired), full search
+        self._entries = {}  # (view, path) -> (top-left, time confirmed), see _view_key()
+        self._lock = threading.Lock()
+
+    def find(self, but_path, gs, th):
+        """
+        Find a template, trying its cached position first.
+
+        Returns:
+            Point center in logical coordinates (screen based when gs is None), or None if not found
+        """
+        gray_screen = screen_shot() if gs is None else gs
+        origin = screen_origin() if gs is None else (0, 0)
+        th = threshold_for(but_path, th)
+        key = (_view_key(), but_path)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and time.time() - entry[1] <= self.ttl:
+            template = templates.get_template(but_path)
+            if template is not None:
+                started = time.perf_counter()
+                x, y = entry[0]
+                bounds = (x - self.margin, y - self.margin,
+                          x + template.width + self.margin, y + template.height + self.margin)
+                score, loc = _match_in(gray_screen, template, bounds)
+                center = None if loc is None else (loc[0] + template.width // 2, loc[1] + template.height // 2)
+                _notify_detection(but_path, score, center, th, started)
+                if score >= th:
+                    self.hits += 1
+                    with self._lock:
+                        self._entries[key] = (loc, time.time())
+                    return _logical_center(loc, template, origin)
+            self.verify_failures += 1
+        else:
+            self.misses += 1
+
+        score, loc, template = best_match(but_path, gray_screen, th)
+        with self._lock:
+            if template is None or score < th:
+                self._entries.pop(key, None)
+                return None
+            self._entries[key] = (loc, time.time())
+        return _logical_center(loc, template, origin)
+
+    def invalidate(self, *args):
+        with self._lock:
+            self._entries.clear()
+
+    def forget(self, view):
+        """Drop the positions cached for one view (a _view_key() value)."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == view]:
+                del self._entries[key]
 
-no_cache_list = ["CatHouse", "Exit", "Replace", "Chat", "RollRed", "DiamRed", "Confirm", "Challenge", "StarPick",
-                 "ShipFree", "Star", "BlackMarket", "CloseTab"]
+    def on_input(self, action, args):
+        if action in ("scroll", "drag"):
+            self.invalidate()
+
+    def stats(self):
+        lookups = self.hits + self.verify_failures + self.misses
+        return {"hits": self.hits, "verify_failures": self.verify_failures, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+positions = PositionCache()
+add_input_listener(positions.on_input)
 
 # Define a new print function with a timestamp
 # Save the original built-in print function
 original_print = print
 
 
-def print(*args, **kwargs):
+def print(*args, sep=" ", end="\n", file=None, flush=False):
     """
-    Custom print function with a timestamp.
+    Custom print function with a timestamp: logged as the calling module, see log_helper.
+    Printing to a file or with another end (e.g. a progress line) is left to the built-in print.
     """
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    # Call the original print function
-    original_print(f'[{timestamp}]', *args, **kwargs)
+    if file is not None or end != "\n":
+        log_flush()  # Queued messages first, so both streams stay in order on a terminal
+        original_print(*args, sep=sep, end=end, file=file, flush=flush)
+        return
+    log(sep.join(str(arg) for arg in args), logger=sys._getframe(1).f_globals.get("__name__"))
+    if flush:
+        log_flush()
 
 
 def get_scaling_factor():
     """
     Get the display scaling factor.
+    Cached process-wide by display_geometry.display, call display.invalidate() to re-read it.
     """
-    if platform.system() == "Windows":
-        hdc = ctypes.windll.user32.GetDC(0)
-        dpi = ctypes.windll.gdi32.GetDeviceCaps(hdc, 88)  # LOGPIXELSX
-        ctypes.windll.user32.ReleaseDC(0, hdc)
-        return dpi / 96  # Standard DPI is 96
-    elif platform.system() == "Darwin":
-        # If macOS support is needed, implement Quartz-based scaling factor logic
-        # Get the main display ID
-        main_display_id = Quartz.CGMainDisplayID()
+    return display.scaling_factor()
 
-        # Get the display mode
-        display_mode = Quartz.CGDisplayCopyDisplayMode(main_display_id)
 
-        # Retrieve the pixel dimensions
-        pixel_width = Quartz.CGDisplayModeGetPixelWidth(display_mode)
-        pixel_height = Quartz.CGDisplayModeGetPixelHeight(display_mode)
+def _on_display_change(old, new):
+    # Cached positions and search regions are in physical pixels of the old geometry
+    print(f"Display geometry changed: {old} -> {new}")
+    positions.invalidate()
+    but_list.clear()
+    clear_search_regions()
 
-        # Retrieve the point dimensions
-        point_width = Quartz.CGDisplayModeGetWidth(display_mode)
-        point_height = Quartz.CGDisplayModeGetHeight(display_mode)
 
-        # Calculate the scaling factor
-        scaling_factor = pixel_width / point_width
-
-        return scaling_factor
-    else:
-        return 1  # Default scaling factor for other systems
+display.add_listener(_on_display_change)
 
 
 def get_center(but, map_scope):
@@ -291,43 +1027,41 @@ def get_center_h(but, map_scope, th):
     """
     Get the center coordinates of a button on the screen.
     Mac-compatible - uses cv2.matchTemplate instead of pyautogui.locateOnScreen.
+    The last position is reused when a quick check confirms it, see PositionCache.
     """
-    if but in no_cache_list or but not in coor_dict:  # Sometimes scroll can change the position
-        try:
-            template_path = resource_map[map_scope][but]
-            center = get_center_with_path(template_path, None, th)
-            if center is not None:
-                coor_dict[but] = center
-            else:
-                print(f"Warning: Button '{but}' not found on screen.")
-                return None
-        except Exception as e:
-            print(f"Error finding button '{but}': {e}")
-            return None
-    return coor_dict.get(but)
+    try:
+        template_path = resource_map[map_scope][but]
+        center = positions.find(template_path, None, th)
+    except Exception as e:
+        print(f"Error finding button '{but}': {e}")
+        return None
+    if center is None:
+        log(f"Warning: Button '{but}' not found on screen.", rate_limit=True)
+    return center
 
 
-def get_all(but, map_scope):
+def get_all(but, map_scope, th=0.8, radius=None, max_results=None):
     """
     Get all matching locations of a button on the screen.
     Mac-compatible - uses cv2.matchTemplate and adjusts for scaling factor.
+    Nearby duplicates are removed by the non-maximum suppression in find_all_with_path.
+
+    Args:
+        but: Button name
+        map_scope: Resource map name
+        th: Confidence threshold
+        radius: Suppression radius, int or (x, y) in physical pixels (default: template based)
+        max_results: Maximum number of matches to return (None = all)
     """
     try:
         template_path = resource_map[map_scope][but]
-        matches = find_all_with_path(template_path, None, 0.8)
+        matches = find_all_with_path(template_path, None, th, radius=radius, max_results=max_results)
         
         # Get scaling factor for coordinate conversion
         sft = get_scaling_factor()
         
-        # Filter out matches that are too close vertically (same as before)
-        coors = []
-        prev_y = None
-        for cx, cy, confidence in matches:
-            if prev_y is None or abs(prev_y - cy) > 20:
-                prev_y = cy
-                # Convert to logical coordinates for clicking
-                coors.append(Point(cx / sft, cy / sft))
-        return coors
+        # Convert to logical coordinates for clicking
+        return [Point(cx / sft, cy / sft) for cx, cy, confidence in matches]
     except Exception as e:
         print(f"Error finding all instances of '{but}': {e}")
         return []
@@ -337,21 +1071,95 @@ def get_all_with_cache(but, map_scope):
     """
     Get all cached locations of a button on the screen.
     """
-    if but not in but_list:
-        but_list[but] = get_all(but, map_scope)
-    return but_list[but]
+    key = (_view_key(), but)
+    if key not in but_list:
+        but_list[key] = get_all(but, map_scope)
+    return but_list[key]
+
+
+_detect_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 4), thread_name_prefix="detect")
+
+
+def _in_view(region, prefix, function, *args):
+    # Run on a pool thread with the caller's game window, so the per-view caches are shared with it,
+    # and with its log prefix, so logs and metrics are attributed to the instance that asked
+    _thread_view.region = region
+    set_log_prefix(prefix)
+    try:
+        return function(*args)
+    finally:
+        _thread_view.region = None
+        set_log_prefix(None)
+
+
+def _detect_one(but_path, gray_screen, th, origin):
+    th = threshold_for(but_path, th)
+    score, loc, template = best_match(but_path, gray_screen, th)
+    if template is None or score < th:
+        return Detection(False, score, None)
+    return Detection(True, score, _logical_center(loc, template, origin))
+
+
+def detect(names, map_scope=None, gs=None, th=0.8, priority=None):
+    """
+    Match several templates against one frame concurrently.
+
+    OpenCV releases the GIL while matching, so the templates run in parallel on
+    a shared thread pool. When a priority template is found the remaining
+    matches are abandoned and reported as NOT_CHECKED.
+
+    Args:
+        names: Iterable of button names
+        map_scope: Resource map to look names up in (None = any map)
+        gs: Grayscale screenshot (or None to use the current frame)
+        th: Confidence threshold, or a dict of name -> threshold (default 0.8)
+        priority: Name or list of names that end the batch as soon as one is found
+
+    Returns:
+        Dict of name -> Detection(found, score, location) in the order of names; locations
+        are logical screen coordinates when gs is None, else relative to gs
+    """
+    gray_screen = screen_shot() if gs is None else gs
+    origin = screen_origin() if gs is None else (0, 0)
+    view = getattr(_thread_view, "region", None)
+    prefix = log_prefix()
+    if isinstance(priority, str):
+        priority = [priority]
+    priority = set(priority or [])
+
+    futures = {}
+    for name in names:
+        path = resource_map[map_scope].get(name) if map_scope else resolve_template_path(name)
+        if path is None:
+            continue
+        name_th = th.get(name, 0.8) if isinstance(th, dict) else th
+        futures[_detect_pool.submit(_in_view, view, prefix, _detect_one, path, gray_screen, name_th, origin)] = name
+
+    results = {}
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[futures[future]] = future.result()
+        if any(results[futures[f]].found and futures[f] in priority for f in done):
+            for future in pending:
+                future.cancel()
+            break
+    return {name: results.get(name, NOT_CHECKED) for name in futures.values()}
+
+
+def detect_scope(map_scope, gs=None, th=0.8, priority=None):
+    """
+    Batched detection of every template of a resource map, see detect().
+    """
+    return detect(resource_map[map_scope].keys(), map_scope, gs, th, priority)
 
 
 def find_button(map_scope):
     """
     Find buttons on the screen by matching templates.
     """
-    gray_screen = screen_shot()
-    bts = []
-    for button_name, template_path in resource_map[map_scope].items():
-        if single_find_with_path(template_path, gray_screen, 0.8):
-            bts.append(button_name)
-    return bts
+    return [name for name, d in detect_scope(map_scope).items() if d.found]
 
 
 def single_find(but):
@@ -362,138 +1170,693 @@ def single_find(but):
     return single_find_with_path(single_find_map[but], None, 0.8)
 
 
-def single_find_with_path(but_path, gs, th):
+def single_find_with_path(but_path, gs, th, mode=None):
     """
     Perform template matching using a specified template path.
     Mac-compatible - uses cv2.matchTemplate with grayscale images.
+    The template's search region is tried first, see best_match().
     
     Args:
         but_path: Path to template image
         gs: Grayscale screenshot (or None to take new one)
-        th: Confidence threshold
+        th: Confidence threshold (replaced by the template's calibrated one, see threshold_for())
+        mode: "exhaustive" or "pyramid" (None = MATCH_MODE)
     
     Returns:
         True if found, False otherwise
     """
-    gray_screen = screen_shot() if gs is None else gs
-    template = cv2.imread(but_path, 0)
+    th = threshold_for(but_path, th)
+    max_val, max_loc, template = best_match(but_path, gs, th, mode)
     if template is None:
         if DEBUG:
             print(f"[ERROR] Unable to load template from '{but_path}'.")
         return False
 
     if DEBUG:
-        print(f"[DEBUG] Template size: {template.shape[1]}x{template.shape[0]}")
-        print(f"[DEBUG] Screen size: {gray_screen.shape[1]}x{gray_screen.shape[0]}")
-    
-    # Perform template matching
-    result = cv2.matchTemplate(gray_screen, template, cv2.TM_CCOEFF_NORMED)
-    threshold = th
-    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-    
-    if DEBUG:
-        print(f"[DEBUG] Best match confidence: {max_val:.4f} (threshold: {threshold})")
+        print(f"[DEBUG] Template size: {template.width}x{template.height}")
+        print(f"[DEBUG] Best match confidence: {max_val:.4f} (threshold: {th})")
         print(f"[DEBUG] Best match location: {max_loc}")
     
-    if max_val >= threshold:
+    if max_val >= th:
         if DEBUG:
-            print(f"[DEBUG] ✅ FOUND (confidence {max_val:.4f} >= {threshold})")
+            print(f"[DEBUG] ✅ FOUND (confidence {max_val:.4f} >= {th})")
         return True
     else:
         if DEBUG:
-            print(f"[DEBUG] ❌ NOT FOUND (confidence {max_val:.4f} < {threshold})")
+            print(f"[DEBUG] ❌ NOT FOUND (confidence {max_val:.4f} < {th})")
         return False
 
 
-def find_all_with_path(but_path, gs, th):
+def find_all_with_path(but_path, gs, th, mode=None, radius=None, max_results=None):
     """
     Find all instances of a template and return their center coordinates.
     
     Args:
         but_path: Path to template image
         gs: Grayscale screenshot (or None to take new one)
-        th: Confidence threshold
+        th: Confidence threshold (replaced by the template's calibrated one, see threshold_for())
+        mode: "exhaustive" or "pyramid" (None = MATCH_MODE)
+        radius: Suppression radius, int or (x, y) in pixels (default: 0.6 x the template's longer side)
+        max_results: Maximum number of matches to return (None = all)
     
     Returns:
-        List of (cx, cy, confidence) tuples for all matches, or empty list if none found
+        List of (cx, cy, confidence) tuples for all matches, best first, or empty list if none found.
+        Centers are physical screen pixels when gs is None, else pixels of gs.
     """
     gray_screen = screen_shot() if gs is None else gs
-    template = cv2.imread(but_path, 0)
+    th = threshold_for(but_path, th)
+    started = time.perf_counter()
+    matches = _find_all(but_path, gray_screen, th, mode, radius, max_results)
+    if matches:
+        _notify_detection(but_path, matches[0][2], matches[0][:2], th, started)
+    else:
+        _notify_detection(but_path, -1.0, None, th, started)
+    if gs is None:
+        ox, oy = screen_origin()
+        if ox or oy:
+            matches = [(cx + ox, cy + oy, score) for cx, cy, score in matches]
+    return matches
+
+
+def _find_all(but_path, gray_screen, th, mode, radius, max_results):
+    template = templates.get_template(but_path)
     if template is None:
         print(f"Error: Unable to load template from '{but_path}'.")
         return []
+    h, w = template.height, template.width
+    if radius is None:
+        radius = int(max(w, h) * 1.2) // 2
+    radius_x, radius_y = radius if isinstance(radius, tuple) else (radius, radius)
+    if gray_screen.shape[0] < h or gray_screen.shape[1] < w:
+        return []
+    mode = mode or MATCH_MODE
+    return list(_gated((template.path, "all", th, mode, radius_x, radius_y, max_results), template, gray_screen, None,
+                  lambda: _find_all_in(gray_screen, template, th, mode, radius_x, radius_y, max_results)))
+
+
+def _find_all_in(gray_screen, template, th, mode, radius_x, radius_y, max_results):
+    h, w = template.height, template.width
+    if mode == "pyramid" and template.pyramid_level > 0:
+        matches = []
+        for score, (x, y) in _pyramid_matches(gray_screen, template, th - PYRAMID_SLACK, 50):
+            if score < th:
+                continue
+            # Refined peaks can converge on the same spot, keep the best one
+            if any(abs(x + w // 2 - cx) < radius_x and abs(y + h // 2 - cy) < radius_y for cx, cy, _ in matches):
+                continue
+            matches.append((x + w // 2, y + h // 2, score))
+            if max_results is not None and len(matches) >= max_results:
+                break
+        return matches
     
     # Perform template matching
-    result = cv2.matchTemplate(gray_screen, template, cv2.TM_CCOEFF_NORMED)
-    h, w = template.shape[:2]
-    
-    matches = []
-    temp_result = result.copy()
-    
-    # Find all matches by iterating and masking
-    while True:
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(temp_result)
-        
-        if max_val < th:
-            break
-        
-        # Found a match - calculate center
-        x, y = max_loc
-        cx = x + w // 2
-        cy = y + h // 2
-        matches.append((cx, cy, max_val))
-        
-        # Mask this region to find next match
-        mask_size = int(max(w, h) * 1.2)
-        y1 = max(0, y - mask_size // 2)
-        y2 = min(temp_result.shape[0], y + mask_size // 2)
-        x1 = max(0, x - mask_size // 2)
-        x2 = min(temp_result.shape[1], x + mask_size // 2)
-        temp_result[y1:y2, x1:x2] = 0
-    
-    return matches
+    result = cv2.matchTemplate(gray_screen, template.image, cv2.TM_CCOEFF_NORMED)
+    return [(x + w // 2, y + h // 2, score) for x, y, score in find_peaks(result, th, radius_x, radius_y, max_results)]
 
 
-def get_center_with_path(but_path, gs, th):
+def get_center_with_path(but_path, gs, th, mode=None):
     """
     Find a template and return its center coordinates.
     Mac-compatible - uses cv2.matchTemplate and adjusts for scaling factor.
+    The template's search region is tried first, see best_match().
     
     Args:
         but_path: Path to template image
         gs: Grayscale screenshot (or None to take new one)
-        th: Confidence threshold
+        th: Confidence threshold (replaced by the template's calibrated one, see threshold_for())
+        mode: "exhaustive" or "pyramid" (None = MATCH_MODE)
     
     Returns:
-        Tuple (cx, cy) in logical coordinates if found, None otherwise
+        Tuple (cx, cy) in logical coordinates if found (screen based when gs is None), None otherwise
     """
-    matches = find_all_with_path(but_path, gs, th)
-    if matches:
-        cx, cy = matches[0][0], matches[0][1]
-        
-        # On Mac, cv2.matchTemplate returns physical pixel coordinates
-        # but pyautogui.click expects logical coordinates
-        # So we need to divide by scaling factor
+    origin = screen_origin() if gs is None else (0, 0)
+    th = threshold_for(but_path, th)
+    max_val, max_loc, template = best_match(but_path, gs, th, mode)
+    if template is None:
+        print(f"Error: Unable to load template from '{but_path}'.")
+        return None
+    if max_val >= th:
+        return _logical_center(max_loc, template, origin)
+    return None
+
+
+def _logical_center(loc, template, origin=(0, 0)):
+    """
+    Center of a match at top-left loc, in logical coordinates.
+    origin is the screen position (physical) of the matched image, see screen_origin().
+    """
+    cx = loc[0] + template.width // 2 + origin[0]
+    cy = loc[1] + template.height // 2 + origin[1]
+
+    # On Mac, cv2.matchTemplate returns physical pixel coordinates
+    # but pyautogui.click expects logical coordinates
+    # So we need to divide by scaling factor
+    sft = get_scaling_factor()
+    cx_logical = cx / sft
+    cy_logical = cy / sft
+
+    if DEBUG:
+        print(f"[DEBUG] Physical pixels: ({cx}, {cy})")
+        print(f"[DEBUG] Scaling factor: {sft}")
+        print(f"[DEBUG] Logical coords: ({cx_logical:.1f}, {cy_logical:.1f})")
+
+    return Point(cx_logical, cy_logical)
+
+
+class Frame:
+    """
+    One screen capture with the time it was taken.
+
+    `gray` is always available; the color image is kept as captured (RGB, or
+    BGRA for native grabs) and converted to RGB only when `rgb` is read.
+    `origin` is the screen position (physical pixels) of the frame's top-left corner.
+    """
+
+    def __init__(self, color, gray, timestamp, color_code=None, origin=(0, 0)):
+        self.color = color
+        self.gray = gray
+        self.timestamp = timestamp
+        self.color_code = color_code  # cv2 conversion code to RGB, None if color is RGB
+        self.origin = origin
+        self._rgb = None
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            self._rgb = self.color if self.color_code is None else cv2.cvtColor(self.color, self.color_code)
+        return self._rgb
+
+    @property
+    def age(self):
+        return time.time() - self.timestamp
+
+
+class FrameCache:
+    """
+    Shares one capture between all detections made within max_age seconds.
+
+    Any input event posted through click.py invalidates the cached frame, so a
+    detection made after a click always sees a fresh screen.
+
+    With start_background() a capture thread keeps a small ring of recent
+    frames filled, so get() usually returns at once and capturing overlaps
+    with matching. get() still only returns frames whose capture started after
+    the last input event.
+    """
+
+    def __init__(self, max_age=0.1):
+        self.max_age = max_age
+        self.captures = 0
+        self.reuses = 0
+        self.waits = 0
+        self.last_input = 0.0  # time.time() of the last input event
+        self._frame = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._new_frame = threading.Condition(self._lock)
+        self._ring = deque(maxlen=4)
+        self._thread = None
+        self._running = False
+        self.interval = 0.05
+
+    def add_listener(self, listener):
+        """Register listener(frame) called after every new capture (e.g. the session recorder)."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _usable(self, frame):
+        return frame is not None and frame.timestamp > self.last_input and frame.age <= self.max_age
+
+    def get(self):
+        """
+        Return the cached frame, capturing a new one if it is missing or stale.
+        """
+        if self._running:
+            frame = self.newer_than(self.last_input, max_age=self.max_age)
+            if frame is not None:
+                return frame
+        with self._lock:
+            frame = self._frame
+            if self._usable(frame):
+                self.reuses += 1
+                return frame
+            # Threads driving other windows (set_thread_region) may still be matching on
+            # an earlier pooled frame, so they each get a buffer of their own
+            frame = capture_frame(pooled=not _region_threads)
+            self._frame = frame
+            self.captures += 1
+        for listener in self._listeners:
+            listener(frame)
+        return frame
+
+    def newer_than(self, timestamp, timeout=1.0, max_age=None):
+        """
+        Return a frame whose capture started after timestamp (e.g. the time of a click).
+
+        Args:
+            timestamp: time.time() value the frame must be newer than
+            timeout: Seconds to wait for the capture thread (without it, capture now)
+            max_age: Also require the frame to be at most this old (None = any age)
+
+        Returns:
+            Frame, or None if the capture thread produced none in time
+        """
+        if not self._running:
+            frame = self.get()
+            return frame if frame.timestamp > timestamp else capture_frame(pooled=not _region_threads)
+        deadline = time.time() + timeout
+        with self._new_frame:
+            while True:
+                frame = self._ring[-1] if self._ring else None
+                if frame is not None and frame.timestamp > timestamp and (max_age is None or frame.age <= max_age):
+                    if frame is self._frame:
+                        self.reuses += 1
+                    self._frame = frame
+                    return frame
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self._running:
+                    return None
+                self.waits += 1
+                self._new_frame.wait(remaining)
+
+    def recent(self):
+        """The frames in the capture thread's ring, oldest first."""
+        with self._lock:
+            return list(self._ring)
+
+    def start_background(self, interval=0.05, size=4):
+        """
+        Capture continuously on a background thread.
+
+        Args:
+            interval: Seconds between the start of two captures
+            size: Frames kept in the ring
+        """
+        if self._running:
+            return
+        self.interval = interval
+        self._ring = deque(maxlen=size)
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, name="frame-capture", daemon=True)
+        self._thread.start()
+
+    def stop_background(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._new_frame:
+            self._new_frame.notify_all()
+
+    def _capture_loop(self):
+        while self._running:
+            started = time.time()
+            try:
+                # Frames outlive the gray buffer pool here, so give each its own buffer
+                frame = capture_frame(pooled=False)
+            except Exception as e:
+                print(f"Background capture failed: {e}")
+                time.sleep(max(self.interval, 0.5))
+                continue
+            with self._new_frame:
+                self._ring.append(frame)
+                self.captures += 1
+                self._new_frame.notify_all()
+            for listener in self._listeners:
+                listener(frame)
+            time.sleep(max(0.0, self.interval - (time.time() - started)))
+
+    def invalidate(self, *args):
+        with self._lock:
+            self._frame = None
+            self.last_input = time.time()
+
+    def stats(self):
+        return {"captures": self.captures, "reuses": self.reuses, "waits": self.waits}
+
+
+class CaptureBackend:
+    """
+    Base class of screen capture backends.
+
+    Subclasses implement grab_color() and return (image, to_gray_code, to_rgb_code,
+    origin). The grayscale conversion writes into a small pool of reused
+    buffers, so a capture allocates no grayscale array of its own. A Frame's
+    gray buffer is recycled after `buffers` further captures; copy it if you
+    need it for longer.
+    """
+
+    name = "base"
+
+    def __init__(self, buffers=3):
+        self._buffers = [None] * buffers
+        self._next = 0
+
+    def _gray_buffer(self, height, width):
+        buffer = self._buffers[self._next]
+        if buffer is None or buffer.shape != (height, width):
+            buffer = np.empty((height, width), dtype=np.uint8)
+            self._buffers[self._next] = buffer
+        self._next = (self._next + 1) % len(self._buffers)
+        return buffer
+
+    @property
+    def origin(self):
+        """Screen position (physical pixels) of the captured image's top-left corner."""
+        return 0, 0
+
+    def grab_color(self):
+        raise NotImplementedError
+
+    def grab(self, pooled=True):
+        """
+        Capture a Frame; pooled=False gives it a gray buffer of its own (for frames kept longer).
+        The timestamp is taken before the grab, so a frame newer than a click was captured after it.
+        """
+        timestamp = time.time()
+        image, to_gray, to_rgb, origin = self.grab_color()
+        if pooled:
+            gray = self._gray_buffer(image.shape[0], image.shape[1])
+            cv2.cvtColor(image, to_gray, dst=gray)
+            _forget_frame(gray)
+        else:
+            gray = cv2.cvtColor(image, to_gray)
+        return Frame(image, gray, timestamp, to_rgb, origin)
+
+
+class PyAutoGuiCapture(CaptureBackend):
+    """
+    Full-desktop capture through pyautogui.screenshot() (PIL).
+    """
+
+    name = "pyautogui"
+
+    def grab_color(self):
+        return np.asarray(pyautogui.screenshot()), cv2.COLOR_RGB2GRAY, None, (0, 0)
+
+
+class MssCapture(CaptureBackend):
+    """
+    Direct buffer grab through the optional `mss` package, without PIL.
+
+    The BGRA buffer returned by mss is wrapped as a NumPy view, not copied.
+    """
+
+    name = "mss"
+
+    def __init__(self, monitor=0, region=None, buffers=3):
+        """
+        Args:
+            monitor: mss monitor index (0 = all monitors)
+            region: Optional (x, y, w, h) in physical pixels to grab instead of the monitor; the
+                grabbed image is always region-sized, in physical pixels
+        """
+        super().__init__(buffers)
+        import mss  # Optional dependency, only needed for this backend
+        self._mss = mss
+        self._local = threading.local()
+        self.monitor = monitor
+        self.region = region
+
+    def _sct(self):
+        # mss handles are bound to the thread that created them
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = self._mss.mss()
+        return sct
+
+    def _area(self):
+        # mss takes logical coordinates (points on a Retina mac), like pyautogui
+        if self.region is not None:
+            sft = get_scaling_factor()
+            x, y, w, h = self.region
+            return {"left": int(x / sft), "top": int(y / sft), "width": int(w / sft), "height": int(h / sft)}
+        return self._sct().monitors[self.monitor]
+
+    @property
+    def origin(self):
+        if self.region is not None:
+            return int(self.region[0]), int(self.region[1])
+        area = self._area()
         sft = get_scaling_factor()
-        cx_logical = cx / sft
-        cy_logical = cy / sft
+        return int(area["left"] * sft), int(area["top"] * sft)
 
-        if DEBUG:
-            print(f"[DEBUG] Physical pixels: ({cx}, {cy})")
-            print(f"[DEBUG] Scaling factor: {sft}")
-            print(f"[DEBUG] Logical coords: ({cx_logical:.1f}, {cy_logical:.1f})")
-        
-        return Point(cx_logical, cy_logical)
-    return None
+    def grab_color(self):
+        sct = self._sct()
+        shot = sct.grab(self._area())
+        image = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        if self.region is not None:
+            w, h = int(self.region[2]), int(self.region[3])
+            if image.shape[1] != w or image.shape[0] != h:
+                image = cv2.resize(image, (w, h), interpolation=cv2.INTER_LINEAR)
+        return image, cv2.COLOR_BGRA2GRAY, cv2.COLOR_BGRA2RGB, self.origin
+
+
+class RegionCapture(CaptureBackend):
+    """
+    Grabs only a rectangle of the screen, through mss when available, else pyautogui.
+
+    Frames carry the rectangle's top-left corner as their origin.
+    """
+
+    name = "region"
+
+    def __init__(self, region, buffers=3):
+        """
+        Args:
+            region: (x, y, w, h) in physical pixels
+        """
+        super().__init__(buffers)
+        self.region = region
+        try:
+            self._mss = MssCapture(region=region, buffers=buffers)
+        except ImportError:
+            self._mss = None
+
+    @property
+    def origin(self):
+        return int(self.region[0]), int(self.region[1])
+
+    def grab_color(self):
+        if self._mss is not None:
+            self._mss.region = self.region
+            return self._mss.grab_color()
+        # pyautogui takes the region in logical coordinates
+        sft = get_scaling_factor()
+        x, y, w, h = self.region
+        shot = pyautogui.screenshot(region=(int(x / sft), int(y / sft), int(w / sft), int(h / sft)))
+        image = np.asarray(shot)
+        if image.shape[1] != int(w) or image.shape[0] != int(h):
+            image = cv2.resize(image, (int(w), int(h)), interpolation=cv2.INTER_LINEAR)
+        return image, cv2.COLOR_RGB2GRAY, None, (int(x), int(y))
+
+
+class FileCapture(CaptureBackend):
+    """
+    Serves saved screenshots instead of the live screen, for replay and benchmarks.
+
+    Images are decoded once. grab() returns the current image until advance()
+    or show() selects another one; with auto_advance every grab moves on.
+    """
+
+    name = "file"
+
+    def __init__(self, paths, loop=True, auto_advance=False, buffers=3, origin=(0, 0)):
+        """
+        Args:
+            paths: Image path, directory of PNG files, or list of paths
+            loop: Start over after the last image
+            auto_advance: Move to the next image after every grab
+            origin: Screen position the images were captured at (window recordings)
+        """
+        super().__init__(buffers)
+        self._origin = tuple(origin)
+        if isinstance(paths, str):
+            if os.path.isdir(paths):
+                paths = sorted(os.path.join(paths, f) for f in os.listdir(paths) if f.lower().endswith(".png"))
+            else:
+                paths = [paths]
+        self.paths = list(paths)
+        if not self.paths:
+            raise ValueError("FileCapture needs at least one image")
+        self.loop = loop
+        self.auto_advance = auto_advance
+        self.index = 0
+        self._images = {}
+
+    @property
+    def current(self):
+        return self.paths[self.index]
+
+    def _image(self, path):
+        image = self._images.get(path)
+        if image is None:
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError(f"Unable to load capture image '{path}'")
+            self._images[path] = image
+        return image
+
+    def advance(self):
+        """Select the next image; returns False when the end is reached without loop."""
+        if self.index + 1 < len(self.paths):
+            self.index += 1
+        elif self.loop:
+            self.index = 0
+        else:
+            return False
+        return True
+
+    def show(self, name):
+        """Select an image by path or file name."""
+        for i, path in enumerate(self.paths):
+            if path == name or os.path.basename(path) == name:
+                self.index = i
+                return True
+        return False
+
+    @property
+    def origin(self):
+        return self._origin
+
+    def grab_color(self):
+        image = self._image(self.current)
+        if self.auto_advance:
+            self.advance()
+        return image, cv2.COLOR_BGR2GRAY, cv2.COLOR_BGR2RGB, self._origin
+
+
+CAPTURE_BACKENDS = {
+    "pyautogui": PyAutoGuiCapture,
+    "mss": MssCapture,
+    "region": RegionCapture,
+    "file": FileCapture,
+}
+
+capture_backend = PyAutoGuiCapture() if pyautogui is not None else None
+
+
+def set_capture_backend(backend, **kwargs):
+    """
+    Select how frames are captured.
+
+    Args:
+        backend: A CaptureBackend instance, or one of CAPTURE_BACKENDS' names
+        kwargs: Constructor arguments when a name is given
+
+    Returns:
+        The active CaptureBackend
+    """
+    global capture_backend
+    if isinstance(backend, str):
+        if backend not in CAPTURE_BACKENDS:
+            raise ValueError(f"Unknown capture backend '{backend}'")
+        backend = CAPTURE_BACKENDS[backend](**kwargs)
+    old_origin = capture_backend.origin if capture_backend is not None else (0, 0)
+    capture_backend = backend
+    frames.invalidate()
+    if backend.origin != old_origin:
+        _on_origin_change(old_origin, backend.origin)
+    return backend
+
+
+def _on_origin_change(old, new):
+    # Cached positions and search regions are relative to the captured image
+    print(f"Capture origin moved: {old} -> {new}")
+    positions.invalidate()
+    # (a thread's window region is in screen pixels, its view does not move with the capture)
+    for (view, path), region in search_regions.items():
+        if view is None:
+            region.shift(old[0] - new[0], old[1] - new[1])
+
+
+def capture_origin():
+    """
+    Screen position (physical pixels) of the captured image's top-left corner, (0, 0) for the full desktop.
+    """
+    return capture_backend.origin if capture_backend is not None else (0, 0)
+
+
+def capture_frame(pooled=True):
+    """
+    Capture the screen into a new Frame with the active backend, bypassing the frame cache.
+    """
+    if capture_backend is None:
+        raise RuntimeError("No screen to capture, select a backend with set_capture_backend()")
+    return capture_backend.grab(pooled)
+
+
+frames = FrameCache()
+add_input_listener(frames.invalidate)
+
+
+def grab_frame():
+    """
+    Get the current Frame (color + grayscale), shared within the staleness window.
+    """
+    return frames.get()
+
+
+# Per-thread view of the screen, used when several game windows are driven at once (orchestrator.py)
+_thread_view = threading.local()
+_region_threads = set()  # Idents of the threads with a region set
+
+
+def set_thread_region(region):
+    """
+    Restrict screen_shot() in the calling thread to one game window.
+    :param region: (x, y, w, h) in physical screen pixels, or None for the whole capture
+    """
+    _thread_view.region = region
+    _thread_view.crop = None
+    if region is None:
+        _region_threads.discard(threading.get_ident())
+    else:
+        _region_threads.add(threading.get_ident())
+
+
+def _view_key():
+    """
+    Key of the calling thread's view for the caches of learned state (search regions, positions,
+    gate results, frame memo): its game window region, or None for the whole capture.
+    """
+    region = getattr(_thread_view, "region", None)
+    return None if region is None else tuple(int(v) for v in region)
+
+
+def screen_origin():
+    """
+    Screen position (physical pixels) of the top-left corner of what screen_shot() returns
+    in the calling thread. Finders add it to the matches they make on their own screenshot.
+    """
+    region = getattr(_thread_view, "region", None)
+    if region is not None:
+        return int(region[0]), int(region[1])
+    return capture_origin()
 
 
 def screen_shot():
     """
     Take a screenshot and convert it to a grayscale image for template matching.
+    Captures are shared through the frame cache, see FrameCache. In a thread with
+    a region (set_thread_region) this is the region's view of the shared frame.
     """
-    screenshot = pyautogui.screenshot()
-    screen = np.array(screenshot)
-    return cv2.cvtColor(screen, cv2.COLOR_RGB2GRAY)
+    gray = frames.get().gray
+    region = getattr(_thread_view, "region", None)
+    if region is None:
+        return gray
+    crop = getattr(_thread_view, "crop", None)
+    if crop is None or crop[0] is not gray:
+        # Keep returning the same view object so per-frame caches keyed by identity still hit
+        ox, oy = capture_origin()
+        x, y, w, h = int(region[0]) - ox, int(region[1]) - oy, int(region[2]), int(region[3])
+        crop = (gray, gray[max(0, y):y + h, max(0, x):x + w])
+        _thread_view.crop = crop
+    return crop[1]
 
 
 def challenge_fight():
@@ -26,12 +26,15 @@ Usage:
 
 import os
 import platform
-from common import Point, get_center, get_scaling_factor
+from common import print, Point, get_center, get_scaling_factor, set_capture_backend, RegionCapture
 from click import click_at
+from display_geometry import display
 
 
 class ConfigCoords:
     """Handles reading and clicking coordinates from platform-specific config files."""
+
+    persist = True  # Write the detected run_button back to the config file (off during replay)
     
     def __init__(self, mock_rb=None):
         """Initialize and load platform-specific configuration.
@@ -218,6 +221,31 @@ class ConfigCoords:
         
         return True
     
+    def window_rect(self, margin=200):
+        """Estimate the game window from the run button and the delta coordinates around it.
+        
+        Args:
+            margin: Padding around the outermost coordinates, in logical pixels
+            
+        Returns:
+            (x, y, w, h) in physical pixels, clipped to the screen
+        """
+        rb_x = self.rb.x if hasattr(self.rb, 'x') else self.rb[0]
+        rb_y = self.rb.y if hasattr(self.rb, 'y') else self.rb[1]
+        xs, ys = [rb_x], [rb_y]
+        for val_x, val_y in self.coords.values():
+            # Absolute entries (run_button itself, fixed screen positions) say nothing about the window
+            if not (val_x > 100 and val_y > 100):
+                xs.append(rb_x + val_x)
+                ys.append(rb_y + val_y)
+        
+        screen_w, screen_h = display.physical_size()
+        x1 = max(0, int((min(xs) - margin) * self.sft))
+        y1 = max(0, int((min(ys) - margin) * self.sft))
+        x2 = min(screen_w, int((max(xs) + margin) * self.sft))
+        y2 = min(screen_h, int((max(ys) + margin) * self.sft))
+        return (x1, y1, x2 - x1, y2 - y1)
+    
     def list_coords(self):
         """Print all available coordinate names."""
         print("\nAvailable coordinates:")
@@ -232,6 +260,9 @@ class ConfigCoords:
             rb_x: Run Button x coordinate (logical)
             rb_y: Run Button y coordinate (logical)
         """
+        if not ConfigCoords.persist:
+            return
+
         # Determine platform-specific config file
         is_mac = (platform.system() == "Darwin")
         config_file = "cood_mac.cfg" if is_mac else "cood_win.cfg"
@@ -272,6 +303,28 @@ class ConfigCoords:
         print(f"✅ Updated {config_file} with run_button: ({rb_x:.0f}, {rb_y:.0f})")
 
 
+def capture_game_window(rect=None, margin=200):
+    """Capture only the game window from now on, instead of the whole desktop.
+    
+    Finders keep returning screen coordinates: the window's position is added
+    to every match made on a window capture.
+    
+    Args:
+        rect: (x, y, w, h) of the window in physical pixels, or None to locate it
+              from the run button and the config offsets (see ConfigCoords.window_rect)
+        margin: Padding in logical pixels when the window is located
+        
+    Returns:
+        The window rectangle (x, y, w, h) in physical pixels
+    """
+    if rect is None:
+        rect = ConfigCoords().window_rect(margin)
+    rect = tuple(int(v) for v in rect)
+    set_capture_backend(RegionCapture(rect))
+    print(f"Capturing game window only: ({rect[0]}, {rect[1]}) {rect[2]}x{rect[3]} [physical pixels]")
+    return rect
+
+
 # Convenience function for one-off clicks
 def click_from_config(name, delay=0):
     """Quick function to click a coordinate from config.
@@ -0,0 +1,155 @@
+"""
+Display geometry service.
+
+Computes the display scaling factor and the physical/logical resolution once
+per process and caches them. The cached values are re-read only when
+refresh_interval seconds have passed or after invalidate() (e.g. after the
+game restarts), and listeners are told when the geometry actually changed.
+
+Backends:
+    WindowsBackend - GetDC/GetDeviceCaps
+    QuartzBackend  - CGDisplayCopyDisplayMode (macOS)
+    StubBackend    - fixed values, used on Linux and for headless tests
+
+Usage:
+    from display_geometry import display, StubBackend
+    display.scaling_factor()
+    display.invalidate()
+    display.set_backend(StubBackend(scaling_factor=2.0, physical_size=(5120, 3328)))
+"""
+import platform
+import threading
+import time
+from collections import namedtuple
+
+Geometry = namedtuple('Geometry', ['scaling_factor', 'physical_width', 'physical_height',
+                                   'logical_width', 'logical_height'])
+
+
+class WindowsBackend:
+    """Reads DPI and resolution through the Win32 GDI API."""
+
+    LOGPIXELSX = 88
+    DESKTOPVERTRES = 117
+    DESKTOPHORZRES = 118
+
+    def read(self):
+        import ctypes
+        user32 = ctypes.windll.user32
+        gdi32 = ctypes.windll.gdi32
+        hdc = user32.GetDC(0)
+        try:
+            dpi = gdi32.GetDeviceCaps(hdc, self.LOGPIXELSX)
+            physical_width = gdi32.GetDeviceCaps(hdc, self.DESKTOPHORZRES)
+            physical_height = gdi32.GetDeviceCaps(hdc, self.DESKTOPVERTRES)
+        finally:
+            user32.ReleaseDC(0, hdc)
+        scaling_factor = dpi / 96  # Standard DPI is 96
+        return Geometry(scaling_factor, physical_width, physical_height,
+                        round(physical_width / scaling_factor), round(physical_height / scaling_factor))
+
+
+class QuartzBackend:
+    """Reads the main display mode through Quartz (macOS)."""
+
+    def read(self):
+        import Quartz
+        display_mode = Quartz.CGDisplayCopyDisplayMode(Quartz.CGMainDisplayID())
+        pixel_width = Quartz.CGDisplayModeGetPixelWidth(display_mode)
+        pixel_height = Quartz.CGDisplayModeGetPixelHeight(display_mode)
+        point_width = Quartz.CGDisplayModeGetWidth(display_mode)
+        point_height = Quartz.CGDisplayModeGetHeight(display_mode)
+        return Geometry(pixel_width / point_width, pixel_width, pixel_height, point_width, point_height)
+
+
+class StubBackend:
+    """Fixed geometry for Linux and headless runs."""
+
+    def __init__(self, scaling_factor=1, physical_size=(1920, 1080)):
+        self.scaling_factor = scaling_factor
+        self.physical_size = physical_size
+
+    def read(self):
+        width, height = self.physical_size
+        return Geometry(self.scaling_factor, width, height,
+                        round(width / self.scaling_factor), round(height / self.scaling_factor))
+
+
+def default_backend():
+    system = platform.system()
+    if system == "Windows":
+        return WindowsBackend()
+    if system == "Darwin":
+        return QuartzBackend()
+    return StubBackend()
+
+
+class DisplayGeometry:
+    """Process-wide cache of the display geometry."""
+
+    def __init__(self, backend=None, refresh_interval=60.0):
+        """
+        Args:
+            backend: Object with a read() -> Geometry method (default: by platform)
+            refresh_interval: Seconds before the cached geometry is re-read (0 = never)
+        """
+        self.backend = backend or default_backend()
+        self.refresh_interval = refresh_interval
+        self.reads = 0
+        self._geometry = None
+        self._read_at = 0.0
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the cached Geometry, re-reading it when invalidated or expired."""
+        geometry = self._geometry
+        if geometry is not None and (self.refresh_interval <= 0
+                                     or time.time() - self._read_at < self.refresh_interval):
+            return geometry
+        with self._lock:
+            new = self.backend.read()
+            self.reads += 1
+            self._read_at = time.time()
+            self._geometry = new
+        if geometry is not None and new != geometry:
+            for listener in list(self._listeners):
+                listener(geometry, new)
+        return new
+
+    def scaling_factor(self):
+        return self.get().scaling_factor
+
+    def physical_size(self):
+        geometry = self.get()
+        return geometry.physical_width, geometry.physical_height
+
+    def logical_size(self):
+        geometry = self.get()
+        return geometry.logical_width, geometry.logical_height
+
+    def invalidate(self):
+        """Force the next get() to re-read the geometry (change listeners still fire)."""
+        self._read_at = 0.0
+
+    def set_backend(self, backend):
+        """Swap the backend (e.g. a StubBackend in tests); the next get() re-reads the geometry."""
+        with self._lock:
+            self.backend = backend
+            self._read_at = 0.0
+
+    def add_listener(self, listener):
+        """Register listener(old, new) called when a re-read returns a different Geometry."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+
+display = DisplayGeometry()
+
+
+if __name__ == "__main__":
+    geometry = display.get()
+    print(f"Platform: {platform.system()}")
+    print(f"Scaling factor: {geometry.scaling_factor}")
+    print(f"Physical resolution: {geometry.physical_width}x{geometry.physical_height}")
+    print(f"Logical resolution: {geometry.logical_width}x{geometry.logical_height}")
@@ -2,6 +2,8 @@ import datetime
 
 import yagmail
 
+from log_helper import log
+
 email_info_path = 'email.info'
 
 
@@ -19,7 +21,7 @@ def send_email(content):
 
     # Send the email
     yag.send(to=email_info["to_email"], subject=subject, contents=content)
-    print('Email successfully sent!')
+    log('Email successfully sent!')
 
 
 if __name__ == '__main__':
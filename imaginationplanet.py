@@ -1,16 +1,33 @@
 import argparse
+import atexit
 import datetime
 
 from boss_fight import BossFight
-from common import print, challenge_fight
+import common
+import instrumentation
+import log_helper
+import metrics
+from common import print, challenge_fight, templates, frames, set_match_mode, set_capture_backend, gate_stats, \
+    positions
+from config_coords import capture_game_window
 from email_tools import send_email
 from fight import Fight
 from red_pack import RedPack
 from running import MainRun
+from session_recorder import SessionRecorder
+from thresholds import ScoreHistograms
 from star_pick_up import StarPick
 from black_market_finder import BlackMarketFinder
 
 
+def report_stats():
+    print("Template matches executed: " + str(gate_stats["executed"]) +
+          ", skipped on unchanged screen: " + str(gate_stats["skipped"]))
+    stats = positions.stats()
+    print("Button positions: " + str(stats["hits"]) + " verified hits, " + str(stats["verify_failures"]) +
+          " moved, " + str(stats["misses"]) + " misses (hit rate " + format(stats["hit_rate"], ".0%") + ")")
+
+
 def combo(skipcat, gohome, switch):
     r = MainRun(skipcat, gohome, switch)
     f = Fight()
@@ -39,9 +56,61 @@ if __name__ == "__main__":
     parser.add_argument("-sp", "--starpick", action='store_true', help="Star picking")
     parser.add_argument("-bm", "--blackmarket", action='store_true', help="Find black market")
     parser.add_argument("-ri", "--runindex", type=int, default=0, help="Run index")
+    parser.add_argument("-fa", "--frameage", type=float, default=0.1,
+                        help="Seconds a screenshot is reused across detections")
+    parser.add_argument("-mm", "--matchmode", choices=["exhaustive", "pyramid"], default="exhaustive",
+                        help="Template matching engine")
+    parser.add_argument("-cb", "--capture", choices=["pyautogui", "mss"], default="pyautogui",
+                        help="Screen capture backend (mss needs the optional mss package)")
+    parser.add_argument("-win", "--window", metavar="auto|X,Y,W,H",
+                        help="Capture only the game window: located from the run button, or a physical rectangle")
+    parser.add_argument("-bg", "--background", action='store_true',
+                        help="Capture the screen continuously on a background thread")
+    parser.add_argument("-gt", "--gate", action='store_true',
+                        help="Reuse template match results while the searched area looks unchanged")
+    parser.add_argument("-ins", "--instrument", metavar="FILE",
+                        help="Time captures, finders, input and sleeps per caller; JSON summary written to FILE")
+    parser.add_argument("-ct", "--calibrated-thresholds", action='store_true',
+                        help="Match with the per-template thresholds calibrated by thresholds.py")
+    parser.add_argument("-sh", "--scores", metavar="FILE",
+                        help="Collect match score histograms into FILE (input of thresholds.py)")
+    parser.add_argument("-rec", "--record", metavar="FILE",
+                        help="Record frames, detections and clicks to a session file")
+    parser.add_argument("-lf", "--logfile", metavar="FILE",
+                        help="Also write the log as JSON lines to FILE (rotated)")
+    parser.add_argument("-mp", "--metricsport", type=int, metavar="PORT",
+                        help="Serve run metrics in the Prometheus text format on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("-ms", "--metricssnapshot", metavar="FILE",
+                        help="Write the run metrics as JSON to FILE every minute and at exit")
+    parser.add_argument("-ll", "--loglevel", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO",
+                        help="Log level")
 
     args = parser.parse_args()
 
+    log_helper.configure(level=args.loglevel, file=args.logfile)
+    frames.max_age = args.frameage
+    set_match_mode(args.matchmode)
+    set_capture_backend(args.capture)
+    common.CHANGE_GATE = args.gate
+    common.USE_CALIBRATED_THRESHOLDS = args.calibrated_thresholds
+    if args.window:
+        capture_game_window(None if args.window == "auto" else [int(v) for v in args.window.split(",")])
+    if args.background:
+        frames.start_background()
+    atexit.register(report_stats)
+    if args.instrument:
+        instrumentation.enable(dump_path=args.instrument)
+        atexit.register(instrumentation.report)
+    print("Preloaded " + str(templates.preload()) + " templates")
+    if args.metricsport is not None or args.metricssnapshot:
+        metrics.enable(args.metricsport, args.metricssnapshot)
+    if args.scores:
+        scores = ScoreHistograms().start()
+        atexit.register(scores.save, args.scores)
+    if args.record:
+        recorder = SessionRecorder(args.record).start()
+        atexit.register(recorder.stop)
+
     content = ""
     time = datetime.datetime.now()
     if args.run:
@@ -0,0 +1,245 @@
+"""
+Hot-path instrumentation: where does the wall-clock time of a run go?
+
+enable() wraps the screen capture, the finders of common.py, the input
+functions of click.py, the screen_wait helpers and time.sleep with named
+spans. Every call is timed and aggregated per span and per calling
+function (the first caller outside the wrapped modules, e.g.
+"MainRun.visiting"), with count, total and p50/p95/p99 latency. Spans nest
+(get_center includes its screen_shot), so totals are inclusive.
+
+Usage:
+    import instrumentation
+    instrumentation.enable(report_interval=600, dump_path="instrumentation.json")
+    ...
+    instrumentation.report()
+"""
+import atexit
+import json
+import sys
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+from log_helper import log
+
+SAMPLES = 4096  # Latencies kept per span and caller for the percentiles (most recent)
+
+# Modules whose frames are skipped when looking for the calling function
+_INFRASTRUCTURE = {__name__, "common", "click", "screen_wait", "screen_states", "config_coords", "threading",
+                   "concurrent.futures.thread", "functools"}
+
+# (module, attribute, span name) wrapped by enable()
+TARGETS = [
+    ("common", "screen_shot", "capture"),
+    ("common", "get_center", "find.get_center"),
+    ("common", "get_center_h", "find.get_center_h"),
+    ("common", "get_center_with_path", "find.get_center_with_path"),
+    ("common", "simple_single_find", "find.simple_single_find"),
+    ("common", "single_find", "find.single_find"),
+    ("common", "single_find_with_path", "find.single_find_with_path"),
+    ("common", "find_all_with_path", "find.find_all_with_path"),
+    ("common", "get_all", "find.get_all"),
+    ("common", "detect", "find.detect"),
+    ("common", "find_button", "find.find_button"),
+    ("click", "click_at", "input.click"),
+    ("click", "move_to", "input.move"),
+    ("click", "drag", "input.drag"),
+    ("click", "long_press", "input.long_press"),
+    ("click", "vscroll", "input.scroll"),
+    ("click", "press_key", "input.key"),
+    ("screen_wait", "wait_until", "wait.wait_until"),
+    ("screen_wait", "wait_for_change", "wait.wait_for_change"),
+    ("screen_wait", "click_until_gone", "wait.click_until_gone"),
+    ("time", "sleep", "sleep"),
+]
+
+
+class SpanStats:
+    """Count, total and recent latencies of one span (for one caller)."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def percentile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def to_dict(self):
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.percentile(0.50), "p95": self.percentile(0.95), "p99": self.percentile(0.99)}
+
+
+_lock = threading.Lock()
+_spans = {}  # span name -> SpanStats
+_callers = {}  # (span name, caller) -> SpanStats
+_originals = {}  # (module, attribute) -> original function
+_started = None
+_reporter = None
+_stop = threading.Event()
+
+
+def caller_name():
+    """Qualified name of the first function on the stack outside the instrumented modules."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module not in _INFRASTRUCTURE:
+            code = frame.f_code
+            name = getattr(code, "co_qualname", code.co_name)
+            return module if name == "<module>" else name
+        frame = frame.f_back
+    return f"<{threading.current_thread().name}>"
+
+
+def record(name, seconds, caller=None):
+    """Add one measurement to a span."""
+    caller = caller or caller_name()
+    with _lock:
+        stats = _spans.get(name)
+        if stats is None:
+            stats = _spans[name] = SpanStats()
+        stats.add(seconds)
+        key = (name, caller)
+        stats = _callers.get(key)
+        if stats is None:
+            stats = _callers[key] = SpanStats()
+        stats.add(seconds)
+
+
+class span:
+    """
+    Time a block as a named span: `with span("grab_cat.drag"): ...`
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.caller = caller_name()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self.started, self.caller)
+
+
+def timed(name, function):
+    """Wrap function so every call is recorded as the named span."""
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        caller = caller_name()
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - started, caller)
+    wrapper.__instrumented__ = function
+    return wrapper
+
+
+def _replace(original, wrapper):
+    # `from common import get_center` copies the function into the importing module: patch every copy
+    for module in list(sys.modules.values()):
+        namespace = getattr(module, "__dict__", None)
+        if not namespace or module is sys.modules[__name__]:
+            continue
+        for attribute, value in list(namespace.items()):
+            if value is original:
+                setattr(module, attribute, wrapper)
+
+
+def enable(report_interval=600.0, dump_path=None):
+    """
+    Wrap the hot-path functions (see TARGETS) and start aggregating.
+
+    Args:
+        report_interval: Seconds between summaries in the log (0 = only on report())
+        dump_path: Write the aggregates as JSON to this file at exit (None = no dump)
+    """
+    global _started, _reporter
+    if _originals:
+        return
+    import importlib
+    for module_name, attribute, name in TARGETS:
+        module = importlib.import_module(module_name)
+        original = getattr(module, attribute, None)
+        if original is None:
+            continue
+        _originals[(module_name, attribute)] = original
+        _replace(original, timed(name, original))
+    _started = time.time()
+    if report_interval:
+        _stop.clear()
+        _reporter = threading.Thread(target=_report_loop, args=(report_interval,), name="instrumentation",
+                                     daemon=True)
+        _reporter.start()
+    if dump_path:
+        atexit.register(dump, dump_path)
+    log(f"Instrumentation enabled on {len(_originals)} functions")
+
+
+def disable():
+    """Put the original functions back; the aggregates are kept."""
+    global _reporter
+    _stop.set()
+    for (module_name, attribute), original in _originals.items():
+        wrapper = getattr(sys.modules[module_name], attribute)
+        _replace(wrapper, original)
+    _originals.clear()
+    _reporter = None
+
+
+def _report_loop(interval):
+    while not _stop.wait(interval):
+        report()
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _callers.clear()
+
+
+def summary():
+    """Aggregates as a dict: span -> stats with a "callers" dict, biggest total first."""
+    with _lock:
+        spans = {name: stats.to_dict() for name, stats in _spans.items()}
+        for (name, caller), stats in _callers.items():
+            spans[name].setdefault("callers", {})[caller] = stats.to_dict()
+    for stats in spans.values():
+        stats["callers"] = dict(sorted(stats["callers"].items(), key=lambda kv: -kv[1]["total"]))
+    return {
+        "wall": time.time() - _started if _started else 0.0,
+        "spans": dict(sorted(spans.items(), key=lambda kv: -kv[1]["total"])),
+    }
+
+
+def report(top=10, callers=3):
+    """Log the spans with the largest total time and their main callers."""
+    data = summary()
+    if not data["spans"]:
+        return
+    log(f"Instrumentation after {data['wall']:.0f}s (inclusive totals):")
+    for name, stats in list(data["spans"].items())[:top]:
+        log(f"  {name}: {stats['count']} calls, {stats['total']:.1f}s total, p50 {1000 * stats['p50']:.1f} ms, "
+            f"p95 {1000 * stats['p95']:.1f} ms, p99 {1000 * stats['p99']:.1f} ms")
+        for caller, entry in list(stats["callers"].items())[:callers]:
+            log(f"      {caller}: {entry['count']} calls, {entry['total']:.1f}s")
+
+
+def dump(path):
+    """Write summary() as JSON."""
+    with open(path, "w") as f:
+        json.dump(summary(), f, indent=2)
+    log(f"Instrumentation written to {path}")
@@ -1,14 +1,268 @@
 """
 Logging helper with timestamps for all log messages.
+
+log() (and common.print) hand every message to the standard logging package
+through a queue; a background listener formats it and writes it to the
+console and, when configured, to a rotating JSON lines file. A loop that logs
+on every iteration never waits on console I/O.
+
+Each module logs through its own logger ("ip.<module>", taken from the
+caller), so levels can be set per module. Messages logged with
+rate_limit=True and repeated with only their numbers changing ("Keep
+running! This is 41 clicks") are rate limited; the next one let through
+tells how many were dropped. Everything else is always written.
+
+Output written straight to sys.stdout would overtake queued messages:
+modules print through common.print (or log()), and flush() waits for the
+queue when raw output is unavoidable.
+
+Usage:
+    log("Visiting")                          # INFO, from the calling module's logger
+    log("Button moved", level=logging.DEBUG)
+    log(f"Keep running! This is {count} clicks", rate_limit=True)
+    configure(level="DEBUG", file="logs/bot.jsonl")
+    set_level("common", "WARNING")
 """
+import atexit
+import contextlib
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import threading
+import time
 from datetime import datetime
 
+ROOT = "ip"  # Parent of every module logger
+RATE_LIMIT_BURST = 5  # Messages of the same shape let through per interval
+RATE_LIMIT_INTERVAL = 60.0  # Seconds
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+
+_context = threading.local()
+_loggers = {}
+_muted = 0  # > 0 while muted(): messages are kept off the console
+
+
+def set_log_prefix(prefix):
+    """Tag every message logged from the calling thread (e.g. with a game instance name).
+
+    Args:
+        prefix: Text shown after the timestamp, or None to remove it
+    """
+    _context.prefix = prefix
+
+
+def log_prefix():
+    return getattr(_context, "prefix", None)
+
+
+def get_logger(name):
+    """The logger of a module (e.g. get_logger(__name__))."""
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers[name] = logging.getLogger(f"{ROOT}.{name}")
+    return logger
+
+
+def log(message, level=logging.INFO, logger=None, rate_limit=False):
+    """Log message with timestamp prefix.
 
-def log(message):
-    """Print message with timestamp prefix.
-    
     Args:
         message: The message to log
+        level: logging level (default INFO)
+        logger: Module name to log as (default: the calling module)
+        rate_limit: Drop the message when its shape (numbers aside) was logged too often, see RateLimitFilter
+    """
+    if logger is None:
+        logger = sys._getframe(1).f_globals.get("__name__", ROOT)
+    get_logger(logger).log(level, message, extra={"rate_limit": True} if rate_limit else None)
+
+
+class _ContextFilter(logging.Filter):
+    """Adds the thread's prefix and the console flag (runs in the thread that logs, before the queue)."""
+
+    def filter(self, record):
+        record.prefix = log_prefix()
+        record.console = not _muted
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `burst` messages of the same shape (digits ignored) per logger
+    and level every `interval` seconds. Only applies to messages logged with rate_limit=True.
     """
-    timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
-    print(f"{timestamp} {message}")
+
+    _NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+    def __init__(self, burst=RATE_LIMIT_BURST, interval=RATE_LIMIT_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows = {}  # shape -> [window start, messages let through, messages dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not getattr(record, "rate_limit", False):
+            return True
+        message = record.getMessage()
+        key = (record.name, record.levelno, self._NUMBER.sub("#", message))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                dropped = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+            elif window[1] < self.burst:
+                window[1] += 1
+                dropped = 0
+            else:
+                window[2] += 1
+                return False
+        if dropped:
+            record.msg, record.args = f"{message} ({dropped} similar messages suppressed)", None
+            record.suppressed = dropped
+        return True
+
+
+class ConsoleFormatter(logging.Formatter):
+    """The historical "[date time] [prefix] message" line, with the level when it is not INFO."""
+
+    def format(self, record):
+        timestamp = datetime.fromtimestamp(record.created).strftime("[%Y-%m-%d %H:%M:%S]")
+        parts = [timestamp]
+        if getattr(record, "prefix", None):
+            parts.append(f"[{record.prefix}]")
+        if record.levelno != logging.INFO:
+            parts.append(record.levelname)
+        parts.append(record.getMessage())
+        return " ".join(parts)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + ".") else record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "prefix", None):
+            entry["instance"] = record.prefix
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ConsoleHandler(logging.StreamHandler):
+    """
+    Writes to the current sys.stdout, replacing what its encoding cannot show (emoji on some consoles).
+    """
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    def emit(self, record):
+        if not getattr(record, "console", True):
+            return
+        self.stream = sys.stdout
+        super().emit(record)
+
+    def format(self, record):
+        text = super().format(record)
+        encoding = getattr(self.stream, "encoding", None) or "utf-8"
+        return text.encode(encoding, "replace").decode(encoding)
+
+
+class _Listener(logging.handlers.QueueListener):
+    def handle(self, record):
+        if isinstance(record, threading.Event):
+            record.set()  # flush() marker: everything queued before it is written
+            return
+        super().handle(record)
+
+
+_queue = queue.SimpleQueue()
+_queue_handler = logging.handlers.QueueHandler(_queue)
+_queue_handler.addFilter(_ContextFilter())
+_rate_limit = RateLimitFilter()
+_queue_handler.addFilter(_rate_limit)
+_root = logging.getLogger(ROOT)
+_root.addHandler(_queue_handler)
+_root.setLevel(logging.INFO)
+_root.propagate = False
+_console = ConsoleHandler()
+_console.setFormatter(ConsoleFormatter())
+_file = None
+_listener = _Listener(_queue, _console, respect_handler_level=True)
+_listener.start()
+
+
+def configure(level=None, file=None, console=True, rate_limit=(RATE_LIMIT_BURST, RATE_LIMIT_INTERVAL),
+              max_bytes=LOG_FILE_MAX_BYTES, backups=LOG_FILE_BACKUPS):
+    """
+    Set up the outputs.
+
+    Args:
+        level: Level of every module logger, name or number (None = keep)
+        file: JSON lines file, rotated at max_bytes with `backups` old files kept (None = no file)
+        console: Write to the console
+        rate_limit: (burst, interval) of repeated messages, or None to let everything through
+    """
+    global _listener, _file, _rate_limit
+    flush()
+    _listener.stop()
+    if level is not None:
+        _root.setLevel(level)
+    _queue_handler.removeFilter(_rate_limit)
+    if rate_limit:
+        _rate_limit = RateLimitFilter(*rate_limit)
+        _queue_handler.addFilter(_rate_limit)
+    if _file is not None:
+        _file.close()
+        _file = None
+    handlers = [_console] if console else []
+    if file:
+        _file = logging.handlers.RotatingFileHandler(file, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        _file.setFormatter(JsonFormatter())
+        handlers.append(_file)
+    _listener = _Listener(_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def set_level(module, level):
+    """Level of one module's logger (e.g. set_level("common", "WARNING"))."""
+    get_logger(module).setLevel(level)
+
+
+def flush(timeout=2.0):
+    """Wait until everything logged so far is written."""
+    marker = threading.Event()
+    _queue.put(marker)
+    return marker.wait(timeout)
+
+
+@contextlib.contextmanager
+def muted():
+    """Keep what is logged inside the block off the console (the log file still gets it)."""
+    global _muted
+    _muted += 1
+    try:
+        yield
+    finally:
+        _muted -= 1
+
+
+def _shutdown():
+    _listener.stop()
+    if _file is not None:
+        _file.close()
+
+
+atexit.register(_shutdown)
@@ -0,0 +1,281 @@
+"""
+Run metrics: counters, gauges and histograms, exported for Prometheus.
+
+The bot flows update the metrics below as they go (visits, rolls, AgainCard
+uses, restarts, ...). enable() also counts every input event and times every
+template match through the click and detection listeners, and can serve the
+registry on a localhost HTTP endpoint in the Prometheus text format and
+snapshot it to a JSON file periodically.
+
+Every sample carries a "bot" label: the log prefix of the thread that
+updated it (the instance name under orchestrator.py), so one scrape shows
+each game window separately.
+
+Usage:
+    import metrics
+    metrics.enable(port=9464, snapshot_path="metrics.json")
+    metrics.VISITS.inc()
+    curl http://127.0.0.1:9464/metrics
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from log_helper import log, log_prefix
+
+DEFAULT_PORT = 9464
+SNAPSHOT_INTERVAL = 60.0  # Seconds between snapshots written to disk
+# Upper bounds (seconds) of the detection time histogram buckets
+DETECTION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Metric:
+    """A named family of samples, one per combination of label values."""
+
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.help = description
+        self.labels = tuple(labels) + ("bot",)
+        self._values = {}  # label values -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        bot = labels.get("bot") or log_prefix() or ""
+        return tuple(str(labels.get(label, "")) for label in self.labels[:-1]) + (bot,)
+
+    def _format_labels(self, key, extra=()):
+        pairs = [(label, value) for label, value in zip(self.labels, key) if value != ""] + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in pairs) + "}"
+
+    def samples(self):
+        """[(label dict, value)] of the current values."""
+        with self._lock:
+            items = list(self._values.items())
+        return [({l: v for l, v in zip(self.labels, key) if v != ""}, _copy(value)) for key, value in items]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{self._format_labels(key)} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=DETECTION_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["buckets"][i] += 1
+                    break
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, _copy(entry)) for key, entry in self._values.items())
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry["buckets"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', '+Inf')])} {entry['count']}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_number(entry['sum'])}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {entry['count']}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _copy(value):
+    return {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]} \
+        if isinstance(value, dict) else value
+
+
+class Registry:
+    """All metrics of the process, in registration order."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric '{metric.name}' already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, description, labels=()):
+        return self._add(Counter(name, description, labels))
+
+    def gauge(self, name, description, labels=()):
+        return self._add(Gauge(name, description, labels))
+
+    def histogram(self, name, description, labels=(), buckets=DETECTION_BUCKETS):
+        return self._add(Histogram(name, description, labels, buckets))
+
+    def render(self):
+        """The Prometheus text exposition of every metric."""
+        lines = []
+        for metric in self.metrics.values():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        return {
+            "time": time.time(),
+            "metrics": {name: {"type": m.kind, "help": m.help,
+                               "samples": [{"labels": labels, "value": value} for labels, value in m.samples()]}
+                        for name, m in self.metrics.items()},
+        }
+
+    def save(self, path):
+        """Write snapshot() as JSON, replacing the file atomically."""
+        temporary = path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(temporary, path)
+
+
+registry = Registry()
+
+INPUTS = registry.counter("ip_inputs_total", "Input events posted, by action (click, long_press, drag, ...)",
+                          ["action"])
+VISITS = registry.counter("ip_visits_total", "Friend visits started")
+ROLLS = registry.counter("ip_rolls_total", "Dice rolls made while visiting")
+AGAIN_CARDS = registry.counter("ip_again_cards_total", "Smart card grabs, by result (used, unavailable, failed)",
+                               ["result"])
+RESTARTS = registry.counter("ip_restarts_total", "Game restarts")
+DINGHAO_SLEEPS = registry.counter("ip_dinghao_sleeps_total", "10 minute sleeps after the DingHao screen")
+BOSS_FIGHTS = registry.counter("ip_boss_fights_total", "Boss fights finished")
+RED_PACKS = registry.counter("ip_red_packs_total", "Red packs taken")
+STAR_ROUNDS = registry.counter("ip_star_rounds_total", "Star map scan rounds")
+SHIPS_SENT = registry.counter("ip_ships_sent_total", "Ships sent to stars")
+LOOP_SECONDS = registry.gauge("ip_loop_seconds", "Duration of the last iteration of a screen loop", ["loop"])
+DETECTION_SECONDS = registry.histogram("ip_detection_seconds", "Template match duration", ["found"])
+
+
+def _on_input(action, args):
+    INPUTS.inc(action=action)
+
+
+def _on_detection(path, found, score, location, seconds):
+    DETECTION_SECONDS.observe(seconds, found="true" if found else "false")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the log
+
+
+_server = None
+_snapshots = None
+_stop = threading.Event()
+
+
+def serve(port=DEFAULT_PORT, host="127.0.0.1"):
+    """Serve /metrics on a background thread; returns the server."""
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        log(f"Metrics on http://{host}:{_server.server_address[1]}/metrics")
+    return _server
+
+
+def _snapshot_loop(path, interval):
+    while not _stop.wait(interval):
+        registry.save(path)
+
+
+def enable(port=None, snapshot_path=None, snapshot_interval=SNAPSHOT_INTERVAL):
+    """
+    Count input events and time detections, and optionally export the registry.
+
+    Args:
+        port: Serve the metrics on this localhost port (None = no endpoint)
+        snapshot_path: Write the metrics as JSON to this file every snapshot_interval seconds and at exit
+    """
+    global _snapshots
+    from click import add_input_listener
+    from common import add_detection_listener
+
+    add_input_listener(_on_input)
+    add_detection_listener(_on_detection)
+    if port is not None:
+        serve(port)
+    if snapshot_path and _snapshots is None:
+        _stop.clear()
+        _snapshots = threading.Thread(target=_snapshot_loop, args=(snapshot_path, snapshot_interval),
+                                      name="metrics-snapshot", daemon=True)
+        _snapshots.start()
+        atexit.register(registry.save, snapshot_path)
+
+
+def disable():
+    """Stop counting input and detections, the endpoint and the snapshots; values are kept."""
+    global _server, _snapshots
+    from click import remove_input_listener
+    from common import remove_detection_listener
+
+    remove_input_listener(_on_input)
+    remove_detection_listener(_on_detection)
+    _stop.set()
+    _snapshots = None
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
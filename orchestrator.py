@@ -0,0 +1,162 @@
+"""
+Multi-instance orchestrator: drive several game windows from one process.
+
+Every instance runs its own MainRun on its own thread. Templates, the screen
+capture and the input device are shared: each thread sees only its window
+through set_thread_region(), and the finders add the window's position to
+what they find there, so clicks land in the right window. Input is
+serialized by click.input_lock, so one instance's clicks fit into the
+others' sleeps and animations.
+
+Config (JSON):
+    {
+        "instances": [
+            {"name": "main", "region": [0, 0, 1280, 1440], "mode": "switch_run"},
+            {"name": "alt", "region": [1280, 0, 1280, 1440], "mode": "light_run", "semi_auto": true}
+        ]
+    }
+region is (x, y, w, h) in physical screen pixels.
+
+Usage:
+    python orchestrator.py --config instances.json --background
+"""
+import argparse
+import json
+import threading
+import time
+
+import common
+from common import frames, set_capture_backend, set_thread_region, templates
+from config_coords import ConfigCoords
+from log_helper import configure, log, set_log_prefix
+import metrics
+
+MODES = ["switch_run", "light_run", "run"]
+
+
+class Instance:
+    """One game window and the bot driving it."""
+
+    def __init__(self, name, region, mode="switch_run", skip_cat_grab=True, go_home=False, semi_auto=False,
+                 run_index=0, restart_delay=30.0):
+        """
+        Args:
+            name: Instance name, shown in the logs
+            region: (x, y, w, h) of the game window in physical pixels
+            mode: MainRun flow to loop: "switch_run", "light_run" or "run"
+            restart_delay: Seconds to wait before restarting the flow after an error
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}' for instance '{name}'")
+        self.name = name
+        self.region = tuple(region)
+        self.mode = mode
+        self.skip_cat_grab = skip_cat_grab
+        self.go_home = go_home
+        self.semi_auto = semi_auto
+        self.run_index = run_index
+        self.restart_delay = restart_delay
+        self.bot = None
+        self.runs = 0
+        self.errors = 0
+        self.running = False
+        self.thread = None
+
+    def _enter(self):
+        """Bind the calling thread to this instance's window."""
+        set_thread_region(self.region)
+        set_log_prefix(self.name)
+
+    def run(self):
+        from running import MainRun
+
+        self._enter()
+        self.running = True
+        log(f"Instance started on region {self.region} ({self.mode})")
+        while self.running:
+            try:
+                if self.bot is None:
+                    self.bot = MainRun(self.skip_cat_grab, self.go_home, self.semi_auto,
+                                       is_switch=(self.mode == "switch_run"))
+                if self.mode == "switch_run":
+                    self.bot.switch_run(self.run_index)
+                elif self.mode == "light_run":
+                    self.bot.light_run()
+                else:
+                    self.bot.run()
+                self.runs += 1
+                log(f"Run finished, total visits {self.bot.visits}")
+            except Exception as e:
+                self.errors += 1
+                log(f"Instance failed: {e}, restarting in {self.restart_delay:.0f}s")
+                time.sleep(self.restart_delay)
+        set_thread_region(None)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=f"instance-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop after the current run returns."""
+        self.running = False
+
+
+class Orchestrator:
+    """Starts the instances and reports on them."""
+
+    def __init__(self, instances, report_interval=600.0):
+        self.instances = instances
+        self.report_interval = report_interval
+
+    @classmethod
+    def from_config(cls, path):
+        with open(path, "r") as f:
+            config = json.load(f)
+        return cls([Instance(**spec) for spec in config["instances"]])
+
+    def start(self):
+        log(f"Preloaded {templates.preload()} templates shared by {len(self.instances)} instances")
+        # Run button positions differ per window, keep the config file as it is
+        ConfigCoords.persist = False
+        for instance in self.instances:
+            instance.start()
+
+    def report(self):
+        capture = frames.stats()
+        for instance in self.instances:
+            visits = instance.bot.visits if instance.bot is not None else 0
+            alive = instance.thread is not None and instance.thread.is_alive()
+            log(f"{instance.name}: {'running' if alive else 'stopped'}, {instance.runs} runs, "
+                f"{visits} visits, {instance.errors} errors")
+        log(f"Shared capture: {capture['captures']} captures, {capture['reuses']} reuses")
+
+    def join(self):
+        """Block until every instance thread ended, reporting periodically."""
+        while any(i.thread is not None and i.thread.is_alive() for i in self.instances):
+            for instance in self.instances:
+                instance.thread.join(self.report_interval / len(self.instances))
+            self.report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive several game windows from one process")
+    parser.add_argument("--config", required=True, help="JSON file listing the instances")
+    parser.add_argument("--capture", choices=["pyautogui", "mss"], default="pyautogui", help="Screen capture backend")
+    parser.add_argument("--background", action="store_true", help="Capture continuously on a background thread")
+    parser.add_argument("--calibrated-thresholds", action="store_true",
+                        help="Match with the per-template thresholds calibrated by thresholds.py")
+    parser.add_argument("--log-file", help="Also write the log as JSON lines, tagged with the instance names")
+    parser.add_argument("--metrics-port", type=int, help="Serve per-instance metrics on this localhost port")
+    parser.add_argument("--metrics-snapshot", help="Write the metrics as JSON to this file every minute")
+    args = parser.parse_args()
+
+    configure(file=args.log_file)
+    if args.metrics_port is not None or args.metrics_snapshot:
+        metrics.enable(args.metrics_port, args.metrics_snapshot)
+    set_capture_backend(args.capture)
+    common.USE_CALIBRATED_THRESHOLDS = args.calibrated_thresholds
+    if args.background:
+        frames.start_background()
+    orchestrator = Orchestrator.from_config(args.config)
+    orchestrator.start()
+    orchestrator.join()
@@ -7,6 +7,8 @@ from pynput.keyboard import Controller, Key
 keyboard = Controller()
 
 from common import *
+import metrics
+from screen_wait import click_until_gone, wait_for_change
 import random
 
 
@@ -24,10 +26,7 @@ class RedPack:
         print("start red pack waiting...")
 
     def get_red_pack(self):
-        while single_find("Chat"):
-            center = get_center("Chat", "Single")
-            click_at(center.x / self.sft, center.y / self.sft)
-            time.sleep(2)
+        click_until_gone("Chat", timeout=None, sft=self.sft)
         print("Entered chat")
         while self.timeout == 0 or self.now + timedelta(seconds=self.timeout) >= datetime.now():
             if single_find("TooManyRequest"):
@@ -39,13 +38,10 @@ class RedPack:
             elif simple_single_find("DiamRed", "Single", 0.8):
                 self.single_get("DiamRed")
             else:
-                print("Nothing sleep 1 seconds")
-                time.sleep(1)
-        while single_find("MainBack"):
-            print("Get red pack finished")
-            center = get_center("MainBack", "Single")
-            click_at(center.x / self.sft, center.y / self.sft)
-            time.sleep(2)
+                # Nothing to take, check again as soon as the chat moves (or after 1 second)
+                wait_for_change(timeout=1, settle=0)
+        print("Get red pack finished")
+        click_until_gone("MainBack", timeout=None, sft=self.sft)
         print("finished red")
 
     def single_get(self, pk_name):
@@ -65,6 +61,7 @@ class RedPack:
 
         if single_find("TakeRed"):
             self.count += 1
+            metrics.RED_PACKS.inc()
             print("New Red Pack")
             center = get_center("TakeRed", "Single")
             click_at(center.x / self.sft, center.y / self.sft)
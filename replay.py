@@ -0,0 +1,344 @@
+"""
+Offline replay: run the bot's loops against recorded frames.
+
+Screen captures come from a directory of PNG screenshots (or a session file
+written by session_recorder.py), input events are
+recorded instead of sent, and a transition table decides which frame is shown
+next after each input. time.sleep is replaced by a virtual clock so a replay
+runs as fast as matching allows. Reports detections/sec and the real time
+between consecutive inputs (the loop latency of the replayed flow).
+
+Transition table (JSON):
+    {
+        "start": "main.png",
+        "frames": {
+            "main.png": {
+                "on_input": [
+                    {"action": "click", "rect": [100, 200, 300, 260], "next": "visit.png"},
+                    {"action": "long_press", "next": "main.png"}
+                ],
+                "after_captures": 20, "then": "main.png"
+            }
+        }
+    }
+rect is [x1, y1, x2, y2] in logical coordinates; a rule without action/rect
+matches any input. Without a table every input advances to the next file.
+
+Usage:
+    python replay.py --frames recordings/visit --transitions recordings/visit.json --mode visiting
+    python replay.py --frames recordings/main --mode switch_run --max-inputs 200 --log inputs.jsonl
+    python replay.py --frames sessions/run.ipsession --mode run
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import click
+import common
+from click import RecordingInput, set_input_backend
+from common import FileCapture, add_detection_listener, remove_detection_listener, frames, set_capture_backend
+from config_coords import ConfigCoords
+from display_geometry import StubBackend, display
+from log_helper import log
+
+MODES = ["switch_run", "run", "light_run", "visiting", "smart_grab", "boss_fight"]
+
+
+class ReplayFinished(BaseException):
+    """
+    Raised once the replay limits are reached.
+
+    Derives from BaseException so the bot's `except Exception` retry loops do not
+    swallow it; it is raised again on every capture, input and sleep afterwards
+    to get out of bare `except:` loops too.
+    """
+
+
+class TransitionTable:
+    """Scripted frame transitions, see the module docstring for the format."""
+
+    def __init__(self, spec=None):
+        spec = spec or {}
+        self.start = spec.get("start")
+        self.frames = spec.get("frames", {})
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def on_input(self, frame, action, args):
+        """Return the frame to show after an input on frame, or None to stay."""
+        for rule in self.frames.get(frame, {}).get("on_input", []):
+            if rule.get("action") not in (None, action):
+                continue
+            rect = rule.get("rect")
+            if rect is not None:
+                if len(args) < 2:
+                    continue
+                x, y = args[0], args[1]
+                if not (rect[0] <= x <= rect[2] and rect[1] <= y <= rect[3]):
+                    continue
+            return rule["next"]
+        return None
+
+    def after_captures(self, frame, captures):
+        """Return the frame to show once frame has been captured captures times, or None."""
+        entry = self.frames.get(frame, {})
+        limit = entry.get("after_captures")
+        if limit is not None and captures >= limit:
+            return entry.get("then")
+        return None
+
+
+class ReplayCapture(FileCapture):
+    """FileCapture driven by a ReplaySession."""
+
+    name = "replay"
+
+    def __init__(self, session, paths):
+        super().__init__(paths, loop=True)
+        self.session = session
+
+    def grab_color(self):
+        self.session.on_capture()
+        return super().grab_color()
+
+
+class ReplayInput(RecordingInput):
+    """RecordingInput that lets the session pick the next frame."""
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    def _record(self, action, *args):
+        self.session.check_finished()
+        super()._record(action, *args)
+        self.session.on_input(action, args)
+
+
+class ReplaySession:
+    """
+    Installs the replay capture, input and display backends and patches time.sleep/time.time.
+
+    Usage:
+        with ReplaySession("recordings/main", transitions="recordings/main.json") as session:
+            session.run(lambda: MainRun(True, False).switch_run())
+        session.report()
+    """
+
+    def __init__(self, frames_dir, transitions=None, max_inputs=200, max_captures=2000,
+                 max_virtual_seconds=3600.0, scaling_factor=1, physical_size=None):
+        """
+        Args:
+            frames_dir: Directory of PNG screenshots, list of paths, or a recorded session file
+            transitions: TransitionTable, dict or JSON path (None = advance on every input)
+            max_inputs: Stop after this many input events
+            max_captures: Stop after this many screen captures
+            max_virtual_seconds: Stop once the bot has slept this long
+            scaling_factor: Display scaling factor the frames were recorded with
+            physical_size: Screen size in pixels (default: size of the first frame)
+        """
+        if isinstance(transitions, str):
+            transitions = TransitionTable.load(transitions)
+        elif not isinstance(transitions, TransitionTable):
+            transitions = TransitionTable(transitions)
+        self.transitions = transitions
+        if isinstance(frames_dir, str) and os.path.isfile(frames_dir) and not frames_dir.lower().endswith(".png"):
+            from session_recorder import SessionReader
+            frames_dir = SessionReader(frames_dir).export_frames(tempfile.mkdtemp(prefix="replay_"))
+        self.capture = ReplayCapture(self, frames_dir)
+        if transitions.start and not self.capture.show(transitions.start):
+            raise ValueError(f"Start frame '{transitions.start}' is not in {frames_dir}")
+        self.input = ReplayInput(self)
+        self.max_inputs = max_inputs
+        self.max_captures = max_captures
+        self.max_virtual_seconds = max_virtual_seconds
+        self.scaling_factor = scaling_factor
+        if physical_size is None:
+            height, width = self.capture._image(self.capture.current).shape[:2]
+            physical_size = (width, height)
+        self.physical_size = physical_size
+
+        self.finished = None
+        self.captures = 0
+        self.frame_captures = 0
+        self.detections = 0
+        self.detection_seconds = 0.0
+        self.found = 0
+        self.virtual_seconds = 0.0
+        self.input_times = []
+        self.frame_log = []  # (input index, frame shown)
+        self._saved = None
+
+    # Limits
+
+    def check_finished(self):
+        if self.finished is None:
+            if len(self.input.events) >= self.max_inputs:
+                self.finished = f"{self.max_inputs} inputs"
+            elif self.captures >= self.max_captures:
+                self.finished = f"{self.max_captures} captures"
+            elif self.virtual_seconds >= self.max_virtual_seconds:
+                self.finished = f"{self.max_virtual_seconds:.0f}s of virtual time"
+        if self.finished is not None:
+            raise ReplayFinished(self.finished)
+
+    # Backend callbacks
+
+    def _show(self, frame):
+        if frame is not None and frame != os.path.basename(self.capture.current):
+            if not self.capture.show(frame):
+                raise ValueError(f"Transition to unknown frame '{frame}'")
+            self.frame_captures = 0
+            self.frame_log.append((len(self.input.events), frame))
+
+    def on_capture(self):
+        self.check_finished()
+        self.captures += 1
+        self.frame_captures += 1
+        current = os.path.basename(self.capture.current)
+        self._show(self.transitions.after_captures(current, self.frame_captures))
+
+    def on_input(self, action, args):
+        self.input_times.append(time.perf_counter())
+        current = os.path.basename(self.capture.current)
+        if self.transitions.frames:
+            self._show(self.transitions.on_input(current, action, args))
+        elif self.capture.advance():
+            self.frame_captures = 0
+            self.frame_log.append((len(self.input.events), os.path.basename(self.capture.current)))
+
+    def on_detection(self, path, found, score, location, seconds):
+        self.detections += 1
+        self.detection_seconds += seconds
+        self.found += found
+
+    def _sleep(self, seconds):
+        self.check_finished()
+        self.virtual_seconds += max(0.0, seconds)
+
+    def _time(self):
+        return self._saved["time"]() + self.virtual_seconds
+
+    # Install / restore
+
+    def __enter__(self):
+        self._saved = {
+            "sleep": time.sleep,
+            "time": time.time,
+            "capture": common.capture_backend,
+            "input": click.input_backend,
+            "display": display.backend,
+            "max_age": frames.max_age,
+            "persist": ConfigCoords.persist,
+        }
+        time.sleep = self._sleep
+        time.time = self._time
+        set_capture_backend(self.capture)
+        set_input_backend(self.input)
+        display.set_backend(StubBackend(self.scaling_factor, self.physical_size))
+        frames.max_age = 0  # Every capture goes through the transition table
+        ConfigCoords.persist = False
+        add_detection_listener(self.on_detection)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.started
+        remove_detection_listener(self.on_detection)
+        time.sleep = self._saved["sleep"]
+        time.time = self._saved["time"]
+        set_input_backend(self._saved["input"])
+        if self._saved["capture"] is not None:
+            set_capture_backend(self._saved["capture"])
+        display.set_backend(self._saved["display"])
+        frames.max_age = self._saved["max_age"]
+        ConfigCoords.persist = self._saved["persist"]
+        return exc_type is not None and issubclass(exc_type, ReplayFinished)
+
+    def run(self, target):
+        """Call target() until the replay limits stop it; returns the stop reason."""
+        try:
+            target()
+        except ReplayFinished:
+            pass
+        return self.finished or "flow returned"
+
+    # Results
+
+    def stats(self):
+        gaps = [b - a for a, b in zip(self.input_times, self.input_times[1:])]
+        elapsed = getattr(self, "elapsed", time.perf_counter() - self.started)
+        return {
+            "stopped": self.finished or "flow returned",
+            "elapsed": elapsed,
+            "captures": self.captures,
+            "inputs": len(self.input.events),
+            "detections": self.detections,
+            "found": self.found,
+            "detections_per_sec": self.detections / elapsed if elapsed > 0 else 0.0,
+            "detection_share": self.detection_seconds / elapsed if elapsed > 0 else 0.0,
+            "loop_mean_ms": statistics.mean(gaps) * 1000 if gaps else None,
+            "loop_p95_ms": sorted(gaps)[min(len(gaps) - 1, int(len(gaps) * 0.95))] * 1000 if gaps else None,
+            "virtual_seconds": self.virtual_seconds,
+        }
+
+    def report(self):
+        s = self.stats()
+        log("=" * 70)
+        log(f"Replay stopped after {s['stopped']} in {s['elapsed']:.2f}s "
+            f"({s['virtual_seconds']:.0f}s of sleeps skipped)")
+        log(f"Captures: {s['captures']}, inputs: {s['inputs']}, frame changes: {len(self.frame_log)}")
+        log(f"Detections: {s['detections']} ({s['found']} found), {s['detections_per_sec']:.1f}/s, "
+            f"{100 * s['detection_share']:.0f}% of the time")
+        if s["loop_mean_ms"] is not None:
+            log(f"Loop latency between inputs: mean {s['loop_mean_ms']:.1f} ms, p95 {s['loop_p95_ms']:.1f} ms")
+
+
+def mode_target(mode):
+    """Return a callable running the given flow against the installed replay backends."""
+    if mode == "boss_fight":
+        from boss_fight import BossFight
+        return lambda: BossFight(1).combo_fight()
+
+    from running import MainRun
+
+    def target():
+        run = MainRun(True, False, is_switch=(mode == "switch_run"))
+        if mode == "switch_run":
+            run.switch_run()
+        elif mode == "light_run":
+            run.light_run()
+        elif mode == "visiting":
+            run.visiting()
+        elif mode == "smart_grab":
+            run.smart_grab.smart_grab_cat()
+        else:
+            run.run()
+    return target
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a bot flow against recorded screenshots")
+    parser.add_argument("--frames", required=True, help="Directory of recorded PNG screenshots or a session file")
+    parser.add_argument("--transitions", help="JSON transition table (default: next file after every input)")
+    parser.add_argument("--mode", choices=MODES, default="switch_run", help="Flow to replay")
+    parser.add_argument("--max-inputs", type=int, default=200, help="Stop after this many inputs")
+    parser.add_argument("--max-captures", type=int, default=2000, help="Stop after this many captures")
+    parser.add_argument("--scale", type=float, default=1, help="Scaling factor the frames were recorded with")
+    parser.add_argument("--log", help="Write the recorded inputs as JSON lines")
+    args = parser.parse_args()
+
+    session = ReplaySession(args.frames, args.transitions, max_inputs=args.max_inputs,
+                            max_captures=args.max_captures, scaling_factor=args.scale)
+    with session:
+        session.run(mode_target(args.mode))
+    session.report()
+    if args.log:
+        session.input.save(args.log)
+        log(f"Inputs written to {args.log}")
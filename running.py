@@ -1,12 +1,13 @@
 import time
 import platform
 
-from sympy import false
-
 from click import *
 from common import *
+from screen_wait import wait_until, wait_for_change, click_until_gone
+from screen_states import ScreenMachine, ScreenState, STOP, SKIP
 from smart_card_grab import SmartCardGrab
 from log_helper import log
+import metrics
 from config_coords import ConfigCoords
 from collections import namedtuple
 
@@ -101,18 +102,14 @@ class MainRun:
         self.chess_man = self.smart_grab.config.get_coord("chessman")
         self.chess_maninner = self.smart_grab.config.get_coord("chessmaninner")
 
-    def long_click(self):
-        # Move to the position (if necessary)
-        pyautogui.moveTo(self.rb.x / self.sft, self.rb.y / self.sft)
-
-        # Press and hold the mouse button
-        pyautogui.mouseDown()
+        # Search buttons with a known position near it first, full screen on miss
+        set_search_region_around("RunButton", (self.rb.x / self.sft, self.rb.y / self.sft), 150, 150)
+        set_search_region_from_config("ONEB", self.smart_grab.config, "oneb_bar")
+        set_search_region_from_config("TWB", self.smart_grab.config, "twb_bar")
 
-        # Wait for 2 seconds
-        time.sleep(2)
-
-        # Release the mouse button
-        pyautogui.mouseUp()
+    def long_click(self):
+        # Press and hold the run button for 2 seconds
+        long_press(self.rb.x / self.sft, self.rb.y / self.sft, 2)
 
     def guess(self):
         click_at(self.rb.x / self.sft - 50, self.rb.y / self.sft)
@@ -125,15 +122,11 @@ class MainRun:
         # if not self.sc:
         #     self.grab_cat()
 
-        while not single_find("VisitGoHome"):
-            log("Visit Go Home was not found! Sleep for 1 second")
-            if simple_single_find("DingHao", "Single", 0.7):
-                # Guosha ding le
-                log("Guo sha ding le.... Sleep 10 mins")
-                time.sleep(10 * 60)
-                self.restart_game()
-                return
-            time.sleep(1)
+        state = wait_until(lambda: "home" if single_find("VisitGoHome") else
+                           "dinghao" if simple_single_find("DingHao", "Single", 0.7) else None, timeout=None)
+        if state == "dinghao":
+            self.ding_hao_sleep()
+            return
 
         log("Visit Go home found! In visiting main mode now!")
 
@@ -143,17 +136,15 @@ class MainRun:
             # Click go home and confirm until we return to main page
             while simple_single_find("VisitGoHome", "Single", 0.8):
                 if simple_single_find("DingHao", "Single", 0.7):
-                    # Guosha ding le
-                    log("Guo sha ding le.... Sleep 10 mins")
-                    time.sleep(10 * 60)
-                    self.restart_game()
+                    self.ding_hao_sleep()
                     return
 
                 try:
                     center = get_center("VisitGoHome", "Single")
                     click_at(center.x / self.sft, center.y / self.sft)
                     log("Clicked go home!")
-                    time.sleep(2)
+                    # Wait for the confirm dialog to open
+                    wait_for_change(timeout=2)
                     
                     # Use config coordinate for go home confirm
                     gohome_confirm_coords = self.smart_grab.config.get_coord("gohome_confirm")
@@ -162,7 +153,7 @@ class MainRun:
                         log(f"Clicked go home confirm at ({gohome_confirm_coords[0]:.1f}, {gohome_confirm_coords[1]:.1f})")
                     else:
                         log("ERROR: gohome_confirm coordinates not found in config!")
-                    time.sleep(2)
+                    wait_until("VisitGoHome", timeout=2, present=False)
                 except:
                     log("Super slow in loading animation")
                     time.sleep(1)
@@ -174,124 +165,147 @@ class MainRun:
                 return
         log("In visiting mode!")
         self.visits += 1
+        metrics.VISITS.inc()
 
         # Reset roll counter and AgainCard flag for this visit
         self.visit_roll_count = 0
         self.again_card_used = False
         
-        for i in range(1, 2000):
-
-            if simple_single_find("DingHao", "Single", 0.7):
-                # Guosha ding le
-                log("Guo sha ding le.... Sleep 10 mins")
-                time.sleep(10 * 60)
-                self.restart_game()
-                return
+        self.visit_machine().run(max_steps=1999)
+
+    def visit_machine(self):
+        """
+        Build the screen state machine of one visit, from the first roll until the visit ends.
+        """
+        # Screens a roll can lead to; error dialogs and ads are checked on every roll
+        after_roll = ["DingHao", "Roll", "VisitComplete"] + ([] if self.is_mac else ["RollComplete"])
+        states = [
+            ScreenState("DingHao", "DingHao", self.on_ding_hao, priority=100, th=0.7),
+            ScreenState("Roll", "Roll", self.on_roll, priority=80, next_states=after_roll),
+            ScreenState("VisitComplete", "VisitComplete", self.on_visit_complete, priority=70),
+            ScreenState("Timeout", "Timeout", self.on_visit_timeout, priority=60, always=True),
+            ScreenState("VisitBusy", "VisitBusy", self.on_visit_busy, priority=50, always=True),
+            ScreenState("TooManyRequest", "TooManyRequest", self.on_visit_too_many_request, priority=40,
+                        always=True),
+            ScreenState("AdsSkip", "AdsSkip", self.on_ads_skip, priority=30, always=True),
+        ]
+        if not self.is_mac:
+            states.append(ScreenState("RollComplete", "RollComplete", self.on_roll_complete, priority=90,
+                                      next_states=after_roll))
+        return ScreenMachine(states, default=self.on_keep_visiting, before=self.before_visit_step,
+                             name="visiting", default_next=after_roll)
+
+    def before_visit_step(self):
+        # Check for duplicate visit before each roll (only after 30 rolls, not in ONEB mode, and AgainCard not used yet)
+        if not self.sc and not self.again_card_used and self.visit_roll_count > 30 and self.current_mode != "ONEB":
+            try:
+                if self.smart_grab._check_face_in_any_box():
+                    log(f"🎯 Duplicate visit detected after {self.visit_roll_count} rolls, triggering smart card grab!")
+                    grab_result = self.smart_grab.smart_grab_cat()
+                    if grab_result:
+                        log("✅ Successfully used AgainCard!")
+                        self.again_card_used = True  # Mark as used
+                        log("AgainCard used, continuing with new visit...")
+                        # Don't return - continue the visit with the new island
+                    # If grab failed, just continue - next loop iteration will handle VisitComplete if present
+            except Exception as e:
+                log(f"Smart grab check failed: {e}")
+                # Continue loop - VisitComplete will be handled in the next iteration
+        return None
+
+    def ding_hao_sleep(self):
+        # Guosha ding le
+        log("Guo sha ding le.... Sleep 10 mins")
+        metrics.DINGHAO_SLEEPS.inc()
+        time.sleep(10 * 60)
+        self.restart_game()
+
+    def on_ding_hao(self, dets):
+        self.ding_hao_sleep()
+        return STOP
+
+    def on_roll_complete(self, dets):
+        log("Confirm of high rolling!")
+        center = get_center("Confirm", "Single")
+        if center is not None:
+            click_at(center.x / self.sft, center.y / self.sft)
+        time.sleep(1)
 
-            # Check for duplicate visit before each roll (only after 30 rolls, not in ONEB mode, and AgainCard not used yet)
-            if not self.sc  and not self.again_card_used and not self.again_card_used and self.visit_roll_count > 30:
-                if self.current_mode == "ONEB":
-                    # In ONEB mode, skip smart card grab
-                    pass
-                else:
-                    try:
-                        if self.smart_grab._check_face_in_any_box():
-                            log(f"🎯 Duplicate visit detected after {self.visit_roll_count} rolls, triggering smart card grab!")
-                            grab_result = self.smart_grab.smart_grab_cat()
-                            if grab_result:
-                                log("✅ Successfully used AgainCard!")
-                                self.again_card_used = True  # Mark as used
-                                log("AgainCard used, continuing with new visit...")
-                                # Don't return - continue the visit with the new island
-                            # If grab failed, just continue - next loop iteration will handle VisitComplete if present
-                    except Exception as e:
-                        log(f"Smart grab check failed: {e}")
-                        # Continue loop - VisitComplete will be handled in the next iteration
-
-            if single_find("RollComplete") and not self.is_mac:
-                try:
-                    log("Confirm of high rolling!")
-                    center = get_center("Confirm", "Single")
-                    click_at(center.x / self.sft, center.y / self.sft)
-                except:
-                    time.sleep(1)
-                    continue
-                time.sleep(1)
-            btl = find_button("Visit")
-            if "Roll" in btl:
-                self.visit_roll_count += 1
-                log(f"Found Rolling! (Visit #{self.visits}, Roll #{self.visit_roll_count})")
-                while single_find("OneMore"):
-                    log("High times, one more!")
-                    center = get_center("OneMore", "Single")
-                    click_at(center.x / self.sft, center.y / self.sft)
-                    time.sleep(1)
-                    while single_find("UseTicket"):
-                        log("Use ticket!")
-                        cc = get_center("UseTicket", "Single")
-                        click_at(cc.x / self.sft, cc.y / self.sft)
-                        time.sleep(1)
-                        click_at(self.rb.x / self.sft, self.rb.y / self.sft)
-                        time.sleep(1)
-                    while single_find("Confirm"):
-                        log("Confirm ticket!")
-                        cc = get_center("Confirm", "Single")
-                        click_at(cc.x / self.sft, cc.y / self.sft)
-                        time.sleep(1)
-
-                # else:
-                #     center = get_center("Roll", "Visit")
-                #     click_at(center.x / self.sft, center.y / self.sft)
-                #     time.sleep(1)
-                #     while single_find("HConfirm"):
-                #         click_at(center.x / self.sft, center.y / self.sft)
-                log("Complete Rolling!")
-            elif "VisitComplete" in btl:
-                log(f"Complete visiting! (Visit #{self.visits}, Total rolls: {self.visit_roll_count})")
-                
-                # While loop to ensure complete is gone
-                while simple_single_find("VisitComplete", "Visit", 0.8):
-                    if simple_single_find("VisitBack", "Single", 0.8):
-                        cc = get_center("VisitBack", "Single")
-                        click_at(cc.x / self.sft, cc.y / self.sft)
-                        log("Clicked VisitBack to clear complete")
-                        time.sleep(1)
-                    else:
-                        time.sleep(1)
-                
-                log("VisitComplete is gone, continuing...")
-                return
-            elif "Timeout" in btl:
-                log("Visit timeout!")
-                center = get_center("Confirm", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-                return
-            elif "VisitBusy" in btl:
-                log("Visit busy!")
-                center = get_center("Confirm", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-            elif "TooManyRequest" in btl:
-                log("Too many request!")
-                center = get_center("TooManyRequest", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-            elif "AdsSkip" in btl:
-                log("Ads skipped!")
-                center = get_center("UseTicket", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
+    def on_roll(self, dets):
+        self.visit_roll_count += 1
+        metrics.ROLLS.inc()
+        log(f"Found Rolling! (Visit #{self.visits}, Roll #{self.visit_roll_count})")
+        while single_find("OneMore"):
+            log("High times, one more!")
+            center = get_center("OneMore", "Single")
+            click_at(center.x / self.sft, center.y / self.sft)
+            time.sleep(1)
+            while single_find("UseTicket"):
+                log("Use ticket!")
+                cc = get_center("UseTicket", "Single")
+                click_at(cc.x / self.sft, cc.y / self.sft)
                 time.sleep(1)
-            else:
-                self.visit_roll_count += 1
-                log(f"Keep visiting! (Visit #{self.visits}, Roll #{self.visit_roll_count})")
                 click_at(self.rb.x / self.sft, self.rb.y / self.sft)
-                # Slow down after 30 rolls to let game catch up
-                if not self.again_card_used and self.visit_roll_count > 30:
-                    time.sleep(3)
-                    log(f"⏱️ Extended wait (roll #{self.visit_roll_count} > 30)")
-                else:
-                    time.sleep(1)
+                time.sleep(1)
+            if single_find("Confirm"):
+                log("Confirm ticket!")
+                click_until_gone("Confirm", retry_interval=1, timeout=None, sft=self.sft)
+        log("Complete Rolling!")
+
+    def on_visit_complete(self, dets):
+        log(f"Complete visiting! (Visit #{self.visits}, Total rolls: {self.visit_roll_count})")
+
+        # While loop to ensure complete is gone
+        while simple_single_find("VisitComplete", "Visit", 0.8):
+            if simple_single_find("VisitBack", "Single", 0.8):
+                cc = get_center("VisitBack", "Single")
+                click_at(cc.x / self.sft, cc.y / self.sft)
+                log("Clicked VisitBack to clear complete")
+            wait_until(lambda: not simple_single_find("VisitComplete", "Visit", 0.8), timeout=1)
+
+        log("VisitComplete is gone, continuing...")
+        return STOP
+
+    def on_visit_timeout(self, dets):
+        log("Visit timeout!")
+        center = get_center("Confirm", "Single")
+        if center is None:  # Dialog already closed
+            return STOP
+        click_at(center.x / self.sft, center.y / self.sft)
+        time.sleep(1)
+        return STOP
+
+    def on_visit_busy(self, dets):
+        log("Visit busy!")
+        center = get_center("Confirm", "Single")
+        if center is None:  # Dialog already closed
+            return
+        click_at(center.x / self.sft, center.y / self.sft)
+        time.sleep(1)
+
+    def on_visit_too_many_request(self, dets):
+        log("Too many request!")
+        center = get_center("TooManyRequest", "Single")
+        click_at(center.x / self.sft, center.y / self.sft)
+        time.sleep(1)
+
+    def on_ads_skip(self, dets):
+        log("Ads skipped!")
+        center = get_center("UseTicket", "Single")
+        click_at(center.x / self.sft, center.y / self.sft)
+        time.sleep(1)
+
+    def on_keep_visiting(self, dets):
+        self.visit_roll_count += 1
+        metrics.ROLLS.inc()
+        log(f"Keep visiting! (Visit #{self.visits}, Roll #{self.visit_roll_count})")
+        click_at(self.rb.x / self.sft, self.rb.y / self.sft)
+        # Slow down after 30 rolls to let game catch up
+        if not self.again_card_used and self.visit_roll_count > 30:
+            time.sleep(3)
+            log(f"⏱️ Extended wait (roll #{self.visit_roll_count} > 30)")
+        else:
+            time.sleep(1)
 
     def find_cat_house(self):
         """Find and click cat house with friend rotation logic."""
@@ -306,7 +320,7 @@ class MainRun:
             
             # Scroll to top first
             scroll_up = 500 if self.is_mac else 10
-            pyautogui.vscroll(scroll_up)
+            vscroll(scroll_up)
             log("Scrolled to top of friend list")
             time.sleep(1)
 
@@ -318,7 +332,7 @@ class MainRun:
             
             # Scroll incrementally, one slot at a time with 1 second delay
             for slot in range(target_slot):
-                pyautogui.vscroll(scroll_per_slot)
+                vscroll(scroll_per_slot)
                 log(f"Scrolled to slot {slot + 1}/{target_slot}")
                 time.sleep(1)
             
@@ -473,10 +487,8 @@ class MainRun:
         time.sleep(1)
         if single_find("CatCard"):
             cc = get_center("CatCard", "Single")
-            # Move the cursor to the starting point
-            pyautogui.moveTo(cc.x / self.sft, cc.y / self.sft, duration=0.5)
-            # Drag the cursor to the destination point
-            pyautogui.dragTo(cc.x / self.sft, cc.y / self.sft - 300, duration=1, button='left')
+            # Drag the cat card up from its position
+            drag(cc.x / self.sft, cc.y / self.sft, cc.x / self.sft, cc.y / self.sft - 300)
             time.sleep(8)
             # Can be busy sometime
             while single_find("VisitBusy"):
@@ -500,225 +512,191 @@ class MainRun:
     def light_run(self):
         if not self.semi_auto:
             self.long_click()
-        while True:
-            bts = find_button("Main")
-            if "VisitMain" in bts:
-                self.consecutive_clicks = 0
-                log("Visiting! This is " + str(self.visits) + " visit!")
-                center = get_center("VisitFriend", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-                click_at(center.x / self.sft, center.y / self.sft - 200)
-                while not self.find_cat_house():
-                    time.sleep(1)
-                self.visiting()
-                time.sleep(1)
-                continue
-            elif "NoMore" in bts:
-                log("This RUN is DONE!! Total " + str(self.visits) + " visits!")
-                click_at(self.rb.x / self.sft, self.rb.y / self.sft)
-                time.sleep(1)
-                return
-            elif "Confirm" in bts:
-                while single_find("Confirm"):
-                    center = get_center("Confirm", "Single")
-                    click_at(center.x / self.sft, center.y / self.sft)
-                    time.sleep(1)
-                self.long_click()
-            # elif "RobotDetect" in bts:
-            #     log("Robot detected!")
-            #     # RobotCheck disabled
-            #     time.sleep(1)
-            #     click_at(self.rb.x / self.sft, self.rb.y / self.sft)
-            #     time.sleep(1)
-            #     self.long_click()
-            #     time.sleep(1)
-            elif single_find("PKG"):
-                click_at(self.rb.x / self.sft, self.rb.y / self.sft + 100)
-                time.sleep(1)
-            elif not self.semi_auto and simple_single_find("RunButton", "Main", 0.8):
-                log("Auto run stopped, resume it...")
-                self.long_click()
-                time.sleep(2)
-            else:
-                log("In running!")
-                time.sleep(5)
+        self.screen_machine("light_run").run()
 
     def switch_run(self, run_index = 0):
         self.friend_index = run_index
-        while True:
-            # Debug: Check what's on screen
-            face_detected = simple_single_find("FACE_UP_LEFT", "Single", 0.45) and self.smart_grab.check_run_face_in_box()
-            twb_bar_detected = simple_single_find("TW", "Single", 0.7)
-            oneb_bar_detected = simple_single_find("ONE", "Single", 0.7)
-            if self.current_mode is None:
-                if oneb_bar_detected:
-                    self.current_mode = "ONEB"
-                else:
-                    self.current_mode = "TWB"
-            
-            log(f"🔍 Detection: FACE={face_detected}, TWB_bar={twb_bar_detected}, ONEB_bar={oneb_bar_detected}, mode={self.current_mode}")
-            
-            # Simple idempotent checks:
-            # 1. If FACE detected, switch to TWB
-            # 2. Else, if not in ONEB, switch to ONEB
-            if face_detected:
-                if oneb_bar_detected:
-                    if self.switch("ONE", "TWB", "TW"):
-                        self.current_mode = "TWB"
-                        log("🔄 Switching to TWB mode")
-            else:
-                if twb_bar_detected:
-                    if self.switch("TW", "ONEB", "ONE"):
-                        self.current_mode = "ONEB"
-                        log("🔄 Switching to ONEB mode (smart grab disabled)")
-
-            # Check for map repair before other actions
-            self.map_repair()
-
-            if simple_single_find("DingHao", "Single", 0.7):
-                # Guosha ding le
-                log("Guo sha ding le.... Sleep 10 mins")
-                time.sleep(10 * 60)
-                self.restart_game()
-                continue
-
-            bts = find_button("Main")
-            if "Guess" in bts:
-                log("Found Guess! Let's guess!")
-                self.guess()
-                time.sleep(2)
-                continue
-            elif "VisitMain" in bts:
-                self.consecutive_clicks = 0
-                log("Visiting! This is " + str(self.visits) + " visit!")
-                center = get_center("VisitFriend", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-                click_at(center.x / self.sft, center.y / self.sft - 200)
-                
-                if not self.find_cat_house():
-                    time.sleep(1)
-                    self.find_cat_house()
-                
-                self.visiting()
-                time.sleep(1)
-                continue
-            elif "Replace" in bts:
-                log("Found replacement let's wait!")
-                center = get_center("Replace", "Main")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(5)
-                continue
-            elif "Gift" in bts:
-                log("Need to thank the gift sender!")
-                center = get_center("Exit", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-                continue
-            elif "NoMore" in bts:
-                log("This RUN is DONE!! Total " + str(self.visits) + " visits!")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-                return
-            elif "ToManyRequest" in bts:
-                log("Too many requests!")
-                center = get_center("Confirm", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-            elif "ChessManInner" in bts:
-                while single_find("ChessManInner"):
-                    click_at(self.chess_maninner[0], self.chess_maninner[1])
-                    time.sleep(1)
-                    log("Exit chess inner!")
-                time.sleep(2)
-                while single_find("ChessMan"):
-                    click_at(self.chess_man[0], self.chess_man[1])
-                    time.sleep(1)
-                    log("Exit chess!")
-                time.sleep(2)
-                continue
-            elif "ChessMan" in bts:
-                log("Found ChessMan! Let's play chess!")
-                while single_find("ChessMan"):
-                    click_at(self.chess_man[0], self.chess_man[1])
-                    time.sleep(1)
-                    log("Exit chess!")
-                time.sleep(2)
-                continue
-            elif single_find("PKG"):
-                click_at(self.rb.x / self.sft, self.rb.y / self.sft + 100)
-                time.sleep(1)
-            else:
-                self.count += 1
-                self.consecutive_clicks += 1
-                click_at(self.rb.x / self.sft, self.rb.y / self.sft)
-                log("Keep running! This is " + str(self.count) + " clicks, " + str(self.consecutive_clicks) + " consecutive clicks")
-                if self.consecutive_clicks > 150:
-                    log(f"Consecutive clicks exceeded 150 ({self.consecutive_clicks}), restarting game...")
-                    self.consecutive_clicks = 0
-                    self.restart_game()
-                    continue
-                time.sleep(4.5)
+        self.screen_machine("switch_run").run()
 
     def run(self):
-        while True:
-            bts = find_button("Main")
-            if "Guess" in bts:
-                log("Found Guess! Let's guess!")
-                self.guess()
-                time.sleep(2)
-                continue
-            elif "VisitMain" in bts:
-                self.consecutive_clicks = 0
-                log("Visiting! This is " + str(self.visits) + " visit!")
-                center = get_center("VisitFriend", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-                if not self.find_cat_house():
-                    self.find_cat_house()
-                self.visiting()
-                time.sleep(1)
-                continue
-            elif "Replace" in bts:
-                log("Found replacement! Take it!")
-                center = get_center("Replace", "Main")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-                continue
-            elif "Gift" in bts:
-                log("Need to thank the gift sender!")
-                center = get_center("Exit", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
-                continue
-            elif "NoMore" in bts:
-                log("This RUN is DONE!! Total " + str(self.visits) + " visits!")
-                click_at(self.rb.x / self.sft, self.rb.y / self.sft)
-                time.sleep(1)
-                return
-            elif "ToManyRequest" in bts:
-                log("Too many requests!")
-                center = get_center("Confirm", "Single")
-                click_at(center.x / self.sft, center.y / self.sft)
-                time.sleep(1)
+        self.screen_machine("run").run()
+
+    def screen_machine(self, flow):
+        """
+        Build the screen state machine of a main-page flow: "run", "light_run" or "switch_run".
+        """
+        if flow == "light_run":
+            states = [
+                ScreenState("VisitMain", "VisitMain", lambda dets: self.visit_friend(retries=None), priority=100),
+                ScreenState("NoMore", "NoMore", self.on_no_more, priority=90),
+                ScreenState("Confirm", "Confirm", self.on_confirm, priority=80, always=True),
+                ScreenState("PKG", "PKG", self.on_package, priority=70, always=True),
+            ]
+            running_next = ["VisitMain", "NoMore"]
+            if not self.semi_auto:
+                states.append(ScreenState("Stopped", "RunButton", self.on_auto_run_stopped, priority=60))
+                running_next.append("Stopped")
+            return ScreenMachine(states, default=self.on_auto_running, name=flow, default_next=running_next)
+
+        # Screens a click on the run button can lead to; dialogs are checked on every iteration
+        after_click = ["Guess", "VisitMain", "Replace", "Gift", "NoMore"]
+
+        states = [
+            ScreenState("Guess", "Guess", self.on_guess, priority=100, next_states=after_click),
+            ScreenState("VisitMain", "VisitMain", lambda dets: self.visit_friend(
+                third_click=(flow == "switch_run"), retry_delay=(1 if flow == "switch_run" else 0)), priority=90),
+            ScreenState("Replace", "Replace", lambda dets: self.on_replace(dets, wait=(flow == "switch_run")),
+                        priority=80, next_states=after_click),
+            ScreenState("Gift", "Gift", self.on_gift, priority=70, next_states=after_click),
+            ScreenState("NoMore", "NoMore", self.on_no_more, priority=60),
+            ScreenState("TooManyRequest", "TooManyRequest", self.on_too_many_request, priority=50, always=True),
+        ]
+        # Same click limits and delays as the loops these machines replace: run clicked every 0.5 s
+        # and restarted after 100 clicks without a visit, switch_run every 4.5 s and after 150
+        if flow == "run":
+            return ScreenMachine(states, default=lambda dets: self.keep_running(100, delay=0.5), name=flow,
+                                 default_next=after_click)
+        states += [
+            ScreenState("ChessManInner", "ChessManInner", self.on_chess_man_inner, priority=40, always=True),
+            ScreenState("ChessMan", "ChessMan", self.on_chess_man, priority=30),
+            ScreenState("PKG", "PKG", self.on_package, priority=20, always=True),
+        ]
+        return ScreenMachine(states, default=lambda dets: self.keep_running(150, delay=4.5),
+                             before=self.before_switch_step, name=flow, default_next=after_click + ["ChessMan"])
+
+    def before_switch_step(self):
+        # Debug: Check what's on screen
+        face_detected = simple_single_find("FACE_UP_LEFT", "Single", 0.45) and self.smart_grab.check_run_face_in_box()
+        twb_bar_detected = simple_single_find("TW", "Single", 0.7)
+        oneb_bar_detected = simple_single_find("ONE", "Single", 0.7)
+        if self.current_mode is None:
+            if oneb_bar_detected:
+                self.current_mode = "ONEB"
             else:
-                self.count += 1
-                log("Keep running! This is " + str(self.count) + " clicks")
-                click_at(self.rb.x / self.sft, self.rb.y / self.sft)
-                self.consecutive_clicks += 1
-                if self.consecutive_clicks > 100:
-                    log(f"Consecutive clicks exceeded 100 ({self.consecutive_clicks}), restarting game...")
-                    self.consecutive_clicks = 0
-                    self.restart_game()
-                    continue
-                time.sleep(0.5)
+                self.current_mode = "TWB"
+
+        log(f"🔍 Detection: FACE={face_detected}, TWB_bar={twb_bar_detected}, ONEB_bar={oneb_bar_detected}, mode={self.current_mode}")
+
+        # Simple idempotent checks:
+        # 1. If FACE detected, switch to TWB
+        # 2. Else, if not in ONEB, switch to ONEB
+        if face_detected:
+            if oneb_bar_detected:
+                if self.switch("ONE", "TWB", "TW"):
+                    self.current_mode = "TWB"
+                    log("🔄 Switching to TWB mode")
+        else:
+            if twb_bar_detected:
+                if self.switch("TW", "ONEB", "ONE"):
+                    self.current_mode = "ONEB"
+                    log("🔄 Switching to ONEB mode (smart grab disabled)")
+
+        # Check for map repair before other actions
+        self.map_repair()
+
+        if simple_single_find("DingHao", "Single", 0.7):
+            self.ding_hao_sleep()
+            return SKIP
+        return None
+
+    def on_guess(self, dets):
+        log("Found Guess! Let's guess!")
+        self.guess()
+        time.sleep(2)
+
+    def visit_friend(self, third_click=True, retries=1, retry_delay=1):
+        """
+        Open the friend list, go to the next friend's cat house and visit it.
+
+        Args:
+            third_click: Also click 200px above the friend list button
+            retries: Extra find_cat_house attempts (None = until it succeeds)
+            retry_delay: Seconds to wait before each retry
+        """
+        self.consecutive_clicks = 0
+        log("Visiting! This is " + str(self.visits) + " visit!")
+        center = get_center("VisitFriend", "Single")
+        click_at(center.x / self.sft, center.y / self.sft)
+        time.sleep(1)
+        click_at(center.x / self.sft, center.y / self.sft)
+        time.sleep(1)
+        if third_click:
+            click_at(center.x / self.sft, center.y / self.sft - 200)
+        attempts = 0
+        while not self.find_cat_house() and (retries is None or attempts < retries):
+            attempts += 1
+            time.sleep(retry_delay)
+        self.visiting()
+        time.sleep(1)
+
+    def on_replace(self, dets, wait=False):
+        log("Found replacement let's wait!" if wait else "Found replacement! Take it!")
+        center = dets["Replace"].location
+        click_at(center.x / self.sft, center.y / self.sft)
+        time.sleep(5 if wait else 1)
+
+    def on_gift(self, dets):
+        log("Need to thank the gift sender!")
+        center = get_center("Exit", "Single")
+        click_at(center.x / self.sft, center.y / self.sft)
+        time.sleep(1)
+
+    def on_no_more(self, dets):
+        log("This RUN is DONE!! Total " + str(self.visits) + " visits!")
+        click_at(self.rb.x / self.sft, self.rb.y / self.sft)
+        time.sleep(1)
+        return STOP
+
+    def on_too_many_request(self, dets):
+        log("Too many requests!")
+        center = get_center("Confirm", "Single")
+        if center is None:  # Dialog already closed
+            return
+        click_at(center.x / self.sft, center.y / self.sft)
+        time.sleep(1)
+
+    def on_chess_man_inner(self, dets):
+        log("Exit chess inner!")
+        click_until_gone("ChessManInner", self.chess_maninner, timeout=None, retry_interval=1)
+        time.sleep(2)
+        self.on_chess_man(dets)
+
+    def on_chess_man(self, dets):
+        log("Found ChessMan! Let's play chess!")
+        click_until_gone("ChessMan", self.chess_man, timeout=None, retry_interval=1)
+        log("Exit chess!")
+        time.sleep(2)
+
+    def on_confirm(self, dets):
+        click_until_gone("Confirm", timeout=None, retry_interval=1, sft=self.sft)
+        self.long_click()
+
+    def on_package(self, dets):
+        click_at(self.rb.x / self.sft, self.rb.y / self.sft + 100)
+        time.sleep(1)
+
+    def on_auto_run_stopped(self, dets):
+        log("Auto run stopped, resume it...")
+        self.long_click()
+        time.sleep(2)
+
+    def on_auto_running(self, dets):
+        log("In running!")
+        time.sleep(5)
+
+    def keep_running(self, max_consecutive, delay):
+        """Click the run button, restarting the game after max_consecutive clicks without a visit."""
+        self.count += 1
+        self.consecutive_clicks += 1
+        click_at(self.rb.x / self.sft, self.rb.y / self.sft)
+        log("Keep running! This is " + str(self.count) + " clicks, " + str(self.consecutive_clicks) + " consecutive clicks",
+            rate_limit=True)
+        if self.consecutive_clicks > max_consecutive:
+            log(f"Consecutive clicks exceeded {max_consecutive} ({self.consecutive_clicks}), restarting game...")
+            self.consecutive_clicks = 0
+            self.restart_game()
+            return
+        time.sleep(delay)
 
     def switch(self, from_s, to_s, to_f):
         # First try to click from_s if it exists
@@ -766,14 +744,7 @@ class MainRun:
         rb_y_logical = self.rb.y / self.sft
         ConfigCoords.update_run_button_in_config(rb_x_logical, rb_y_logical)
 
-        try:
-            coor_dict.clear()
-        except:
-            pass
-        try:
-            but_list.clear()
-        except:
-            pass
+        forget_view()
 
         try:
             self.smart_grab.sft = self.sft
@@ -789,6 +760,7 @@ class MainRun:
         return True
 
     def restart_game(self):
+        metrics.RESTARTS.inc()
         success_flag = False
         while not success_flag:
             try:
@@ -825,6 +797,9 @@ class MainRun:
         #     self.close_game()
         #     log("Closing the game.....")
 
+        def remaining():
+            return max(0.0, timeout - (time.time() - start_time))
+
         while single_find("CloseTab"):
             self.close_game()
             if time.time() - start_time > timeout:
@@ -832,71 +807,44 @@ class MainRun:
                 return False
         log("Game closed!")
 
-        while not single_find("ClickGame"):
-
-            if time.time() - start_time > timeout:
-                log("Game restart timeout!")
-                return False
-            log("Waiting for game button shows up....")
-            time.sleep(2)
-
+        log("Waiting for game button shows up....")
+        if not wait_until("ClickGame", timeout=remaining()):
+            log("Game restart timeout!")
+            return False
         log("Game button shows up now!")
 
-        while single_find("ClickGame"):
-            if time.time() - start_time > timeout:
-                log("Game restart timeout!")
-                return False
+        def click_game():
             center = get_center("ClickGame", "Single")
-            click_at(center.x + self.start_button[0] - self.rb.x, center.y + self.start_button[1] - self.rb.y)
-            time.sleep(2)
-            log("Game button clicked!")
+            if center is not None:
+                click_at(center.x + self.start_button[0] - self.rb.x, center.y + self.start_button[1] - self.rb.y)
+                log("Game button clicked!")
 
+        if not click_until_gone("ClickGame", click_game, timeout=remaining()):
+            log("Game restart timeout!")
+            return False
         log("Game button clicked!")
 
-        while not single_find("Announcement"):
-            if time.time() - start_time > timeout:
-                log("Game restart timeout!")
-                return False
-            log("Waiting for announcement shows up....")
-            time.sleep(2)
-
+        log("Waiting for announcement shows up....")
+        if not wait_until("Announcement", timeout=remaining()):
+            log("Game restart timeout!")
+            return False
         log("Announcement shows up now!")
 
-        while single_find("Announcement"):
-            if time.time() - start_time > timeout:
-                log("Game restart timeout!")
-                return False
-            click_at(self.close_announce[0], self.close_announce[1])
-            time.sleep(2)
-            log("Announcement clicked!")
-
+        if not click_until_gone("Announcement", self.close_announce, timeout=remaining()):
+            log("Game restart timeout!")
+            return False
         log("Announcement clicked!")
 
-        while not single_find("StartGame"):
-            if time.time() - start_time > timeout:
-                log("Game restart timeout!")
-                return False
-            log("Waiting for game button shows up....")
-            time.sleep(2)
-
-        log("Game button shows up now!")
-
-        while not single_find("StartGame"):
-            if time.time() - start_time > timeout:
-                log("Game restart timeout!")
-                return False
-            log("Waiting starting game shows up....")
-            time.sleep(2)
-
+        log("Waiting starting game shows up....")
+        if not wait_until("StartGame", timeout=remaining()):
+            log("Game restart timeout!")
+            return False
         log("Start game shows up!")
 
-        while single_find("StartGame"):
-            if time.time() - start_time > timeout:
-                log("Game restart timeout!")
-                return False
-            click_at(self.start_game[0], self.start_game[1])
-            time.sleep(2)
-            log("Start game clicking!")
+        if not click_until_gone("StartGame", self.start_game, timeout=remaining()):
+            log("Game restart timeout!")
+            return False
+        log("Start game clicked!")
 
         # while not single_find("RunButton"):
         #     if time.time() - start_time > timeout:
@@ -907,24 +855,23 @@ class MainRun:
         #     log("Waiting for main page and click empty place to close ads")
 
         while not single_find("AutoPick"):
-            if time.time() - start_time > timeout:
+            if remaining() <= 0:
                 log("Game restart timeout!")
                 return False
             log("Clicking auto configs....")
             click_at(self.setup[0], self.setup[1])
-            time.sleep(2)
+            if wait_until("AutoPick", timeout=min(2.0, remaining())):
+                break
 
         log("Auto configs clicked!")
 
-        while single_find("AutoPick"):
-            if time.time() - start_time > timeout:
-                log("Game restart timeout!")
-                return False
-            log("Auto configs starts...")
-            click_at(self.setup_confirm[0], self.setup_confirm[1])
-            time.sleep(2)
+        log("Auto configs starts...")
+        if not click_until_gone("AutoPick", self.setup_confirm, timeout=remaining()):
+            log("Game restart timeout!")
+            return False
 
         log("Auto configs started! Everything is done! Continue!")
+        display.invalidate()
         self.refresh_run_button_and_coords()
         self.consecutive_clicks = 0
         time.sleep(2)
@@ -0,0 +1,182 @@
+"""
+Declarative screen state machine.
+
+Each screen the bot reacts to is declared once as a ScreenState: the templates
+that recognize it, its priority and the action to run there. ScreenMachine
+classifies a frame with one batched detect() over the templates of its states
+only, picks the highest-priority state whose template was found, and calls
+its action with the detections.
+
+A state may list the states that can legitimately follow it (next_states).
+The next frame is then only checked for those, plus the states marked
+always (error dialogs and popups that can show up at any time), with a full
+sweep over every state every full_sweep_every iterations (and after states
+without a list) as a safety net. stats() reports the templates matched per iteration against
+the full-sweep cost.
+
+Usage:
+    machine = ScreenMachine([
+        ScreenState("Guess", "Guess", on_guess, priority=10),
+        ScreenState("Done", "NoMore", lambda dets: STOP),
+    ], default=keep_running, default_next=["Guess"])
+    machine.run()
+"""
+import time
+from collections import Counter
+
+from common import detect
+from log_helper import log
+import metrics
+
+STOP = "stop"  # Returned by an action to end ScreenMachine.run()
+SKIP = "skip"  # Returned by the before hook to start the next iteration without classifying
+
+
+class ScreenState:
+    """One recognizable screen and what to do when it is shown."""
+
+    def __init__(self, name, templates, action, priority=0, th=0.8, next_states=None, always=False):
+        """
+        Args:
+            name: State name, used in stats and logs
+            templates: Button name or list of names (any resource map); any of them found means this state
+            action: Callable taking the detections dict; may return STOP
+            priority: Higher priorities win when several states match the same frame
+            th: Confidence threshold of this state's templates
+            next_states: Names of the states that can follow this one (None = any, full sweep)
+            always: Check this state on every iteration, whatever the previous state listed
+        """
+        self.name = name
+        self.templates = [templates] if isinstance(templates, str) else list(templates)
+        self.action = action
+        self.priority = priority
+        self.th = th
+        self.next_states = next_states
+        self.always = always
+
+    def matches(self, detections):
+        return any(detections[t].found for t in self.templates if t in detections)
+
+    def __repr__(self):
+        return f"ScreenState({self.name!r}, {self.templates!r}, priority={self.priority})"
+
+
+class ScreenMachine:
+    """Classifies frames into ScreenStates and dispatches their actions."""
+
+    def __init__(self, states, default=None, before=None, name="screen", default_next=None,
+                 full_sweep_every=10, report_every=100):
+        """
+        Args:
+            states: ScreenState list; equal priorities keep their declared order
+            default: Action taking the detections when no state matches
+            before: Optional callable run at the start of every iteration; returning SKIP skips it
+            name: Machine name, used in logs
+            default_next: Names of the states that can follow the default action (None = any)
+            full_sweep_every: Check every state at least once per this many iterations (0 = always)
+            report_every: Log the stats every this many iterations (0 = only when run() ends)
+        """
+        self.states = sorted(states, key=lambda s: -s.priority)
+        self.default = default
+        self.before = before
+        self.name = name
+        self.default_next = default_next
+        self.full_sweep_every = full_sweep_every
+        self.report_every = report_every
+        self._by_name = {state.name: state for state in self.states}
+        for names in [default_next] + [state.next_states for state in self.states]:
+            unknown = set(names or []) - set(self._by_name)
+            if unknown:
+                raise ValueError(f"Unknown next states {sorted(unknown)} in {name} machine")
+        self.full_templates = len({t for state in self.states for t in state.templates})
+        self.counts = Counter()  # state name (None = default) -> times dispatched
+        self.last = None
+        self.iterations = 0
+        self.full_sweeps = 0
+        self.templates_matched = 0
+        self._since_sweep = 0
+
+    def classify(self, gs=None, states=None):
+        """
+        Run one batched detection over the templates of the given states (default: all).
+
+        Returns:
+            (state or None, detections dict)
+        """
+        states = self.states if states is None else states
+        names, th = [], {}
+        for state in states:
+            for template in state.templates:
+                if template not in th:
+                    names.append(template)
+                    th[template] = state.th
+        # Once a template of the top state is found no other state can win
+        priority = states[0].templates if states else None
+        detections = detect(names, gs=gs, th=th, priority=priority)
+        self.templates_matched += sum(1 for d in detections.values() if d.score is not None)
+        for state in states:
+            if state.matches(detections):
+                return state, detections
+        return None, detections
+
+    def candidates(self):
+        """
+        The states to check this iteration: the successors of the last state and the always
+        states, or all of them.
+        """
+        next_names = self.last.next_states if self.last is not None else self.default_next
+        if self.iterations == 0 or next_names is None or (self.full_sweep_every
+                                                          and self._since_sweep >= self.full_sweep_every):
+            return None
+        return [state for state in self.states if state.always or state.name in next_names]
+
+    def step(self):
+        """Classify the current frame and run the matching action; returns the action's result."""
+        started = time.perf_counter()
+        try:
+            return self._step()
+        finally:
+            metrics.LOOP_SECONDS.set(time.perf_counter() - started, loop=self.name)
+
+    def _step(self):
+        if self.before is not None and self.before() == SKIP:
+            return None
+        states = self.candidates()
+        if states is None:
+            self.full_sweeps += 1
+            self._since_sweep = 0
+        else:
+            self._since_sweep += 1
+        state, detections = self.classify(states=states)
+        self.iterations += 1
+        self.last = state
+        self.counts[state.name if state else None] += 1
+        if self.report_every and self.iterations % self.report_every == 0:
+            self.report()
+        action = state.action if state else self.default
+        return action(detections) if action is not None else None
+
+    def run(self, max_steps=None):
+        """Step until an action returns STOP, or max_steps iterations."""
+        steps = 0
+        while max_steps is None or steps < max_steps:
+            steps += 1
+            if self.step() == STOP:
+                break
+        self.report()
+
+    def stats(self):
+        return {
+            "iterations": self.iterations,
+            "full_sweeps": self.full_sweeps,
+            "templates_per_iteration": self.templates_matched / self.iterations if self.iterations else 0.0,
+            "full_sweep_templates": self.full_templates,
+            "states": dict(self.counts),
+        }
+
+    def report(self):
+        stats = self.stats()
+        if stats["iterations"]:
+            log(f"[{self.name}] {stats['iterations']} iterations, {stats['full_sweeps']} full sweeps, "
+                f"{stats['templates_per_iteration']:.1f} templates matched per iteration "
+                f"(full sweep: {stats['full_sweep_templates']})")
@@ -0,0 +1,172 @@
+"""
+Event-driven waiting for screen transitions.
+
+wait_until() replaces `while not single_find(X): time.sleep(1)` loops: it
+polls the screen every min_interval seconds, backing off towards max_interval
+while nothing moves (every poll is a full capture), only re-runs the template
+match when a downsampled copy of the screen actually changed, or at least
+every max_interval seconds, and returns as soon as the condition holds.
+click_until_gone() replaces `while single_find(X): click; time.sleep(2)`, and
+wait_for_change() the fixed sleep after a click that opens a dialog.
+
+Usage:
+    from screen_wait import wait_until, click_until_gone
+    wait_until("Announcement", timeout=60)
+    click_until_gone("AutoPick", (x, y), timeout=30)
+"""
+import time
+
+import cv2
+import numpy as np
+
+from click import click_at
+from common import frames, get_center_with_path, resolve_template_path, single_find_with_path
+
+THUMB_SIZE = (64, 40)  # Size of the screen copy compared between polls
+CHANGE_THRESHOLD = 2.0  # Mean absolute gray-level difference counting as a change
+BACKOFF = 1.5  # Poll interval growth per poll without a change
+
+wait_stats = {"waits": 0, "timeouts": 0, "polls": 0, "checks": 0, "skipped": 0, "seconds": 0.0}
+
+
+def _thumbnail(gray):
+    return cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def as_condition(target, th=0.8, present=True):
+    """
+    Turn a template name/path into a predicate, callables are returned unchanged.
+
+    Args:
+        target: Callable, button name (any resource map) or template path
+        th: Confidence threshold for templates
+        present: True to wait for the template to appear, False for it to disappear
+    """
+    if callable(target):
+        return target
+    path = resolve_template_path(target)
+    if path is None:
+        raise ValueError(f"Unknown template '{target}'")
+    if present:
+        return lambda: single_find_with_path(path, None, th)
+    return lambda: not single_find_with_path(path, None, th)
+
+
+def wait_until(condition, timeout=30.0, min_interval=0.5, max_interval=1.0, th=0.8, present=True):
+    """
+    Wait until a condition holds, re-checking it only when the screen changed.
+
+    Args:
+        condition: Callable, or button name/template path (see as_condition)
+        timeout: Seconds before giving up (None = wait forever)
+        min_interval: Seconds between two screen polls while the screen changes
+        max_interval: Longest poll interval; the condition is checked at least this often
+        th: Confidence threshold for templates
+        present: For templates, wait for appearance (True) or disappearance (False)
+
+    Returns:
+        The condition's truthy result, or False on timeout
+    """
+    check = as_condition(condition, th, present)
+    start = time.time()
+    wait_stats["waits"] += 1
+    last_thumb = None
+    last_check = 0.0
+    interval = min_interval
+    try:
+        while True:
+            now = time.time()
+            frame = frames.get()
+            thumb = _thumbnail(frame.gray)
+            wait_stats["polls"] += 1
+            changed = last_thumb is None or float(np.mean(np.abs(thumb - last_thumb))) >= CHANGE_THRESHOLD
+            interval = min_interval if changed else min(max_interval, interval * BACKOFF)
+            if changed or now - last_check >= max_interval:
+                last_thumb = thumb
+                last_check = now
+                wait_stats["checks"] += 1
+                result = check()
+                if result:
+                    return result
+            else:
+                wait_stats["skipped"] += 1
+            if timeout is not None and time.time() - start >= timeout:
+                wait_stats["timeouts"] += 1
+                return False
+            time.sleep(interval)
+    finally:
+        wait_stats["seconds"] += time.time() - start
+
+
+def wait_for_change(timeout=2.0, settle=0.3, min_interval=0.5, max_interval=1.0):
+    """
+    Wait until the screen changes and then stays still for settle seconds (e.g. a dialog opened).
+
+    Args:
+        timeout: Seconds before giving up
+        settle: Seconds the changed screen must stay unchanged (0 = return on the first change)
+        min_interval: Seconds between two screen polls while the screen changes
+        max_interval: Longest poll interval while it stays still
+
+    Returns:
+        True if the screen changed (and settled), False on timeout
+    """
+    start = time.time()
+    wait_stats["waits"] += 1
+    first = _thumbnail(frames.get().gray)
+    previous, changed_at = first, None
+    interval = min_interval
+    try:
+        while time.time() - start < timeout:
+            time.sleep(min(interval, max(0.0, timeout - (time.time() - start))))
+            thumb = _thumbnail(frames.get().gray)
+            wait_stats["polls"] += 1
+            moving = float(np.mean(np.abs(thumb - previous))) >= CHANGE_THRESHOLD
+            interval = min_interval if moving else min(max_interval, interval * BACKOFF)
+            previous = thumb
+            if changed_at is None:
+                if float(np.mean(np.abs(thumb - first))) >= CHANGE_THRESHOLD:
+                    changed_at = time.time()
+            elif moving:
+                changed_at = time.time()
+            if changed_at is not None and time.time() - changed_at >= settle:
+                return True
+        wait_stats["timeouts"] += 1
+        return False
+    finally:
+        wait_stats["seconds"] += time.time() - start
+
+
+def click_until_gone(target, click=None, timeout=30.0, retry_interval=2.0, th=0.8, sft=1):
+    """
+    Click until a template disappears, waiting for the screen between clicks.
+
+    Args:
+        target: Button name or template path that should disappear
+        click: (x, y) logical point, callable doing the click, or None to click the template itself
+        timeout: Seconds before giving up (None = keep trying)
+        retry_interval: Seconds to wait for the template to go before clicking again
+        th: Confidence threshold
+        sft: Divisor applied to the template center when clicking it (the caller's scaling factor)
+
+    Returns:
+        True once the template is gone, False on timeout
+    """
+    path = resolve_template_path(target)
+    if path is None:
+        raise ValueError(f"Unknown template '{target}'")
+    start = time.time()
+    while single_find_with_path(path, None, th):
+        if timeout is not None and time.time() - start >= timeout:
+            return False
+        if callable(click):
+            click()
+        elif click is not None:
+            click_at(click[0], click[1])
+        else:
+            center = get_center_with_path(path, None, th)
+            if center is not None:
+                click_at(center.x / sft, center.y / sft)
+        if wait_until(path, timeout=retry_interval, th=th, present=False):
+            return True
+    return True
@@ -0,0 +1,266 @@
+"""
+Session recorder: log frames, detections and input events while the bot runs.
+
+A session file is a gzip stream of length-prefixed records, appended to by a
+background writer thread. Each record is a JSON header, optionally followed by
+a PNG payload:
+    {"type": "frame", "t": ..., "hash": "..."}               + PNG on first sight
+    {"type": "detection", "t": ..., "template": ..., "found": ..., "score": ...,
+     "location": [x, y], "seconds": ...}
+    {"type": "input", "t": ..., "action": "click", "args": [x, y]}
+Frames are sampled at most every frame_interval seconds and deduplicated by a
+hash of their pixels, so a static screen is stored once. The queue is
+bounded: when the writer falls behind, records are dropped and counted instead
+of blocking the bot.
+
+Usage:
+    recorder = SessionRecorder("sessions/run.ipsession").start()
+    ...
+    recorder.stop()
+
+    reader = SessionReader("sessions/run.ipsession")
+    reader.summary()
+    reader.export_frames("sessions/run_frames")  # frames for replay.py
+"""
+import gzip
+import hashlib
+import json
+import os
+import queue
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from click import add_input_listener, remove_input_listener
+from common import add_detection_listener, remove_detection_listener, frames
+from log_helper import log
+
+_RECORD_HEADER = struct.Struct("<II")  # JSON header length, payload length
+
+
+def frame_hash(gray):
+    """
+    64-bit BLAKE2 hash of a grayscale image's pixels, as 16 hex digits.
+    Only identical screens share a hash: a popup or a changed counter is a new frame.
+    """
+    digest = hashlib.blake2b(np.ascontiguousarray(gray).data, digest_size=8)
+    digest.update(struct.pack("<II", *gray.shape[:2]))
+    return digest.hexdigest()
+
+
+class SessionRecorder:
+    """Records a running session to a compressed append-only file."""
+
+    def __init__(self, path, frame_interval=1.0, queue_size=256, flush_interval=1.0):
+        """
+        Args:
+            path: Session file, appended to if it exists
+            frame_interval: Minimum seconds between two sampled frames (0 = every capture)
+            queue_size: Records waiting for the writer before new ones are dropped
+            flush_interval: Seconds between flushes, bounds what a crash can lose
+        """
+        self.path = path
+        self.frame_interval = frame_interval
+        self.flush_interval = flush_interval
+        self.records = 0
+        self.dropped = 0
+        self.frames_stored = 0
+        self.frames_deduped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._seen = set()
+        self._last_frame = 0.0
+        self._thread = None
+
+    def start(self):
+        """Open the file, start the writer thread and hook into captures, detections and input."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._writer, name="session-recorder", daemon=True)
+        self._thread.start()
+        frames.add_listener(self.on_frame)
+        add_detection_listener(self.on_detection)
+        add_input_listener(self.on_input)
+        log(f"Recording session to {self.path}")
+        return self
+
+    def stop(self):
+        """Unhook, write out the queued records and close the file."""
+        if self._thread is None:
+            return
+        frames.remove_listener(self.on_frame)
+        remove_detection_listener(self.on_detection)
+        remove_input_listener(self.on_input)
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        log(f"Session recorded: {self.records} records, {self.frames_stored} frames stored, "
+            f"{self.frames_deduped} deduplicated, {self.dropped} dropped")
+
+    def _put(self, header, image=None):
+        try:
+            self._queue.put_nowait((header, image))
+        except queue.Full:
+            self.dropped += 1
+
+    # Listeners (called on the bot's threads, must stay cheap)
+
+    def on_frame(self, frame):
+        now = time.time()
+        if now - self._last_frame < self.frame_interval:
+            return
+        self._last_frame = now
+        digest = frame_hash(frame.gray)
+        header = {"type": "frame", "t": frame.timestamp, "hash": digest, "origin": list(frame.origin)}
+        if digest in self._seen:
+            self.frames_deduped += 1
+            self._put(header)
+            return
+        self._seen.add(digest)
+        self._put(header, frame)
+
+    def on_detection(self, path, found, score, location, seconds):
+        self._put({"type": "detection", "t": time.time(), "template": path, "found": bool(found),
+                   "score": float(score), "location": None if location is None else [int(v) for v in location],
+                   "seconds": seconds})
+
+    def on_input(self, action, args):
+        self._put({"type": "input", "t": time.time(), "action": action, "args": list(args)})
+
+    # Writer thread
+
+    def _encode(self, frame):
+        bgr = cv2.cvtColor(frame.rgb, cv2.COLOR_RGB2BGR)
+        ok, png = cv2.imencode(".png", bgr)
+        return png.tobytes() if ok else b""
+
+    def _writer(self):
+        with gzip.open(self.path, "ab", compresslevel=6) as f:
+            last_flush = time.time()
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = ()
+                if item is None:
+                    break
+                if item:
+                    header, frame = item
+                    payload = self._encode(frame) if frame is not None else b""
+                    if frame is not None:
+                        self.frames_stored += 1
+                    encoded = json.dumps(header).encode("utf-8")
+                    f.write(_RECORD_HEADER.pack(len(encoded), len(payload)))
+                    f.write(encoded)
+                    f.write(payload)
+                    self.records += 1
+                if time.time() - last_flush >= self.flush_interval:
+                    f.flush()
+                    last_flush = time.time()
+
+
+class SessionReader:
+    """Reads a session file written by SessionRecorder."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def records(self):
+        """
+        Yield every record header as a dict; frame records carrying an image get a "png" key.
+        A truncated last record (e.g. after a crash) ends the iteration.
+        """
+        with gzip.open(self.path, "rb") as f:
+            while True:
+                try:
+                    prefix = f.read(_RECORD_HEADER.size)
+                    if len(prefix) < _RECORD_HEADER.size:
+                        return
+                    header_len, payload_len = _RECORD_HEADER.unpack(prefix)
+                    header = f.read(header_len)
+                    payload = f.read(payload_len)
+                except (EOFError, OSError):
+                    return
+                if len(header) < header_len or len(payload) < payload_len:
+                    return
+                record = json.loads(header)
+                if payload_len:
+                    record["png"] = payload
+                yield record
+
+    def frames(self, decode=True):
+        """
+        Yield (timestamp, hash, image) for every sampled frame, repeats included.
+        Images are BGR arrays (decoded once per hash), or None with decode=False.
+        """
+        images = {}
+        for record in self.records():
+            if record["type"] != "frame":
+                continue
+            digest = record["hash"]
+            if decode and digest not in images and "png" in record:
+                images[digest] = cv2.imdecode(np.frombuffer(record["png"], np.uint8), cv2.IMREAD_COLOR)
+            yield record["t"], digest, images.get(digest)
+
+    def detections(self):
+        return (r for r in self.records() if r["type"] == "detection")
+
+    def inputs(self):
+        return (r for r in self.records() if r["type"] == "input")
+
+    def export_frames(self, directory):
+        """
+        Write each distinct frame as a PNG, named in recording order (replay.py --frames input).
+        Returns the written paths.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for record in self.records():
+            if record["type"] == "frame" and "png" in record:
+                path = os.path.join(directory, f"{len(paths):05d}_{record['hash']}.png")
+                with open(path, "wb") as f:
+                    f.write(record["png"])
+                paths.append(path)
+        return paths
+
+    def summary(self):
+        """Return record counts and per-template detection latency/hit statistics."""
+        counts = {"frame": 0, "stored_frames": 0, "detection": 0, "input": 0}
+        per_template = {}
+        start = end = None
+        for record in self.records():
+            counts[record["type"]] = counts.get(record["type"], 0) + 1
+            start = record["t"] if start is None else min(start, record["t"])
+            end = record["t"] if end is None else max(end, record["t"])
+            if "png" in record:
+                counts["stored_frames"] += 1
+            if record["type"] == "detection":
+                entry = per_template.setdefault(record["template"], {"calls": 0, "found": 0, "seconds": 0.0})
+                entry["calls"] += 1
+                entry["found"] += record["found"]
+                entry["seconds"] += record["seconds"]
+        counts["duration"] = (end - start) if start is not None else 0.0
+        counts["templates"] = per_template
+        return counts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect a recorded session")
+    parser.add_argument("session", help="Session file written with imaginationplanet.py --record")
+    parser.add_argument("--export", help="Write the distinct frames as PNGs into this directory")
+    args = parser.parse_args()
+
+    reader = SessionReader(args.session)
+    summary = reader.summary()
+    log(f"{summary['duration']:.0f}s: {summary['frame']} frames ({summary['stored_frames']} stored), "
+        f"{summary['detection']} detections, {summary['input']} inputs")
+    for template, entry in sorted(summary["templates"].items(), key=lambda kv: -kv[1]["seconds"]):
+        log(f"  {template}: {entry['calls']} calls, {entry['found']} found, "
+            f"{1000 * entry['seconds'] / entry['calls']:.1f} ms avg")
+    if args.export:
+        log(f"Exported {len(reader.export_frames(args.export))} frames to {args.export}")
@@ -7,11 +7,11 @@ grabbing flow to click the "again_card".
 """
 
 import time
-import pyautogui
 from common import get_center, get_scaling_factor, single_find, get_all, simple_single_find
-from click import click_at
+from click import click_at, drag
 from config_coords import ConfigCoords
 from log_helper import log
+import metrics
 from collections import namedtuple
 
 
@@ -244,9 +244,8 @@ class SmartCardGrab:
             log(f"Pulling AgainCard at ({ac.x / self.sft:.1f}, {ac.y / self.sft:.1f})")
 
             # Drag the card (similar to CatCard drag)
-            pyautogui.moveTo(ac.x / self.sft, ac.y / self.sft, duration=0.5)
-            time.sleep(0.5)  # Pause before dragging
-            pyautogui.dragTo(ac.x / self.sft, ac.y / self.sft - 300, duration=1, button='left')
+            drag(ac.x / self.sft, ac.y / self.sft, ac.x / self.sft, ac.y / self.sft - 300,
+                 pause=0.5)  # Pause before dragging
             log("�?AgainCard pulled!")
             time.sleep(8)  # Wait for card pull animation to complete
 
@@ -390,6 +389,7 @@ class SmartCardGrab:
                     log("=" * 70)
                     log("✅ Card grab completed (no AgainCard used)")
                     log("=" * 70)
+                    metrics.AGAIN_CARDS.inc(result="unavailable")
                     return False  # Exit gracefully without retry
 
                 # Step 5: Close card mode
@@ -403,6 +403,7 @@ class SmartCardGrab:
                 log("=" * 70)
                 log("✅ Successfully used AgainCard!")
                 log("=" * 70)
+                metrics.AGAIN_CARDS.inc(result="used")
                 return True
                 
             except Exception as e:
@@ -440,6 +441,7 @@ class SmartCardGrab:
                     log("=" * 70)
                     log("�?Card grab failed, continuing with normal visit")
                     log("=" * 70)
+                    metrics.AGAIN_CARDS.inc(result="failed")
                     return False
 
 
@@ -3,10 +3,16 @@ from collections import namedtuple
 
 import pyautogui
 
+from click import drag, move_to, vscroll
 from common import *
+import metrics
 
 Point = namedtuple('Point', ['x', 'y'])
 
+# Map drags keep the timing of the pyautogui moveTo/mouseDown/move/mouseUp calls they replaced:
+# an instant move, with pyautogui's 0.1 s pause after each call
+MAP_DRAG = {"steps": 1, "step_delay": 0.1, "hold": 0.1, "move_duration": 0.1}
+
 
 class StarPick:
     ships = {"Ship1": 0, "Ship2": 1, "Ship3": 2, "Ship4": 3}
@@ -72,19 +78,16 @@ class StarPick:
             self.send_coo.append(Point(scc.x - 200, scc.y))
 
     def scroll_left_right(self, n):
-        pyautogui.moveTo(self.click_point.x, self.click_point.y)
-        pyautogui.mouseDown()
-        pyautogui.move(n * self.offset_unit, 0)
-        pyautogui.mouseUp()
+        drag(self.click_point.x, self.click_point.y, self.click_point.x + n * self.offset_unit, self.click_point.y,
+             **MAP_DRAG)
 
     def scroll_start(self, n):
-        pyautogui.mouseDown()
-        pyautogui.move(n * self.offset_unit, 0)
-        pyautogui.mouseUp()
+        x, y = self.click_start.x / self.sft, self.click_start.y / self.sft
+        drag(x, y, x + n * self.offset_unit, y, **MAP_DRAG)
 
     def scroll_down(self, n):
-        pyautogui.moveTo(self.click_point.x, self.click_point.y)
-        pyautogui.scroll(n * self.offset_unit)
+        move_to(self.click_point.x, self.click_point.y)
+        vscroll(n * self.offset_unit)
 
     def single_round_scan(self):
         if single_find("Disconnected"):
@@ -101,11 +104,10 @@ class StarPick:
             print("No free ships!")
             return True
         # find left top
-        pyautogui.moveTo(self.click_start.x / self.sft, self.click_start.y / self.sft)
+        move_to(self.click_start.x / self.sft, self.click_start.y / self.sft)
         for i in range(0, 10):
-            pyautogui.vscroll(200)
+            vscroll(200)
         for i in range(0, 5):
-            pyautogui.moveTo(self.click_start.x / self.sft, self.click_start.y / self.sft)
             self.scroll_start(6)
             time.sleep(1)
 
@@ -123,7 +125,6 @@ class StarPick:
             self.scroll_down(-7)
             # scroll to left
             for i in range(0, 8):
-                pyautogui.moveTo(self.click_start.x / self.sft, self.click_start.y / self.sft)
                 self.scroll_start(6)
                 time.sleep(1)
         return True
@@ -241,6 +242,7 @@ class StarPick:
             print("Send ship " + ship + " with block index " + str(block_index) + " coords " + str(
                 round(stars[i].x / 100) * 100 + round(stars[i].y / 100)))
             self.visiting[block_index][round(stars[i].x / 100) * 100 + round(stars[i].y / 100)] = ship
+            metrics.SHIPS_SENT.inc()
             self.visit_ship[ship] = block_index
 
     def count_free_ship(self):
@@ -360,6 +362,7 @@ class StarPick:
         while True:
             click_at(self.click_start.x / self.sft, self.click_start.y / self.sft)
             self.rounds += 1
+            metrics.STAR_ROUNDS.inc()
             if time.time() >= self.refresh_time + self.refresh_period or self.fails >= 5:
                 try:
                     self.reenter()
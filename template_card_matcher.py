@@ -9,6 +9,7 @@ import time
 from log_helper import log
 from config_coords import ConfigCoords
 from click import click_at
+from common import find_peaks
 
 
 class TemplateCardMatcher:
@@ -167,51 +168,22 @@ class TemplateCardMatcher:
             # Perform template matching
             result = cv2.matchTemplate(gray_screen, template_gray, cv2.TM_CCOEFF_NORMED)
             
-            # Find all matches by iterating and masking found regions
+            # All peaks in one pass, suppressing the area the old masking loop covered
+            h, w = template_gray.shape
+            mask_size = max(h, w) // 2
             matches_found = 0
-            temp_result = result.copy()
-            template_positions = []  # Track positions for this template
             
-            while True:
-                min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(temp_result)
-                
-                if max_val < threshold:
-                    break
-                
-                # Found a match
-                x, y = max_loc
+            for x, y, score in find_peaks(result, threshold, w + mask_size, h + mask_size):
                 center_x = x + template_data['width'] // 2
                 center_y = y + template_data['height'] // 2
                 
-                # Check if this position is too close to ANY previous match (global dedup)
-                is_duplicate = False
-                
-                # Check against all previously found cards
-                for _, prev_cx, prev_cy, _, _ in self.card_positions:
-                    if abs(center_x - prev_cx) < 60 and abs(center_y - prev_cy) < 60:
-                        is_duplicate = True
-                        break
-                
-                # Also check within this template's matches
-                if not is_duplicate:
-                    for prev_cx, prev_cy in template_positions:
-                        if abs(center_x - prev_cx) < 60 and abs(center_y - prev_cy) < 60:
-                            is_duplicate = True
-                            break
-                
-                if not is_duplicate:
-                    template_positions.append((center_x, center_y))
-                    self.card_positions.append((template_id, center_x, center_y, -1, -1))
-                    matches_found += 1
+                # Skip positions too close to ANY previous match (global dedup)
+                if any(abs(center_x - prev_cx) < 60 and abs(center_y - prev_cy) < 60
+                       for _, prev_cx, prev_cy, _, _ in self.card_positions):
+                    continue
                 
-                # Mask out this region to find next match
-                h, w = template_gray.shape
-                mask_size = max(h, w) // 2  # Use larger mask to avoid nearby duplicates
-                cv2.rectangle(temp_result, 
-                             (max(0, x - mask_size), max(0, y - mask_size)), 
-                             (min(temp_result.shape[1], x + w + mask_size), 
-                              min(temp_result.shape[0], y + h + mask_size)), 
-                             0, -1)
+                self.card_positions.append((template_id, center_x, center_y, -1, -1))
+                matches_found += 1
                 
                 # Only expect 2 matches per template
                 if matches_found >= 2:
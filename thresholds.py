@@ -0,0 +1,261 @@
+"""
+Template match score telemetry and threshold calibration.
+
+ScoreHistograms records the best score of every match (through the detection
+listeners of common.py) into a per-template histogram, saved as JSON and
+merged across runs. calibrate() turns scores into per-template thresholds:
+
+- labeled scores (from frames labeled with the templates they show) give the
+  lowest hit and the highest miss directly;
+- unlabeled scores (recorded runs and sessions) are split into a hit and a
+  miss cluster at the histogram's Otsu threshold.
+
+A template gets a threshold only when its hits and misses are separated by
+at least `margin`; the threshold is the middle of that gap, and never below
+`floor` (an unlabeled template that is never on screen can still show two
+clusters of miss scores). Detections that found nothing (score -1) are
+misses and count in the first bin. The result is written to the per-platform
+thresholds file that common.py loads; with -ct / --calibrated-thresholds it
+replaces the threshold the finders are called with.
+
+Usage:
+    python imaginationplanet.py -s --scores scores.json          # collect
+    python thresholds.py --histograms scores.json                 # calibrate
+    python thresholds.py --sessions sessions/run.ipsession --dry-run
+    python thresholds.py --frames labeled/ --labels labeled/labels.json
+    python imaginationplanet.py -s -ct                            # use them
+"""
+import argparse
+import json
+import os
+import platform
+import threading
+
+import cv2
+
+from common import THRESHOLDS_FILE, add_detection_listener, best_match, remove_detection_listener, \
+    resolve_template_path
+from log_helper import log
+
+BINS = 100  # Histogram bins over [0, 1]; negative scores (and misses without a score) count in the first bin
+
+
+def _bin(score):
+    return min(BINS - 1, max(0, int(score * BINS)))
+
+
+class ScoreHistograms:
+    """Per-template histograms of best match scores."""
+
+    def __init__(self):
+        self.histograms = {}  # template path -> list of BINS counts
+        self._lock = threading.Lock()
+
+    def add(self, path, score):
+        with self._lock:
+            histogram = self.histograms.get(path)
+            if histogram is None:
+                histogram = self.histograms[path] = [0] * BINS
+            histogram[_bin(score)] += 1
+
+    def on_detection(self, path, found, score, location, seconds):
+        # A negative score (e.g. find_all_with_path's "nothing above the threshold") is still a miss
+        if score is not None:
+            self.add(path, score)
+
+    def start(self):
+        add_detection_listener(self.on_detection)
+        return self
+
+    def stop(self):
+        remove_detection_listener(self.on_detection)
+
+    def merge(self, histograms):
+        with self._lock:
+            for path, counts in histograms.items():
+                mine = self.histograms.setdefault(path, [0] * BINS)
+                for i, count in enumerate(counts):
+                    mine[i] += count
+
+    def load(self, path):
+        """Add the histograms saved in a JSON file."""
+        with open(path, "r") as f:
+            self.merge(json.load(f)["histograms"])
+        return self
+
+    def save(self, path):
+        """Write the histograms, added to the ones already in the file."""
+        merged = ScoreHistograms()
+        if os.path.exists(path):
+            merged.load(path)
+        with self._lock:
+            merged.merge(self.histograms)
+        with open(path, "w") as f:
+            json.dump({"bins": BINS, "histograms": merged.histograms}, f)
+        log(f"Score histograms of {len(merged.histograms)} templates written to {path}")
+
+
+def otsu_split(histogram):
+    """Bin index separating the histogram into two classes with the largest between-class variance."""
+    total = sum(histogram)
+    weighted = sum(i * count for i, count in enumerate(histogram))
+    best, split = -1.0, None
+    below = below_weighted = 0
+    for i in range(1, len(histogram)):
+        below += histogram[i - 1]
+        below_weighted += (i - 1) * histogram[i - 1]
+        above = total - below
+        if below == 0 or above == 0:
+            continue
+        mean_below = below_weighted / below
+        mean_above = (weighted - below_weighted) / above
+        variance = below * above * (mean_below - mean_above) ** 2
+        if variance > best:
+            best, split = variance, i
+    return split
+
+
+def separate(hits, misses, margin):
+    """
+    Threshold in the middle of the gap between the highest miss and the lowest hit.
+
+    Args:
+        hits: Histogram of scores where the template was on screen
+        misses: Histogram of scores where it was not
+        margin: Smallest gap accepted
+
+    Returns:
+        (threshold or None, lowest hit, highest miss) with scores at bin resolution
+    """
+    hit_bins = [i for i, count in enumerate(hits) if count]
+    miss_bins = [i for i, count in enumerate(misses) if count]
+    if not hit_bins:
+        return None, None, None
+    lowest_hit = hit_bins[0] / BINS
+    highest_miss = (miss_bins[-1] + 1) / BINS if miss_bins else 0.0
+    if lowest_hit - highest_miss < margin:
+        return None, lowest_hit, highest_miss
+    return round((lowest_hit + highest_miss) / 2, 3), lowest_hit, highest_miss
+
+
+def calibrate(histograms, labeled=None, margin=0.05, min_samples=20, floor=0.4):
+    """
+    Compute thresholds from score histograms.
+
+    Args:
+        histograms: Template path -> histogram of unlabeled scores
+        labeled: Template path -> (hits histogram, misses histogram), preferred when given
+        margin: Smallest score gap between hits and misses to trust a threshold
+        min_samples: Fewest hits and fewest misses needed
+        floor: Lowest threshold accepted
+
+    Returns:
+        (thresholds dict, report dict) keyed by template path
+    """
+    thresholds, report = {}, {}
+    for path in sorted(set(histograms) | set(labeled or {})):
+        if labeled and path in labeled:
+            hits, misses = labeled[path]
+        else:
+            histogram = histograms[path]
+            # The first bin (misses with no score) is never a hit: split the real scores only
+            split = otsu_split([0] + histogram[1:])
+            if split is None:
+                report[path] = {"status": "single cluster", "samples": sum(histogram)}
+                continue
+            hits = [0] * split + histogram[split:]
+            misses = histogram[:split] + [0] * (len(histogram) - split)
+        entry = {"hits": sum(hits), "misses": sum(misses)}
+        if entry["hits"] < min_samples or entry["misses"] < min_samples:
+            entry["status"] = "too few samples"
+        else:
+            threshold, entry["lowest_hit"], entry["highest_miss"] = separate(hits, misses, margin)
+            if threshold is None:
+                entry["status"] = "overlap"
+            elif threshold < floor:
+                entry["status"] = "below floor"
+            else:
+                entry["status"] = "calibrated"
+                entry["threshold"] = thresholds[path] = threshold
+        report[path] = entry
+    return thresholds, report
+
+
+def session_histograms(paths):
+    """Score histograms from the detections of recorded session files."""
+    from session_recorder import SessionReader
+
+    store = ScoreHistograms()
+    for path in paths:
+        for record in SessionReader(path).detections():
+            store.on_detection(record["template"], record["found"], record["score"], None, 0.0)
+    return store.histograms
+
+
+def labeled_histograms(frames_dir, labels_path):
+    """
+    Hit and miss histograms from labeled screenshots.
+
+    labels_path is a JSON object mapping a frame file name to the button names
+    (or template paths) visible in it; each labeled template is matched on every
+    frame, frames not listing it count as misses, whatever their score (-1 included).
+    """
+    with open(labels_path, "r") as f:
+        labels = json.load(f)
+    shown = {name: {resolve_template_path(b) for b in buttons} - {None} for name, buttons in labels.items()}
+    template_paths = set().union(*shown.values()) if shown else set()
+    result = {path: ([0] * BINS, [0] * BINS) for path in template_paths}
+    for name, visible in shown.items():
+        image = cv2.imread(os.path.join(frames_dir, name), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            log(f"Skipping unreadable frame {name}")
+            continue
+        for path in template_paths:
+            # Full-frame score, -1 when nothing could be matched (e.g. template larger than the frame)
+            score, _, template = best_match(path, image, 1.0, "exhaustive")
+            if template is None:  # Unreadable template, neither a hit nor a miss
+                continue
+            result[path][0 if path in visible else 1][_bin(score)] += 1
+    return result
+
+
+def write_thresholds(path, thresholds, margin):
+    """Merge thresholds into a thresholds file (keeps templates that were not recalibrated)."""
+    data = {"thresholds": {}}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            data = json.load(f)
+    data["platform"] = platform.system()
+    data["margin"] = margin
+    data["thresholds"].update(thresholds)
+    data["thresholds"] = dict(sorted(data["thresholds"].items()))
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+    log(f"{len(thresholds)} thresholds written to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate per-template match thresholds")
+    parser.add_argument("--histograms", nargs="*", default=[], help="Score files written with --scores")
+    parser.add_argument("--sessions", nargs="*", default=[], help="Recorded session files")
+    parser.add_argument("--frames", help="Directory of labeled screenshots")
+    parser.add_argument("--labels", help="JSON labels of the screenshots (frame name -> buttons shown)")
+    parser.add_argument("--margin", type=float, default=0.05, help="Smallest gap between hit and miss scores")
+    parser.add_argument("--min-samples", type=int, default=20, help="Fewest hits and misses per template")
+    parser.add_argument("--floor", type=float, default=0.4, help="Lowest threshold accepted")
+    parser.add_argument("--output", default=THRESHOLDS_FILE, help="Thresholds file to update")
+    parser.add_argument("--dry-run", action="store_true", help="Only report, do not write the thresholds")
+    args = parser.parse_args()
+
+    store = ScoreHistograms()
+    for histogram_file in args.histograms:
+        store.load(histogram_file)
+    store.merge(session_histograms(args.sessions))
+    labeled = labeled_histograms(args.frames, args.labels) if args.frames and args.labels else None
+
+    thresholds, report = calibrate(store.histograms, labeled, args.margin, args.min_samples, args.floor)
+    for template, entry in report.items():
+        details = ", ".join(f"{k} {v}" for k, v in entry.items() if k != "status")
+        log(f"{template}: {entry['status']} ({details})")
+    if thresholds and not args.dry_run:
+        write_thresholds(args.output, thresholds, args.margin)